@@ -12,10 +12,13 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 import os
 import sys
+import tempfile
+from datetime import time
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
 import dj_database_url
+from corsheaders.defaults import default_headers as default_cors_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -169,6 +172,17 @@ MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "media/"
 SERVE_MEDIA_USING_DJANGO = os.environ.get("SERVE_MEDIA_USING_DJANGO", "True") == "True"
 
+# file hasil rekap/export, di luar MEDIA_ROOT agar hanya bisa diunduh lewat
+# /files/<file_id>
+ARTIFACTS_ROOT = Path(os.environ.get("ARTIFACTS_ROOT", BASE_DIR / "artifacts"))
+# "x-sendfile" (apache/caddy), "x-accel-redirect" (nginx) atau kosong (django
+# yang mengirim file)
+ARTIFACTS_SENDFILE = os.environ.get("ARTIFACTS_SENDFILE", "")
+# location internal nginx yang mengarah ke ARTIFACTS_ROOT
+ARTIFACTS_ACCEL_PREFIX = os.environ.get(
+    "ARTIFACTS_ACCEL_PREFIX", "/protected-artifacts/"
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -181,6 +195,12 @@ if DEBUG:
 else:
     CORS_ALLOWED_ORIGINS = os.environ.get("CORS_ALLOWED_ORIGINS", "").split(",")
 
+# header sync /api/data harus bisa dibaca client
+CORS_EXPOSE_HEADERS = ["X-Sync-Mode", "X-Sync-Watermark", "X-Sync-Window", "ETag"]
+
+# upload boleh diulang dengan key yang sama tanpa diproses dua kali
+CORS_ALLOW_HEADERS = (*default_cors_headers, "idempotency-key")
+
 JAZZMIN_SETTINGS = {
     "site_title": "Presensee Admin",
     "site_header": "Presensee",
@@ -225,12 +245,37 @@ REDIS_URL = os.environ.get("REDIS_URL")
 
 CACHEOPS_REDIS = REDIS_URL
 
+# antrian scan guru piket ditulis ke database jika jumlah scan atau umur scan
+# tertua (detik) mencapai batas ini
+PIKET_BATCH_SIZE = int(os.environ.get("PIKET_BATCH_SIZE", 200))
+PIKET_BATCH_MAX_AGE = int(os.environ.get("PIKET_BATCH_MAX_AGE", 30))
+
+# jumlah wkhtmltopdf yang boleh berjalan bersamaan untuk semua worker, dan
+# lama maksimal (detik) request menunggu giliran render
+REKAP_RENDER_CONCURRENCY = int(
+    os.environ.get("REKAP_RENDER_CONCURRENCY", os.cpu_count() or 2)
+)
+REKAP_RENDER_TIMEOUT = int(os.environ.get("REKAP_RENDER_TIMEOUT", 30))
+
+# jam (HH:MM, dipisah koma) manage.py warmup membuat rekap pdf dan snapshot
+# /data, mis. "05:00,15:00" untuk pagi dan setelah absensi dikunci. Rekap
+# bulan lalu ikut dibuat selama WARMUP_PREVIOUS_MONTH_DAYS hari pertama bulan.
+# WARMUP_TIMES kosong kembali ke jam default
+WARMUP_TIMES = [
+    time.fromisoformat(t.strip())
+    for t in os.environ.get("WARMUP_TIMES", "05:00").split(",")
+    if t.strip()
+] or [time(5, 0)]
+WARMUP_PREVIOUS_MONTH_DAYS = int(os.environ.get("WARMUP_PREVIOUS_MONTH_DAYS", 5))
+
 CACHEOPS = {
     "main.*": {"ops": ("fetch", "get", "exists"), "timeout": 60 * 60 * 12},
     "main.absensi": {"ops": "aggregate", "timeout": 60 * 60 * 2},
 }
 
 if "test" in sys.argv:
+    ARTIFACTS_ROOT = Path(tempfile.gettempdir()) / "presensee-test-artifacts"
+
     LOGGING = {
         "version": 1,
         "disable_existing_loggers": False,
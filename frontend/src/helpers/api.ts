@@ -307,6 +307,10 @@ export async function changePassword(
   }
 }
 
+// polling status rekap: 1 detik sekali, paling lama 2 menit
+const REKAP_POLL_INTERVAL = 1000;
+const REKAP_POLL_MAX_ATTEMPTS = 120;
+
 export async function getRekap(
   token: string,
   bulan: number,
@@ -315,15 +319,22 @@ export async function getRekap(
 ): Promise<string> {
   const baseUrl = getApiBaseUrl();
   try {
-    const response = await axios.get(
-      baseUrl + `/get-rekap?bulan=${bulan}&tahun=${tahun}&kelas=${kelas}`,
-      {
-        headers: {
-          Authorization: "Bearer " + token,
-        },
+    // pdf dibuat di latar belakang, panggil ulang sampai status "done"
+    for (let attempt = 0; attempt < REKAP_POLL_MAX_ATTEMPTS; attempt++) {
+      const response = await axios.get(
+        baseUrl +
+          `/get-rekap?bulan=${bulan}&tahun=${tahun}&kelas=${kelas}&async=1`,
+        {
+          headers: {
+            Authorization: "Bearer " + token,
+          },
+        }
+      );
+      if (response.data.data.status !== "pending") {
+        return response.data.data.file_id;
       }
-    );
-    return response.data.data.file_id;
+      await new Promise((resolve) => setTimeout(resolve, REKAP_POLL_INTERVAL));
+    }
   } catch (e: any) {
     if (e instanceof AxiosError) {
       if (
@@ -339,6 +350,8 @@ export async function getRekap(
     }
     throw new Error();
   }
+  // pdf belum selesai setelah batas polling
+  throw new Error("Server sedang offline");
 }
 
 export async function getBulan(token: string): Promise<
@@ -5,9 +5,10 @@ from django.contrib.auth.admin import UserAdmin as AuthUserAdmin
 from django.db import transaction
 from django.db.models import OuterRef, Subquery
 from django.forms import model_to_dict
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import render
+from django.http import Http404, HttpRequest, HttpResponse
+from django.shortcuts import redirect, render
 from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
@@ -18,6 +19,7 @@ from main.forms import (
     createKelasForm,
     createUserChangeForm,
 )
+from main.helpers import rekap_bulk, sync, versions
 from main.models import Absensi, AbsensiSession, Data, Kelas, KunciAbsensi, Siswa, User
 
 
@@ -42,6 +44,8 @@ class AdminSite(admin.AdminSite):
         old_kelas.save()
 
         Siswa.objects.filter(kelas__pk=old_kelas_id).update(kelas_id=new_kelas.pk)
+        # .update() tidak memicu signal
+        versions.bump_structure([old_kelas.pk, new_kelas.pk])
 
         messages.success(
             request,
@@ -50,6 +54,20 @@ class AdminSite(admin.AdminSite):
         )
         return HttpResponse(str(new_kelas.pk))
 
+    def rekap_bulk_progress(self, request: HttpRequest, job_id: str):
+        job = rekap_bulk.get_job(job_id)
+        if job is None:
+            raise Http404
+
+        context = {
+            "title": "Rekap PDF",
+            "job": job,
+            "is_running": job["status"]
+            in (rekap_bulk.STATUS_PENDING, rekap_bulk.STATUS_PROCESSING),
+            **self.each_context(request),
+        }
+        return render(request, "admin/rekap_bulk_progress.html", context)
+
     def get_urls(self):
         from main.views_import_export import export_absensi, import_siswa
 
@@ -57,6 +75,13 @@ class AdminSite(admin.AdminSite):
         last_url = urls.pop()
 
         urls.append(path("naik-kelas/", self.naik_kelas))
+        urls.append(
+            path(
+                "rekap-bulk/<str:job_id>/",
+                self.admin_view(self.rekap_bulk_progress),
+                name="rekap_bulk_progress",
+            )
+        )
         urls.append(path("export-absensi/", export_absensi, name="export_absensi"))
         urls.append(path("import-siswa/", import_siswa, name="import_siswa"))
         urls.append(last_url)
@@ -177,6 +202,8 @@ class CustomAuthUserAdmin(FilterDomainMixin, AuthUserAdmin):
 
     def clear_role(self, user: User):
         Kelas.objects.filter(wali_kelas__pk=user.pk).update(wali_kelas=None)
+        # .update() tidak memicu signal
+        sync.mark_structure_changed()
         for k in Kelas.objects.filter(sekretaris__pk__in=[user.pk]):
             k.sekretaris.remove(user)
 
@@ -270,10 +297,34 @@ class KelasAdmin(FilterDomainMixin, admin.ModelAdmin):
     ordering = ("-active",)
     inlines = (SiswaInlineAdmin,)
     change_form_template = "admin/kelas_change_form.html"
+    actions = ("rekap_pdf",)
 
     def get_queryset(self, request):
         return super().get_queryset(request).prefetch_related("wali_kelas")
 
+    @admin.action(description="Rekap PDF kelas terpilih (ZIP)")
+    def rekap_pdf(self, request, queryset):
+        if "apply" not in request.POST:
+            now = timezone.now()
+            context = {
+                "title": "Rekap PDF",
+                "queryset": queryset,
+                "action_checkbox_name": admin.helpers.ACTION_CHECKBOX_NAME,
+                "years": range(2020, now.year + 2),
+                "months": range(1, 13),
+                "current_month": now.month,
+                "current_year": now.year,
+                **self.admin_site.each_context(request),
+            }
+            return render(request, "admin/rekap_bulk.html", context)
+
+        job_id = rekap_bulk.start(
+            int(request.POST["month"]),
+            int(request.POST["year"]),
+            list(queryset.values_list("pk", flat=True)),
+        )
+        return redirect("admin:rekap_bulk_progress", job_id=job_id)
+
     def name_(self, obj):
         return str(obj)
 
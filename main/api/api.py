@@ -4,6 +4,7 @@ from ninja import NinjaAPI
 from ninja.throttling import AnonRateThrottle, AuthRateThrottle
 
 from main.api.core.auth import AuthBearer
+from main.api.core.parser import Parser
 
 throttle = []
 
@@ -23,4 +24,5 @@ api = NinjaAPI(
     docs=False,
     docs_url=False,
     throttle=throttle,
+    parser=Parser(),
 )
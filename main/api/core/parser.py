@@ -0,0 +1,80 @@
+import json
+import zlib
+
+from ninja.parser import Parser as BaseParser
+
+try:
+    # python >= 3.14
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# batas ukuran body setelah didekompresi (mencegah zip bomb)
+MAX_DECOMPRESSED_SIZE = 50 * 1024 * 1024
+
+
+def _inflate(body: bytes, wbits: int) -> bytes:
+    decompressor = zlib.decompressobj(wbits)
+    data = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+    if decompressor.unconsumed_tail:
+        raise ValueError("body terlalu besar")
+
+    return data
+
+
+def _unzstd(body: bytes) -> bytes:
+    if zstd is not None:
+        data = zstd.ZstdDecompressor().decompress(
+            body, max_length=MAX_DECOMPRESSED_SIZE + 1
+        )
+    elif zstandard is not None:
+        reader = zstandard.ZstdDecompressor().stream_reader(body)
+        data = bytearray()
+        while len(data) <= MAX_DECOMPRESSED_SIZE:
+            chunk = reader.read(64 * 1024)
+            if not chunk:
+                break
+            data += chunk
+    else:
+        raise ValueError("zstd tidak didukung server")
+
+    if len(data) > MAX_DECOMPRESSED_SIZE:
+        raise ValueError("body terlalu besar")
+
+    return bytes(data)
+
+
+def decode_body(body: bytes, content_encoding: str) -> bytes:
+    """dekompresi body request sesuai header Content-Encoding"""
+    content_encoding = content_encoding.strip().lower()
+
+    if content_encoding in ("", "identity"):
+        return body
+
+    if content_encoding in ("gzip", "x-gzip"):
+        return _inflate(body, 16 + zlib.MAX_WBITS)
+
+    if content_encoding == "deflate":
+        try:
+            return _inflate(body, zlib.MAX_WBITS)
+        except zlib.error:
+            # sebagian client mengirim raw deflate tanpa header zlib
+            return _inflate(body, -zlib.MAX_WBITS)
+
+    if content_encoding == "zstd":
+        return _unzstd(body)
+
+    raise ValueError("Content-Encoding %s tidak didukung" % content_encoding)
+
+
+class Parser(BaseParser):
+    """json parser yang menerima body terkompresi (gzip, deflate, zstd)"""
+
+    def parse_body(self, request):
+        body = decode_body(request.body, request.headers.get("Content-Encoding", ""))
+        return json.loads(body)
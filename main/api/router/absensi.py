@@ -1,13 +1,23 @@
+import json
+
 from dateutil import parser as dateutil_parser
 
-from django.db.models import Count, Q, Subquery, OuterRef
+from django.db.models import Count, Q
+from django.utils import timezone
 
 from main.api.api import api
 from main.api.core.types import HttpRequest
+from main.helpers import redis, versions
 from main.models import Absensi, Kelas, Siswa
+from main.models.base import get_final_status
 
 from ..schemas import ErrorSchema, SuccessSchema
 
+# progress kalender per kelas (hash tanggal → json), key berganti setiap versi
+# data kelas berubah sehingga TTL cukup pendek untuk membuang versi lama
+PROGRESS_KEY = "absensi_progress_%s_%s"
+PROGRESS_TTL = 60 * 5
+
 
 @api.get("/absensi", response={404: ErrorSchema, 403: ErrorSchema, 200: SuccessSchema})
 def get_absensies(request: HttpRequest, date: str, kelas_id: int):
@@ -21,67 +31,89 @@ def get_absensies(request: HttpRequest, date: str, kelas_id: int):
     if kelas is None:
         return 404, {"detail": "kelas tidak ditemukan"}
 
-    result = {}
-    siswas = kelas.siswas.annotate(
-        absensi_status=Subquery(
-            Absensi.objects.filter(date=date, siswa__pk=OuterRef("pk")).values(
-                "_status"
-            )[:1]
-        )
-    )
+    # siswa tanpa absensi -> None
+    result = dict.fromkeys(kelas.siswas.values_list("pk", flat=True))
 
-    for siswa in siswas:
-        absensi_status = siswa.absensi_status
-        if absensi_status:
-            result[siswa.pk] = absensi_status
-        else:
-            result[siswa.pk] = None
+    now = timezone.now()
+    absensies = Absensi.objects.filter(date=date, siswa__kelas=kelas).values_list(
+        "siswa_id", "_status", "wait_expired_at"
+    )
+    for siswa_id, status, wait_expired_at in absensies:
+        if siswa_id in result:
+            result[siswa_id] = get_final_status(status, wait_expired_at, now) or None
 
     return {"data": result}
 
 
 @api.get("/absensi/progress", response={400: ErrorSchema, 200: SuccessSchema})
 def get_absensi_progress(request: HttpRequest, kelas_id: int, dates: str):
+    """
+    Progress absensi per tanggal untuk kalender. Hasil per tanggal di-cache
+    dengan versi data kelas (berubah setiap absensi/siswa berubah), query
+    hanya untuk tanggal yang belum ada di cache.
+    """
     dates = dates.split(",")
 
     if len(dates) >= 32:
         return 400, {"detail": "terlalu banyak input tanggal"}
 
-    total_siswa = Siswa.objects.filter(kelas__pk=kelas_id).count()
-
-    result = {}
-    queries = {}
-
+    parsed_dates = {}
     for date in dates:
         try:
-            date_obj = dateutil_parser.parse(date)
+            parsed_dates[date] = dateutil_parser.parse(date).date().isoformat()
         except ValueError:
             return 400, {"detail": "gagal parsing %s" % date}
 
-        total_absensi = Count(
-            "pk", filter=Q(siswa__kelas__pk=kelas_id) & Q(date=date_obj)
-        )
+    redis_client = redis.get_singleton_client()
+    key = PROGRESS_KEY % (kelas_id, versions.get_scope_version([kelas_id]))
 
-        total_tidak_masuk = Count(
-            "pk",
-            filter=Q(siswa__kelas__pk=kelas_id)
-            & Q(date=date_obj)
-            & ~Q(_status=Absensi.StatusChoices.HADIR),
-        )
+    fields = sorted(set(parsed_dates.values()))
+    progress = {
+        field: json.loads(value)
+        for field, value in zip(fields, redis_client.hmget(key, fields))
+        if value is not None
+    }
 
-        queries["date_%s_total_absensi" % date] = total_absensi
-        queries["date_%s_total_tidak_masuk" % date] = total_tidak_masuk
+    missing = [field for field in fields if field not in progress]
+    if missing:
+        computed = _compute_progress(kelas_id, missing)
 
-    query_result = Absensi.objects.aggregate(**queries)
+        with redis_client.pipeline() as pipe:
+            pipe.hset(key, mapping={k: json.dumps(v) for k, v in computed.items()})
+            pipe.expire(key, PROGRESS_TTL)
+            pipe.execute()
+
+        progress.update(computed)
+
+    return {"data": {date: progress[parsed_dates[date]] for date in dates}}
 
-    for date in dates:
-        total_absensi = query_result["date_%s_total_absensi" % date]
-        total_tidak_masuk = query_result["date_%s_total_tidak_masuk" % date]
 
-        is_complete = total_absensi == total_siswa
+def _compute_progress(kelas_id: int, dates: list[str]) -> dict:
+    """1 query absensi kelas untuk semua tanggal, dikelompokkan per tanggal"""
+    total_siswa = Siswa.objects.filter(kelas__pk=kelas_id).count()
+
+    rows = (
+        Absensi.objects.filter(siswa__kelas__pk=kelas_id, date__in=dates)
+        .values("date")
+        .annotate(
+            total_absensi=Count("pk"),
+            total_tidak_masuk=Count(
+                "pk", filter=~Q(_status=Absensi.StatusChoices.HADIR)
+            ),
+        )
+        .order_by()
+    )
+    counts = {
+        row["date"].isoformat(): (row["total_absensi"], row["total_tidak_masuk"])
+        for row in rows
+    }
+
+    result = {}
+    for date in dates:
+        total_absensi, total_tidak_masuk = counts.get(date, (0, 0))
         result[date] = {
             "total_tidak_masuk": total_tidak_masuk,
-            "is_complete": is_complete,
+            "is_complete": total_absensi == total_siswa,
         }
 
-    return {"data": result}
+    return result
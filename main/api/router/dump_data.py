@@ -1,70 +1,254 @@
-from django.http import HttpResponse
+import calendar
+import gzip
+import re
+from datetime import date, datetime
+from typing import Optional
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.http import (HttpResponse, HttpResponseNotModified, JsonResponse,
+                         StreamingHttpResponse)
+from django.middleware.gzip import re_accepts_gzip
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from django.views.decorators.gzip import gzip_page
-# from django.db.models import Prefetch
+from ninja import Query
 
 from main.api.api import api
 from main.api.core.types import HttpRequest
 from main.helpers import database as helpers_database
-from main.models import Absensi, Kelas, KunciAbsensi, Siswa, User
+from main.helpers import snapshot as helpers_snapshot
+from main.helpers import sync, versions
+from main.models import Absensi, Kelas, KunciAbsensi, User
+from main.models.base import get_final_status
+
+MONTH_PATTERN = re.compile(r"^(\d{4})-(\d{2})$")
 
 
 @api.get("/data")
 @gzip_page
-def get_data(request: HttpRequest):
-    # sekretaris_qs = User.objects.filter(type=User.TypeChoices.SEKRETARIS)
+def get_data(
+    request: HttpRequest,
+    since: Optional[str] = None,
+    fmt: Optional[str] = Query(None, alias="format"),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    months: Optional[int] = Query(None, ge=1),
+):
+    """
+    Tanpa `since` -> full dump. Dengan `since` (watermark dari header
+    X-Sync-Watermark sync sebelumnya) -> hanya absensi & kunci absensi yang
+    berubah/dihapus, kecuali watermark terlalu tua, struktur kelas/siswa
+    berubah atau redis sudah di-restart (generation berbeda), maka tetap
+    full dump.
 
-    kelas_qs = (
-        Kelas.objects.only_active()
-        # .select_related("wali_kelas")
-        # .prefetch_related(Prefetch("sekretaris", sekretaris_qs))
-    )
-    siswa_qs = (
-        Siswa.objects.filter(kelas__active=True)
-        # .select_related("kelas", "kelas__wali_kelas")
-        # .prefetch_related(Prefetch("kelas__sekretaris", sekretaris_qs))
-    )
-    absensi_qs = (
-        Absensi.objects.filter(siswa__kelas__active=True)
-        # .select_related(
-        #     "by",
-        # )
-        # .prefetch_related(Prefetch("siswa", siswa_qs))
-        # .prefetch_related(Prefetch("siswa__kelas", kelas_qs))
+    Full dump bisa dibatasi ke jendela tanggal (`from`/`to` atau `months`
+    bulan terakhir termasuk bulan ini), bulan lain diambil belakangan lewat
+    /data/month/{yyyy-mm}. Delta tidak dibatasi jendela agar perubahan di
+    bulan yang sudah dimuat client tetap terkirim.
+
+    Full dump bisa dikirim sebagai file SQLite (`?format=sqlite` atau header
+    Accept: application/vnd.sqlite3) yang langsung dibuka client tanpa
+    replay SQL. Delta selalu berupa SQL.
+
+    Full dump di-cache per (scope kelas, versi data) dan diberi ETag, client
+    yang mengirim If-None-Match dengan versi yang sama mendapat 304.
+    """
+    # watermark diambil sebelum query agar perubahan selama dump tidak hilang
+    watermark = sync.now()
+    generation = versions.get_generation()
+
+    kelas_ids = _scope_kelas_ids(request.auth)
+
+    if since is not None and sync.can_use_delta(since, generation):
+        delta_sql = _build_delta(sync.parse_watermark(since)[0], kelas_ids)
+        return _sync_response(
+            delta_sql,
+            "text/plain",
+            "delta",
+            sync.format_watermark(watermark, generation),
+        )
+
+    if months is not None:
+        date_from = timezone.localdate().replace(day=1) - relativedelta(
+            months=months - 1
+        )
+    window = (date_from, date_to)
+
+    if _wants_sqlite(request, fmt):
+        snapshot_fmt = helpers_snapshot.FORMAT_SQLITE
+        content_type = helpers_database.SQLITE_MIMETYPE
+    else:
+        snapshot_fmt = helpers_snapshot.FORMAT_SQL
+        content_type = "text/plain"
+
+    version = versions.get_scope_version(kelas_ids)
+    etag = quote_etag(
+        "%s-%s-%s-%s" % (version, snapshot_fmt, date_from or "", date_to or "")
     )
 
-    lock_absensi_qs = KunciAbsensi.objects.filter(kelas__active=True).filter(
-        locked=True
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+        response.headers["ETag"] = etag
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    accept_gzip = _accepts_gzip(request)
+
+    if snapshot_fmt == helpers_snapshot.FORMAT_SQL:
+        cached = helpers_snapshot.get_cached_snapshot(snapshot_fmt, version, window)
+    else:
+        # file SQLite harus dibangun utuh, tidak bisa dikirim sambil dibuat
+        cached = helpers_snapshot.get_snapshot(
+            kelas_ids, snapshot_fmt, version, window
+        )
+
+    if cached is None:
+        # dump dikirim per potong sambil dibuat, memori worker tetap konstan
+        content = helpers_snapshot.stream_snapshot(
+            kelas_ids, version, watermark, accept_gzip, window
+        )
+    else:
+        content, watermark = cached
+        if not accept_gzip:
+            content = gzip.decompress(content)
+
+    response = _sync_response(
+        content,
+        content_type,
+        "full",
+        sync.format_watermark(watermark, generation),
+        streaming=cached is None,
     )
+    response.headers["ETag"] = etag
+    response.headers["X-Sync-Window"] = "%s/%s" % (date_from or "", date_to or "")
+    _patch_gzip_headers(response, accept_gzip)
+
+    return response
+
+
+@api.get("/data/month/{month}")
+@gzip_page
+def get_data_month(request: HttpRequest, month: str):
+    """
+    Shard SQL absensi & kunci absensi satu bulan (format yyyy-mm) untuk
+    diterapkan di atas database hasil full dump berjendela. ETag hanya
+    berubah jika bulan tersebut berubah, client selalu validasi ulang
+    (murah, 1 round trip redis) dan mendapat 304 untuk bulan yang tetap.
+    """
+    match = MONTH_PATTERN.match(month)
+    if match is None or not 1 <= int(match.group(2)) <= 12:
+        return JsonResponse({"detail": "format bulan harus yyyy-mm"}, status=400)
+
+    tahun, bulan = int(match.group(1)), int(match.group(2))
+    date_start = date(tahun, bulan, 1)
+    date_end = date(tahun, bulan, calendar.monthrange(tahun, bulan)[1])
+
+    kelas_ids = _scope_kelas_ids(request.auth)
+    version = versions.get_month_version(kelas_ids, tahun, bulan)
+    etag = quote_etag(version)
+
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        content = helpers_snapshot.get_month_shard(
+            kelas_ids, date_start, date_end, version
+        )
 
-    user = request.auth
+        accept_gzip = _accepts_gzip(request)
+        if not accept_gzip:
+            content = gzip.decompress(content)
 
-    if user.type == User.TypeChoices.KESISWAAN:
-        kelas_qs = kelas_qs.filter(active=True)
-        absensi_qs = absensi_qs.filter(siswa__kelas__active=True)
-        siswa_qs = siswa_qs.filter(kelas__active=True)
+        response = HttpResponse(content, content_type="text/plain")
+        _patch_gzip_headers(response, accept_gzip)
 
-    elif user.type == User.TypeChoices.WALI_KELAS:
+    response.headers["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+
+    return response
+
+
+def _scope_kelas_ids(user: User) -> list[int]:
+    """kelas aktif yang datanya boleh diunduh user"""
+    kelas_qs = Kelas.objects.only_active()
+
+    if user.type == User.TypeChoices.WALI_KELAS:
         kelas_qs = kelas_qs.filter(wali_kelas__pk=user.pk)
-        absensi_qs = absensi_qs.filter(siswa__kelas__wali_kelas__pk=user.pk)
-        siswa_qs = siswa_qs.filter(kelas__wali_kelas__pk=user.pk)
 
     elif user.type == User.TypeChoices.SEKRETARIS:
         kelas_qs = kelas_qs.filter(sekretaris__in=[user.pk])
-        absensi_qs = absensi_qs.filter(siswa__kelas__sekretaris__in=[user.pk])
-        siswa_qs = siswa_qs.filter(kelas__sekretaris__in=[user.pk])
 
-    else:
-        kelas_qs = kelas_qs.none()
-        absensi_qs = absensi_qs.none()
-        siswa_qs = siswa_qs.none()
+    elif user.type != User.TypeChoices.KESISWAAN:
+        return []
 
-    conn = helpers_database.dump_to_sqlite(
-        kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs
-    )
-    dump_database_str = ";\n".join(conn.iterdump()) + ";"
-    conn.close()
+    return sorted(set(kelas_qs.values_list("pk", flat=True)))
 
-    minimize_dump_database_str = helpers_database.minimize_sql_dump(dump_database_str)
 
-    response = HttpResponse(minimize_dump_database_str, content_type="text/plain")
+def _sync_response(
+    content, content_type: str, mode: str, watermark: str, streaming=False
+):
+    response_class = StreamingHttpResponse if streaming else HttpResponse
+    response = response_class(content, content_type=content_type)
+    response.headers["X-Sync-Mode"] = mode
+    response.headers["X-Sync-Watermark"] = watermark
+    # format ditentukan juga oleh header Accept
+    patch_vary_headers(response, ["Accept"])
     return response
+
+
+def _not_modified(request: HttpRequest, etag: str) -> bool:
+    return etag in parse_etags(request.headers.get("If-None-Match", ""))
+
+
+def _accepts_gzip(request: HttpRequest) -> bool:
+    return bool(re_accepts_gzip.search(request.headers.get("Accept-Encoding", "")))
+
+
+def _patch_gzip_headers(response, accept_gzip: bool):
+    # snapshot disimpan ter-gzip, dikirim apa adanya jika client mendukung
+    # (gzip_page melewati response yang sudah punya Content-Encoding)
+    if accept_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ["Accept-Encoding"])
+
+
+def _wants_sqlite(request: HttpRequest, fmt: Optional[str]) -> bool:
+    if fmt is not None:
+        return fmt == "sqlite"
+
+    accept = request.headers.get("Accept", "")
+    return (
+        helpers_database.SQLITE_MIMETYPE in accept
+        or "application/x-sqlite3" in accept
+    )
+
+
+def _build_delta(since: int, kelas_ids: list[int]) -> str:
+    changed_since = datetime.fromtimestamp(
+        since - sync.WATERMARK_OVERLAP, tz=settings.TIME_ZONE_OBJ
+    )
+
+    now = timezone.now()
+    absensi_rows = (
+        (d, siswa_id, get_final_status(status, wait_expired_at, now), updated_at)
+        for d, siswa_id, status, wait_expired_at, updated_at in (
+            Absensi.objects.filter(
+                siswa__kelas__pk__in=kelas_ids, changed_at__gte=changed_since
+            ).values_list(
+                "date", "siswa_id", "_status", "wait_expired_at", "updated_at"
+            )
+        )
+    )
+
+    # termasuk yang locked=False agar unlock ikut terkirim
+    lock_rows = KunciAbsensi.objects.filter(
+        kelas__pk__in=kelas_ids, changed_at__gte=changed_since
+    ).values_list("date", "kelas_id", "locked")
+
+    deleted_absensies = sync.get_tombstones("absensi", since, kelas_ids)
+    deleted_locks = sync.get_tombstones("kunci_absensi", since, kelas_ids)
+
+    return helpers_database.build_delta_sql(
+        absensi_rows, lock_rows, deleted_absensies, deleted_locks
+    )
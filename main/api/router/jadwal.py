@@ -1,12 +1,12 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-from django.db.models import Prefetch
 from django.utils import timezone
 
 from main.api.api import api
 from main.api.core.types import HttpRequest
-from main.models import AbsensiSession, Kelas
+from main.helpers import schedule
+from main.models import Kelas
 
 from ..schemas import ErrorSchema, SuccessSchema
 
@@ -21,7 +21,7 @@ def _format_time(value) -> Optional[str]:
     # fallback to str
     return str(value)
 
-def _jam_masuk_sampai(session: AbsensiSession) -> Optional[str]:
+def _jam_masuk_sampai(session: schedule.Schedule) -> Optional[str]:
     """
     Hitung jam_masuk + toleransi.
     jam_masuk : time
@@ -55,29 +55,17 @@ def get_jadwal_absensi(request: HttpRequest):
     if request.auth.type != "guru_piket":
         return 403, {"detail": "Forbidden"}
 
-    days = ["senin", "selasa", "rabu", "kamis", "jumat", "sabtu"]
-
-    pref = Prefetch("jadwal_kelas", queryset=AbsensiSession.objects.all(), to_attr="prefetched_jadwal")
-    kelass = Kelas.objects.only_active().prefetch_related(pref)
+    schedules = schedule.get_index()
+    kelass = Kelas.objects.only_active().only("id", "name")
 
     results = {}
 
     for kelas in kelass:
         results[kelas.pk] = {"name": kelas.name}
 
-        # buat dict default None untuk tiap hari
-        for day in days:
+        for weekday, day in enumerate(schedule.HARI):
+            session = schedules.get((kelas.pk, weekday))
             results[kelas.pk][day] = None
-
-        # prefetched_jadwal berisi semua AbsensiSession untuk kelas ini
-        prefetched = getattr(kelas, "prefetched_jadwal", None)
-        if prefetched is None:
-            # fallback ke related manager (jika prefetch gagal)
-            prefetched = list(kelas.jadwal_kelas.all())
-
-        # untuk tiap hari, cari sesi pertama yang memiliki flag day=True
-        for day in days:
-            session = next((s for s in prefetched if getattr(s, day, False)), None)
             if not session:
                 continue
 
@@ -1,112 +1,52 @@
-import pickle
-from datetime import datetime
-
-from django.conf import settings
-from django.db import transaction
-from django.utils import timezone
+import logging
 
 from main.api.api import api
 from main.api.core.types import HttpRequest
-from main.helpers import redis
-from main.models import Absensi, AbsensiSession, Siswa
+from main.helpers import piket_queue
 
 from ..schemas import ErrorSchema, PiketDataUploadSchema, SuccessSchema
 
+logger = logging.getLogger(__name__)
+
 
 @api.post("/piket/upload", response={403: ErrorSchema, 200: SuccessSchema})
 def piket_upload(request: HttpRequest, data: list[PiketDataUploadSchema]):
-    absensies = data
-    invalids = []
-
-    redis_client = redis.get_singleton_client()
+    """
+    Scan hanya dimasukkan ke antrian redis (atomik, aman untuk beberapa HP
+    piket sekaligus). Antrian ditulis ke database sekaligus jika jumlah scan
+    mencapai PIKET_BATCH_SIZE atau scan tertua berumur PIKET_BATCH_MAX_AGE
+    detik, oleh request ini atau `manage.py piketflush`.
+    """
     current_domain = request.META["HTTP_HOST"]
-    waiting_data_key = f"piket_waiting_to_upload_{current_domain}"
-
-    waiting_data = redis_client.get(waiting_data_key)
-    if waiting_data is None:
-        waiting_data = []
-    else:
-        waiting_data = pickle.loads(waiting_data)
-
-    absensies.extend(waiting_data)
-
-    # TODO: implementasi minimal jumlah absensi untuk di-upload.
-    # TODO: bertujuan untuk membuat database bekerja dalam mode batch
-    # TODO: data sementara di simpan di waiting_data_key
-
-    # sort agar absen type masuk di-proses terlebih dahulu
-    absensies.sort(key=lambda x: 0 if x.type == "absen_masuk" else 1)
-
-    new_absensies = []
-    updated_absensies = []
-
-    for absensi in absensies:
-        date = datetime.fromtimestamp(absensi.timestamp).date()
-        absensi_obj: Absensi = (
-            Absensi.objects.filter(siswa_id=absensi.siswa).filter(date=date).first()
-        )
 
-        match date.strftime("%A"):
-            case "Monday":
-                nameOfDay = "senin"
-            case "Tuesday":
-                nameOfDay = "selasa"
-            case "Wednesday":
-                nameOfDay = "rabu"
-            case "Thursday":
-                nameOfDay = "kamis"
-            case "Friday":
-                nameOfDay = "jumat"
-            case "Saturday":
-                nameOfDay = "sabtu"
-            case "Sunday":
-                continue
+    length = piket_queue.push(
+        current_domain, request.auth.pk, [d.model_dump() for d in data]
+    )
 
-        siswa_obj = Siswa.objects.get(pk=absensi.siswa)
+    # flush() tidak melakukan apa-apa jika flusher lain sedang berjalan
+    if piket_queue.is_due(current_domain, length):
+        try:
+            piket_queue.flush(current_domain)
+        except Exception:
+            # scan sudah aman di antrian dan ditulis ulang oleh `piketflush`,
+            # error di sini membuat client mengirim scan yang sama lagi
+            logger.exception("flush antrian piket %s gagal", current_domain)
 
-        absensi_session: AbsensiSession = (
-            AbsensiSession.objects.filter(kelas__in=[siswa_obj.kelas_id])
-            .filter(**{nameOfDay: True})
-            .first()
-        )
-
-        if absensi_session is None:
-            invalids.append(absensi)
-            continue
-
-        if absensi.type == "absen_pulang":
-            if absensi_obj:
-                absensi_obj.status = Absensi.StatusChoices.HADIR
-                # absensi_obj.save()
-                updated_absensies.append(absensi_obj)
-            else:
-                invalids.append(absensi)
-
-        elif absensi.type == "absen_masuk" and absensi_obj is None:
-            jam_keluar = datetime.combine(
-                timezone.now().date(),
-                absensi_session.jam_keluar,
-                tzinfo=settings.TIME_ZONE_OBJ,
-            )
+    # invalids berfungsi untuk mengembalikan data yang tidak valid ke client guru piket
+    # untuk sementara ini akan konstan return empty array
+    return {"data": {"invalids": []}}
 
-            new_absensi = Absensi(
-                date=date,
-                siswa_id=absensi.siswa,
-                by_id=request.auth.pk,
-                wait_expired_at=jam_keluar,
-                status=Absensi.StatusChoices.WAIT,
-            )
-            new_absensies.append(new_absensi)
 
-    # hit db
-    with transaction.atomic():
-        Absensi.objects.bulk_create(new_absensies)
-        Absensi.objects.bulk_update(updated_absensies, fields=["_status"])
+@api.post("/piket/scan", response={404: ErrorSchema, 200: SuccessSchema})
+def piket_scan(request: HttpRequest, data: PiketDataUploadSchema):
+    """
+    1 scan QR di gerbang. Hanya cek siswa ke roster redis lalu masuk antrian
+    (tanpa query absensi), ditulis ke database oleh `manage.py piketflush`
+    dengan logic yang sama seperti /piket/upload.
+    """
+    if not piket_queue.is_known_siswa(data.siswa):
+        return 404, {"detail": "Siswa tidak ditemukan"}
 
-    # waiting data akan dihapus jika tidak diproses lebih dari 2 hari
-    invalids_pickled = pickle.dumps(invalids)
-    redis_client.set(waiting_data_key, invalids_pickled, ex=86400 * 2)
+    piket_queue.push(request.META["HTTP_HOST"], request.auth.pk, [data.model_dump()])
 
-    # invalids berfungsi untuk mengembalikan data yang tidak valid ke client guru piket
-    # untuk sementara ini akan konstan return empty array
-    return {"data": {"invalids": []}}
+    return {"data": {"queued": True}}
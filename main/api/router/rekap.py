@@ -1,27 +1,41 @@
-import threading
-import calendar
-import hashlib
+from django.conf import settings
+from ninja import Query
 
 from main.api.api import api
 from main.api.core.types import HttpRequest
 from main.helpers import pdf as helpers_pdf
-from main.helpers import redis
-from main.helpers.humanize import localize_month_to_string
-from main.models import Kelas, Absensi
-from datetime import date
+from main.helpers import rekap_bulk, rekap_job, render_pool
+from main.models import Kelas, User
 from ..schemas import ErrorSchema, SuccessSchema
 
-REKAP_THREADING_LOCK = threading.Lock()
-
 
 @api.get(
-    "/get-rekap", response={404: ErrorSchema, 500: ErrorSchema, 200: SuccessSchema}
+    "/get-rekap",
+    response={
+        404: ErrorSchema,
+        500: ErrorSchema,
+        503: ErrorSchema,
+        200: SuccessSchema,
+        202: SuccessSchema,
+    },
 )
-def get_rekap(request: HttpRequest, bulan: int, kelas: int, tahun: int):
+def get_rekap(
+    request: HttpRequest,
+    bulan: int,
+    kelas: int,
+    tahun: int,
+    run_async: bool = Query(False, alias="async"),
+):
+    """
+    Pdf untuk 1 rekap id hanya dibuat sekali di semua worker (lock redis).
+
+    `?async=1` -> langsung kembali dengan status "pending" (202) selama pdf
+    dibuat, client memanggil ulang endpoint ini sampai status "done".
+    Tanpa async, request menunggu pdf selesai (dibuat sendiri atau oleh
+    request lain).
+    """
     kelas_obj = Kelas.objects.filter(pk=kelas).first()
 
-    bulan_str = localize_month_to_string(bulan)
-
     if not kelas_obj:
         return 404, {"detail": "kelas not found"}
 
@@ -42,39 +56,101 @@ def get_rekap(request: HttpRequest, bulan: int, kelas: int, tahun: int):
     if not can_access:
         return 404, {"detail": "kelas not found"}
 
-    date_start = date(tahun, bulan, 1)
-    last_day_of_month = calendar.monthrange(tahun, bulan)[1]
-    date_end = date(tahun, bulan, last_day_of_month)
+    file_id, is_cached = rekap_job.get_rekap_id(kelas, tahun, bulan)
+    if is_cached:
+        return {"data": {"file_id": file_id, "status": rekap_job.STATUS_DONE}}
+
+    filename = helpers_pdf.get_filename(kelas_obj, bulan, tahun)
+
+    status = rekap_job.get_status(file_id)
+
+    if status is None:
+        token = rekap_job.acquire(file_id)
+
+        if token is not None and run_async:
+            rekap_job.submit(file_id, token, kelas_obj, bulan, tahun, filename)
+        elif token is not None:
+            try:
+                rekap_job.run(
+                    file_id, token, kelas_obj, bulan, tahun, filename,
+                    record_error=False,
+                )
+            except render_pool.RenderPoolBusy:
+                return 503, {"detail": "Server sedang sibuk, coba lagi beberapa saat"}
+
+        status = rekap_job.get_status(file_id)
+
+    is_pending = status is not None and status.status == rekap_job.STATUS_PENDING
+    if is_pending and not run_async:
+        # pdf sedang dibuat request/worker lain, client lama menunggu hasilnya
+        status = rekap_job.wait(file_id, settings.REKAP_RENDER_TIMEOUT)
+
+    if status is None:
+        # job hilang (worker mati), request berikutnya membuat ulang
+        return 503, {"detail": "Server sedang sibuk, coba lagi beberapa saat"}
+
+    if status.status == rekap_job.STATUS_ERROR:
+        return status.status_code, {"detail": status.detail}
+
+    if status.status == rekap_job.STATUS_PENDING:
+        if not run_async:
+            return 503, {"detail": "Server sedang sibuk, coba lagi beberapa saat"}
+        return 202, {"data": {"file_id": file_id, "status": status.status}}
 
-    absensi_hash = Absensi.objects.filter(
-        siswa__kelas__pk=kelas, date__gte=date_start, date__lte=date_end
-    ).values_list("pk", "_status")
-    absensi_hash = dict(absensi_hash)
-    absensi_hash = str(absensi_hash).encode()
-    absensi_hash = hashlib.md5(absensi_hash).hexdigest()
+    return {"data": {"file_id": file_id, "status": status.status}}
 
-    file_id = f"rekap-{absensi_hash}"
 
-    # CACHING FILE ID
-    with redis.get_client() as redis_client:
-        cached_file_id = redis_client.exists(file_id)
-        if cached_file_id:
-            return {"data": {"file_id": file_id}}
+@api.get("/rekap/metrics", response={403: ErrorSchema, 200: SuccessSchema})
+def get_rekap_metrics(request: HttpRequest):
+    if request.auth.type != User.TypeChoices.KESISWAAN:
+        return 403, {"detail": "Hanya kesiswaan"}
 
-    with REKAP_THREADING_LOCK:  # hanya 1 pembuatan pdf dalam 1 waktu (per worker)
-        file = helpers_pdf.generate_pdf(kelas_obj, bulan, tahun)
+    return {"data": render_pool.get_metrics()}
 
-    filename = "Rekap %s-%s%s.pdf" % (kelas_obj.name, bulan_str, tahun)
-    filename = filename.replace(" ", "-")
-    filename_with_padding = filename.encode().ljust(100, b"\r")
 
-    mimetype = "application/pdf"
-    mimetype_with_padding = mimetype.encode().ljust(100, b"\r")
+def _bulk_job_response(job_id: str, job: dict) -> dict:
+    return {
+        "data": {
+            "job_id": job_id,
+            "status": job["status"],
+            "total": job["total"],
+            "done": job["done"],
+            "file_id": job.get("file_id"),
+        }
+    }
 
-    file_with_filename = filename_with_padding + mimetype_with_padding + file
 
-    with redis.get_client() as redis_client:
-        # file akan kadaluarsa/terhapus dalam 24 jam
-        redis_client.set(file_id, file_with_filename, ex=3600 * 24)
+@api.post(
+    "/rekap/bulk", response={403: ErrorSchema, 404: ErrorSchema, 202: SuccessSchema}
+)
+def start_rekap_bulk(request: HttpRequest, bulan: int, tahun: int):
+    """
+    Rekap semua kelas aktif dalam 1 zip. Progress dan file_id diambil lewat
+    GET /rekap/bulk/{job_id}.
+    """
+    if request.auth.type != User.TypeChoices.KESISWAAN:
+        return 403, {"detail": "Hanya kesiswaan"}
+
+    if not 1 <= bulan <= 12:
+        return 404, {"detail": "bulan not found"}
+
+    if tahun <= 99:
+        tahun += 2000
+
+    job_id = rekap_bulk.start(bulan, tahun)
+    return 202, _bulk_job_response(job_id, rekap_bulk.get_job(job_id))
+
+
+@api.get(
+    "/rekap/bulk/{job_id}",
+    response={403: ErrorSchema, 404: ErrorSchema, 200: SuccessSchema},
+)
+def get_rekap_bulk(request: HttpRequest, job_id: str):
+    if request.auth.type != User.TypeChoices.KESISWAAN:
+        return 403, {"detail": "Hanya kesiswaan"}
+
+    job = rekap_bulk.get_job(job_id)
+    if job is None:
+        return 404, {"detail": "job not found"}
 
-    return {"data": {"file_id": file_id}}
+    return _bulk_job_response(job_id, job)
@@ -8,17 +8,20 @@ from dataclasses import dataclass
 
 from dateutil import parser as dateutil_parser
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Q
 from django.utils import timezone
 from lzstring import LZString
+from ninja import Query
 
 from main.api.api import api
 from main.api.core.types import HttpRequest
+from main.helpers import idempotency, upload_queue, versions
 from main.models import Absensi, KunciAbsensi, Siswa, Kelas, User
 
 from ..schemas import (
     DataCompressedUploadSchema,
+    DataUploadDetailSchema,
     DataUploadSchema,
     ErrorSchema,
     SuccessSchema,
@@ -76,6 +79,33 @@ class UploadView:
         d = date.date() if isinstance(date, datetime) else date
         return d.strftime("%d-%m-%Y")
 
+    @staticmethod
+    def _get_payload(item) -> dict:
+        if isinstance(item, DataUploadDetailSchema):
+            # format lama: payload berupa string JSON
+            return json.loads(item.data)
+
+        return item.model_dump(exclude_none=True, exclude={"action"})
+
+    @staticmethod
+    def _grouped_lookup(field: str, keys: dict) -> Q:
+        """
+        Filter tepat untuk pasangan (date, id) tanpa 1 term per pasangan.
+        Tanggal dengan himpunan id yang sama digabung menjadi satu term
+        `date__in` + `<field>__in`, sehingga jumlah term paling banyak
+        sebanyak tanggal unik (umumnya 1: satu kelas penuh selama beberapa
+        hari).
+        """
+        groups = defaultdict(list)  # frozenset(id) → [date, ...]
+        for date, ids in keys.items():
+            groups[frozenset(ids)].append(date)
+
+        lookup = Q()
+        for ids, dates in groups.items():
+            lookup |= Q(date__in=dates, **{f"{field}__in": ids})
+
+        return lookup
+
     def _parse_data(self):
         """
         Parse & preload semua data yang dibutuhkan dalam batch.
@@ -106,7 +136,7 @@ class UploadView:
         siswa_ids = []
 
         for d in datas:
-            payload = json.loads(d.data)
+            payload = self._get_payload(d)
             raw_payloads.append((d, payload))
             if d.action == "absen":
                 siswa_ids.append(payload["siswa"])
@@ -117,9 +147,9 @@ class UploadView:
             for s in Siswa.objects.filter(pk__in=siswa_ids).select_related("kelas"):
                 siswas[s.pk] = s
 
-        # --- Pass 2: build parsed actions + filter queries ---
-        lock_filter_q = None
-        absensi_filter_q = None
+        # --- Pass 2: build parsed actions + kumpulkan key lookup ---
+        absensi_keys = defaultdict(set)  # date → {siswa_id, ...}
+        lock_keys = defaultdict(set)  # date → {kelas_id, ...}
         kelas_ids_for_sek = set()
 
         for d, payload in raw_payloads:
@@ -141,13 +171,8 @@ class UploadView:
                 kelas_ids_for_sek.add(siswa.kelas_id)
 
                 # Filter langsung per siswa_id (tanpa JOIN ke kelas)
-                q = Q(siswa_id=siswa.pk) & Q(date=date)
-                absensi_filter_q = (
-                    q if absensi_filter_q is None else absensi_filter_q | q
-                )
-
-                lq = Q(kelas_id=siswa.kelas_id) & Q(date=date)
-                lock_filter_q = lq if lock_filter_q is None else lock_filter_q | lq
+                absensi_keys[date.date()].add(siswa.pk)
+                lock_keys[date.date()].add(siswa.kelas_id)
 
             elif d.action in ("lock", "unlock"):
                 kelas_id = payload["kelas"]
@@ -157,8 +182,7 @@ class UploadView:
                     )
                 )
 
-                lq = Q(kelas_id=kelas_id) & Q(date=date)
-                lock_filter_q = lq if lock_filter_q is None else lock_filter_q | lq
+                lock_keys[date.date()].add(kelas_id)
 
         # --- Query 2: Batch load sekretaris per kelas (2 queries via prefetch) ---
         if kelas_ids_for_sek:
@@ -172,16 +196,19 @@ class UploadView:
                 self.kelas_sekretaris[k.pk] = {s.pk for s in k.sekretaris.all()}
 
         # --- Query 3: Batch load locks (1 query) ---
-        if lock_filter_q:
-            for lock in KunciAbsensi.objects.filter(lock_filter_q):
+        if lock_keys:
+            lock_qs = KunciAbsensi.objects.filter(
+                self._grouped_lookup("kelas_id", lock_keys)
+            )
+            for lock in lock_qs:
                 key = f"{self._date_key(lock.date)}_{lock.kelas_id}"
                 self.locks[key] = lock.locked
 
         # --- Query 4: Batch load existing absensies + relasi (1 query) ---
-        if absensi_filter_q:
-            absensi_qs = Absensi.objects.filter(absensi_filter_q).select_related(
-                "by", "siswa", "siswa__kelas"
-            )
+        if absensi_keys:
+            absensi_qs = Absensi.objects.filter(
+                self._grouped_lookup("siswa_id", absensi_keys)
+            ).select_related("by", "siswa", "siswa__kelas")
             for a in absensi_qs:
                 key = f"{self._date_key(a.date)}_{a.siswa_id}"
                 self.absensies[key] = a
@@ -196,6 +223,12 @@ class UploadView:
         conflicts = []
         new_absensies = []
         updated_absensies = []
+        # (kelas_id, date) kunci yang berubah, versi shard bulan ikut naik
+        touched_locks = set()
+        # (kelas_id, date) absensi yang berubah, versi rekap bulan ikut naik
+        touched_absensi = set()
+        lock_changes = {}  # "{dd-mm-yyyy}_{kelas_id}" → KunciAbsensi
+        owned_kelas_ids = None
 
         for item in self.parsed_actions:
             payload = item.payload
@@ -224,6 +257,8 @@ class UploadView:
                         "detail": f"Tidak bisa melanjutkan aksi. Absen tanggal {date} sedang dikunci, coba hubungi wali kelas atau operator"
                     }
 
+                touched_absensi.add((siswa.kelas_id, date))
+
                 updated_at_int = int(payload.get("updated_at", time.time()))
                 updated_at = datetime.fromtimestamp(updated_at_int).astimezone(
                     settings.TIME_ZONE_OBJ
@@ -288,25 +323,31 @@ class UploadView:
                     transaction.set_rollback(True)
                     return 403, {"detail": "Ditolak"}
 
-                kelas_id = payload["kelas"]
-                is_kelas_owner = Kelas.objects.own(user.pk).filter(pk=kelas_id).exists()
-                if not is_kelas_owner:
+                if owned_kelas_ids is None:
+                    # ownership semua kelas di-resolve sekali (1 query)
+                    owned_kelas_ids = self._get_owned_kelas_ids(user)
+
+                kelas_id = int(payload["kelas"])
+                if kelas_id not in owned_kelas_ids:
                     transaction.set_rollback(True)
                     return 403, {"detail": "Ditolak"}
 
                 locked = item.action == "lock"
 
-                KunciAbsensi.objects.update_or_create(
-                    date=date,
-                    kelas__pk=kelas_id,
-                    defaults={"locked": locked, "date": date, "kelas_id": kelas_id},
-                )
-
                 # Update in-memory lock state agar absen berikutnya
                 # dalam request yang sama melihat state terbaru
                 lock_key = f"{self._date_key(date)}_{kelas_id}"
                 self.locks[lock_key] = locked
 
+                # state terakhir per (date, kelas) ditulis sekaligus
+                lock_changes[lock_key] = KunciAbsensi(
+                    date=date.date(), kelas_id=kelas_id, locked=locked
+                )
+                touched_locks.add((kelas_id, date.date()))
+
+        if lock_changes:
+            self._upsert_locks(lock_changes.values())
+
         new_absensies_distinct = {}
         for a in new_absensies:
             key = f"{self._date_key(a.date)}_{a.siswa_id}"
@@ -317,12 +358,48 @@ class UploadView:
             Absensi.objects.bulk_create(new_absensies_distinct.values())
 
         if updated_absensies:
+            # bulk_update tidak menjalankan auto_now
+            changed_at = timezone.now()
+            for a in updated_absensies:
+                a.changed_at = changed_at
+
             Absensi.objects.bulk_update(
-                updated_absensies, ["_status", "updated_at", "by_id"]
+                updated_absensies, ["_status", "updated_at", "by_id", "changed_at"]
             )
 
+        # bulk_create/bulk_update tidak memicu signal
+        versions.bump_locks(touched_locks)
+        versions.bump_absensi(touched_absensi)
+
         return {"data": {"conflicts": conflicts}}
 
+    def _get_owned_kelas_ids(self, user) -> set:
+        kelas_ids = {
+            int(item.payload["kelas"])
+            for item in self.parsed_actions
+            if item.action in ("lock", "unlock")
+        }
+        return set(
+            Kelas.objects.own(user.pk)
+            .filter(pk__in=kelas_ids)
+            .values_list("pk", flat=True)
+        )
+
+    @staticmethod
+    def _upsert_locks(locks):
+        """1 query INSERT ... ON CONFLICT untuk semua perubahan lock"""
+        unique_fields = None
+        if connection.features.supports_update_conflicts_with_target:
+            unique_fields = ["kelas", "date"]
+
+        # bulk_create tetap menjalankan auto_now (changed_at)
+        KunciAbsensi.objects.bulk_create(
+            locks,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=["locked", "changed_at"],
+        )
+
     @staticmethod
     def _build_conflict(absensi, user, new_status):
         """Build conflict dict. Semua field sudah preloaded via select_related."""
@@ -344,20 +421,116 @@ class UploadView:
         }
 
 
-@api.post("/upload", response={403: ErrorSchema, 400: ErrorSchema, 200: SuccessSchema})
-@transaction.atomic
-def upload(request: HttpRequest, data: DataUploadSchema):
-    view = UploadView(request, data)
-    rv = view.handle()
-    return rv
+@api.post(
+    "/upload",
+    response={
+        403: ErrorSchema,
+        400: ErrorSchema,
+        409: ErrorSchema,
+        200: SuccessSchema,
+        202: SuccessSchema,
+    },
+)
+def upload(
+    request: HttpRequest,
+    data: DataUploadSchema,
+    run_async: bool = Query(False, alias="async"),
+):
+    """
+    `?async=1` -> batch hanya divalidasi lalu dimasukkan ke antrian, diproses
+    oleh `manage.py uploadworker`. Hasil (termasuk conflicts) diambil lewat
+    GET /upload/{job_id}.
+
+    Header `Idempotency-Key` -> hasil batch yang sudah commit disimpan, retry
+    dengan key yang sama langsung mendapat hasil tersebut tanpa query.
+    """
+    return _idempotent(request, lambda: _upload(request, data, run_async))
+
+
+def _idempotent(request: HttpRequest, process):
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if not idempotency_key:
+        return process()
+
+    user_id = request.auth.pk
+
+    replay = idempotency.begin(user_id, idempotency_key)
+    if replay is not None:
+        return replay
+
+    stop_keep_alive = idempotency.keep_alive(user_id, idempotency_key)
+    try:
+        try:
+            status_code, body = process()
+        finally:
+            stop_keep_alive()
+    except Exception:
+        idempotency.release(user_id, idempotency_key)
+        raise
+
+    if status_code in (200, 202):
+        idempotency.save(user_id, idempotency_key, status_code, body)
+    else:
+        # batch di-rollback, retry boleh diproses ulang
+        idempotency.release(user_id, idempotency_key)
+
+    return status_code, body
+
+
+def _upload(request: HttpRequest, data: DataUploadSchema, run_async: bool):
+    if run_async:
+        job_id = upload_queue.enqueue(
+            request.auth.pk, [d.model_dump(exclude_none=True) for d in data.data]
+        )
+        return 202, {"data": {"job_id": job_id}}
+
+    with transaction.atomic():
+        view = UploadView(request, data)
+        rv = view.handle()
+
+    return rv if isinstance(rv, tuple) else (200, rv)
+
+
+@api.post(
+    "/compressed-upload",
+    response={
+        403: ErrorSchema,
+        400: ErrorSchema,
+        409: ErrorSchema,
+        200: SuccessSchema,
+        202: SuccessSchema,
+    },
+)
+def compressed_upload(
+    request: HttpRequest,
+    data: DataCompressedUploadSchema,
+    run_async: bool = Query(False, alias="async"),
+):
+    def process():
+        lz = LZString()
+
+        data_decompressed_json = lz.decompressFromBase64(data.data)
+        data_decompressed = json.loads(data_decompressed_json)
+
+        data_upload = DataUploadSchema(data=data_decompressed)
+        return _upload(request, data_upload, run_async)
 
+    # replay dijawab sebelum dekompresi
+    return _idempotent(request, process)
 
-@api.post("/compressed-upload", response={403: ErrorSchema, 200: SuccessSchema})
-def compressed_upload(request: HttpRequest, data: DataCompressedUploadSchema):
-    lz = LZString()
 
-    data_decompressed_json = lz.decompressFromBase64(data.data)
-    data_decompressed = json.loads(data_decompressed_json)
+@api.get("/upload/{job_id}", response={404: ErrorSchema, 200: SuccessSchema})
+def upload_job(request: HttpRequest, job_id: str):
+    job = upload_queue.get_job(job_id)
 
-    data_upload = DataUploadSchema(data=data_decompressed)
-    return upload(request, data_upload)
+    if job is None or job["user_id"] != request.auth.pk:
+        return 404, {"detail": "job not found"}
+
+    return {
+        "data": {
+            "job_id": job_id,
+            "status": job["status"],
+            "status_code": job.get("status_code"),
+            "result": job.get("result"),
+        }
+    }
@@ -1,6 +1,7 @@
-from typing import Any, List, Literal
+from typing import Any, List, Literal, Optional, Union
 
 from ninja import Schema
+from pydantic import model_validator
 
 
 class LoginSchema(Schema):
@@ -20,8 +21,30 @@ class DataUploadDetailSchema(Schema):
     data: str
 
 
+class UploadActionSchema(Schema):
+    """format datar tanpa JSON di dalam JSON, dipakai client baru"""
+
+    action: Literal["absen", "lock", "unlock"]
+    date: str
+    siswa: Optional[int] = None
+    kelas: Optional[int] = None
+    status: Optional[str] = None
+    previous_status: Optional[str] = None
+    updated_at: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_required_fields(self):
+        if self.action == "absen" and (self.siswa is None or self.status is None):
+            raise ValueError("absen membutuhkan siswa dan status")
+
+        if self.action in ("lock", "unlock") and self.kelas is None:
+            raise ValueError("%s membutuhkan kelas" % self.action)
+
+        return self
+
+
 class DataUploadSchema(Schema):
-    data: List[DataUploadDetailSchema]
+    data: List[Union[DataUploadDetailSchema, UploadActionSchema]]
 
 
 class ChangePasswordSchema(Schema):
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+from django.conf import settings
+
+from main.helpers import redis
+
+# metadata artifact (hash), kadaluarsa bersama file-nya
+ARTIFACT_KEY = "artifact_%s"
+# file_id → waktu kadaluarsa, dipakai cleanup untuk menghapus file di disk
+EXPIRY_KEY = "artifact_expiry"
+# cleanup berjalan paling sering sekali per CLEANUP_INTERVAL
+CLEANUP_LOCK_KEY = "artifact_cleanup"
+CLEANUP_INTERVAL = 60 * 10
+
+# file akan kadaluarsa/terhapus dalam 24 jam
+DEFAULT_TTL = 3600 * 24
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_FILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class Artifact(NamedTuple):
+    file_id: str
+    path: Path
+    filename: str
+    mimetype: str
+    size: int
+    etag: str
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _get_path(file_id: str) -> Path:
+    if not _FILE_ID_RE.match(file_id):
+        raise ValueError("file_id tidak valid: %r" % file_id)
+
+    return Path(settings.ARTIFACTS_ROOT) / file_id
+
+
+def store(
+    file_id: str, filename: str, mimetype: str, content: bytes, ttl: int = DEFAULT_TTL
+) -> Artifact:
+    """
+    Simpan file ke ARTIFACTS_ROOT dan metadata-nya ke redis. File ditulis ke
+    file sementara lalu di-rename, pembaca tidak pernah melihat file setengah
+    jadi.
+    """
+    f, tmp_path = create_temp_file(file_id)
+    try:
+        with f:
+            f.write(content)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return store_file(file_id, filename, mimetype, tmp_path, ttl)
+
+
+def create_temp_file(file_id: str) -> tuple[BinaryIO, Path]:
+    """
+    File sementara (w+b) di folder artifact, untuk file besar yang ditulis
+    bertahap lalu disimpan dengan store_file. Return (file, path).
+    """
+    path = _get_path(file_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    return os.fdopen(fd, "w+b"), Path(tmp_path)
+
+
+def store_file(
+    file_id: str, filename: str, mimetype: str, tmp_path: Path, ttl: int = DEFAULT_TTL
+) -> Artifact:
+    """
+    Simpan file sementara dari create_temp_file (sudah ditutup) sebagai
+    artifact dengan rename, isi file tidak dibaca ke memori sekaligus.
+    """
+    path = _get_path(file_id)
+
+    try:
+        digest = hashlib.md5()
+        size = 0
+        with open(tmp_path, "rb") as f:
+            while chunk := f.read(STREAM_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    artifact = Artifact(
+        file_id=file_id,
+        path=path,
+        filename=filename,
+        mimetype=mimetype,
+        size=size,
+        etag=digest.hexdigest(),
+    )
+
+    key = ARTIFACT_KEY % file_id
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline() as pipe:
+        pipe.hset(
+            key,
+            mapping={
+                "filename": artifact.filename,
+                "mimetype": artifact.mimetype,
+                "size": artifact.size,
+                "etag": artifact.etag,
+            },
+        )
+        pipe.expire(key, ttl)
+        pipe.zadd(EXPIRY_KEY, {file_id: time.time() + ttl})
+        pipe.execute()
+
+    maybe_cleanup()
+
+    return artifact
+
+
+def get(file_id: str) -> Optional[Artifact]:
+    """metadata artifact (1 round trip redis), None jika tidak ada/kadaluarsa"""
+    if not _FILE_ID_RE.match(file_id):
+        return None
+
+    meta = redis.get_singleton_client().hgetall(ARTIFACT_KEY % file_id)
+    if not meta:
+        return None
+
+    meta = {k.decode(): v.decode() for k, v in meta.items()}
+    path = _get_path(file_id)
+
+    # file terhapus manual / ARTIFACTS_ROOT tidak di-share antar server
+    if not path.exists():
+        return None
+
+    return Artifact(
+        file_id=file_id,
+        path=path,
+        filename=meta["filename"],
+        mimetype=meta["mimetype"],
+        size=int(meta["size"]),
+        etag=meta["etag"],
+    )
+
+
+def maybe_cleanup():
+    redis_client = redis.get_singleton_client()
+    if redis_client.set(CLEANUP_LOCK_KEY, 1, nx=True, ex=CLEANUP_INTERVAL):
+        cleanup()
+
+
+def cleanup(now: Optional[float] = None) -> int:
+    """
+    Hapus file yang sudah kadaluarsa. File tanpa entry di index (mis. redis
+    di-restart) dihapus berdasarkan mtime. Return jumlah file yang dihapus.
+    """
+    now = now or time.time()
+    redis_client = redis.get_singleton_client()
+    removed = 0
+
+    expired = redis_client.zrangebyscore(EXPIRY_KEY, "-inf", now)
+    for file_id in expired:
+        file_id = file_id.decode()
+
+        # artifact bisa saja disimpan ulang dengan TTL baru
+        if redis_client.exists(ARTIFACT_KEY % file_id):
+            continue
+
+        try:
+            _get_path(file_id).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    if expired:
+        redis_client.zremrangebyscore(EXPIRY_KEY, "-inf", now)
+
+    root = Path(settings.ARTIFACTS_ROOT)
+    if root.exists():
+        for path in root.iterdir():
+            try:
+                mtime = path.stat().st_mtime
+            except FileNotFoundError:
+                # sudah di-rename/dihapus worker lain sejak iterdir
+                continue
+
+            if mtime > now - DEFAULT_TTL:
+                continue
+            if not path.name.startswith(".tmp-") and redis_client.exists(
+                ARTIFACT_KEY % path.name
+            ):
+                continue
+
+            path.unlink(missing_ok=True)
+            removed += 1
+
+    return removed
+
+
+def parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """
+    Header Range "bytes=start-end" → (start, end) inklusif. None jika header
+    tidak dikenal (kirim file utuh), RangeNotSatisfiable jika di luar file.
+    Hanya 1 range yang didukung.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # suffix: n byte terakhir
+        length = int(end)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+
+    if start >= size or end < start:
+        raise RangeNotSatisfiable
+
+    return start, min(end, size - 1)
+
+
+def iter_file(file: BinaryIO, start: int, end: int) -> Iterator[bytes]:
+    """
+    isi file dari start sampai end (inklusif) per STREAM_CHUNK_SIZE. File
+    sudah dibuka pemanggil (sebelum response dikirim) dan ditutup di sini.
+    """
+    with file as f:
+        f.seek(start)
+        remaining = end - start + 1
+
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
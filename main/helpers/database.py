@@ -1,77 +1,33 @@
+import os
 import sqlite3
-import re
+from datetime import date
+from itertools import islice
+from tempfile import TemporaryDirectory
 
+from django.utils import timezone
 
-def minimize_sql_dump(raw_sql):
-    # 1. Pisahkan perintah non-insert (CREATE, BEGIN, dll) dan perintah INSERT
-    lines = raw_sql.split(";;")
+from main.models.base import get_final_status
 
-    non_insert_statements = []
-    insert_data = {}  # Format: {'nama_tabel': [value1, value2, ...]}
+SQLITE_MIMETYPE = "application/vnd.sqlite3"
 
-    # Regex untuk menangkap nama tabel dan isi VALUES
-    # Pola: INSERT INTO "nama_tabel" VALUES(isi_data)
-    insert_pattern = re.compile(r'INSERT INTO "(.+?)" VALUES\((.+?)\)', re.IGNORECASE)
+# jumlah baris per fetch database dan per statement INSERT
+DUMP_CHUNK_SIZE = 2000
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
+# jumlah natural key per statement DELETE di delta sync
+DELETE_CHUNK_SIZE = 500
 
-        match = insert_pattern.search(line)
-        if match:
-            table_name = match.group(1)
-            values = f"({match.group(2)})"
-
-            if table_name not in insert_data:
-                insert_data[table_name] = []
-            insert_data[table_name].append(values)
-        else:
-            # Simpan perintah selain INSERT (seperti CREATE TABLE)
-            non_insert_statements.append(line)
-
-    # 2. Rekonstruksi SQL menjadi Batch Insert
-    minimized_sql = []
-
-    # Tambahkan perintah awal (BEGIN, CREATE TABLE, dll)
-    for stmt in non_insert_statements:
-        if "COMMIT" not in stmt:  # Kita handle COMMIT di paling akhir
-            minimized_sql.append(f"{stmt};")
-
-    # Tambahkan hasil batch insert
-    for table, values_list in insert_data.items():
-        batch_query = f'INSERT INTO "{table}" VALUES {", ".join(values_list)};'
-        minimized_sql.append(batch_query)
-
-    # Tutup dengan COMMIT
-    minimized_sql.append("COMMIT;")
-
-    return "\n".join(minimized_sql)
-
-
-def dump_to_sqlite(kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs):
-    conn = sqlite3.connect(":memory:")
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE kelas (
+SCHEMA = [
+    """CREATE TABLE kelas (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL
-    );
-    """)
-
-    # Tabel Siswa
-    cursor.execute("""
-    CREATE TABLE siswa (
+    )""",
+    """CREATE TABLE siswa (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         fullname TEXT NOT NULL,
         kelas_id INTEGER NOT NULL,
         FOREIGN KEY (kelas_id) REFERENCES kelas(id) ON DELETE RESTRICT
-    );
-    """)
-
-    cursor.execute("""
-    CREATE TABLE absensi (
+    )""",
+    """CREATE TABLE absensi (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         date DATE NOT NULL,
         siswa_id INTEGER NOT NULL,
@@ -80,56 +36,284 @@ def dump_to_sqlite(kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs):
         updated_at INTEGER,
         FOREIGN KEY (siswa_id) REFERENCES siswa(id) ON DELETE RESTRICT,
         UNIQUE(date, siswa_id)
-    );
-    """)
-
-    cursor.execute("""
-    CREATE TABLE kunci_absensi (
+    )""",
+    """CREATE TABLE kunci_absensi (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         date DATE NOT NULL,
         kelas_id INTEGER NOT NULL
-    );
-    """)
-
-    cursor.execute("""
-    CREATE TABLE kelas_sekretaris (
+    )""",
+    """CREATE TABLE kelas_sekretaris (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         kelas_id INTEGER NOT NULL,
         siswa_id INTEGER NOT NULL,
         FOREIGN KEY (kelas_id) REFERENCES kelas(id) ON DELETE CASCADE,
         FOREIGN KEY (siswa_id) REFERENCES siswa(id) ON DELETE CASCADE,
         UNIQUE(kelas_id, siswa_id)
-    );
-    """)
+    )""",
+]
 
-    for k in kelas_qs:
-        cursor.execute("INSERT INTO kelas (id, name) VALUES (?, ?)", (k.id, k.name))
 
-    # Siswa
-    for s in siswa_qs:
-        cursor.execute(
-            "INSERT INTO siswa (id, fullname, kelas_id) VALUES (?, ?, ?)",
-            (s.id, s.fullname, s.kelas_id),
-        )
+ABSENSI_COLUMNS = ("id", "date", "siswa_id", "status", "updated_at")
+KUNCI_ABSENSI_COLUMNS = ("id", "date", "kelas_id")
+
 
-    # Absensi
-    absensies_values = []
+def _absensi_rows(absensi_qs, chunk_size):
+    """baris absensi dibaca sebagai tuple per chunk, bukan model instance"""
+    now = timezone.now()
+    return (
+        (
+            pk,
+            str(d),
+            siswa_id,
+            get_final_status(status, wait_expired_at, now),
+            int(updated_at.timestamp()),
+        )
+        for pk, d, siswa_id, status, wait_expired_at, updated_at in (
+            absensi_qs.values_list(
+                "pk", "date", "siswa_id", "_status", "wait_expired_at", "updated_at"
+            ).iterator(chunk_size=chunk_size)
+        )
+    )
 
-    for a in absensi_qs:
-        data = (a.id, str(a.date), a.siswa_id, a.status, int(a.updated_at.timestamp()))
-        absensies_values.append(data)
 
-    cursor.executemany(
-        "INSERT INTO absensi (id, date, siswa_id, status, updated_at) VALUES (?, ?, ?, ?, ?)",
-        absensies_values,
+def _lock_rows(lock_absensi_qs, chunk_size):
+    return (
+        (pk, str(d), kelas_id)
+        for pk, d, kelas_id in lock_absensi_qs.values_list(
+            "pk", "date", "kelas_id"
+        ).iterator(chunk_size=chunk_size)
     )
 
-    # Lock Absen
-    for l in lock_absensi_qs:  # noqa: E741
-        cursor.execute(
-            "INSERT INTO kunci_absensi (id, date, kelas_id) VALUES (?, ?, ?)",
-            (l.id, l.date, l.kelas_id),
+
+def _iter_dump_tables(kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs, chunk_size):
+    """return (nama tabel, kolom, iterator baris) untuk setiap tabel dump"""
+    return [
+        (
+            "kelas",
+            ("id", "name"),
+            kelas_qs.values_list("pk", "name").iterator(chunk_size=chunk_size),
+        ),
+        (
+            "siswa",
+            ("id", "fullname", "kelas_id"),
+            siswa_qs.values_list("pk", "fullname", "kelas_id").iterator(
+                chunk_size=chunk_size
+            ),
+        ),
+        ("absensi", ABSENSI_COLUMNS, _absensi_rows(absensi_qs, chunk_size)),
+        (
+            "kunci_absensi",
+            KUNCI_ABSENSI_COLUMNS,
+            _lock_rows(lock_absensi_qs, chunk_size),
+        ),
+    ]
+
+
+def _iter_inserts(table, columns, rows, chunk_size, replace=False):
+    """1 statement INSERT untuk setiap `chunk_size` baris"""
+    verb = "INSERT OR REPLACE" if replace else "INSERT"
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        values = ", ".join(
+            "(%s)" % ", ".join(sql_literal(v) for v in row) for row in chunk
+        )
+        yield '%s INTO "%s" (%s) VALUES %s;\n' % (
+            verb,
+            table,
+            ", ".join(columns),
+            values,
+        )
+
+
+def dump_to_sqlite(
+    kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs, chunk_size=DUMP_CHUNK_SIZE
+):
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    tables = _iter_dump_tables(
+        kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs, chunk_size
+    )
+    for table, columns, rows in tables:
+        cursor.executemany(
+            "INSERT INTO %s (%s) VALUES (%s)"
+            % (table, ", ".join(columns), ", ".join("?" * len(columns))),
+            rows,
         )
 
     conn.commit()
     return conn
+
+
+def iter_sql_dump(
+    kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs, chunk_size=DUMP_CHUNK_SIZE
+):
+    """
+    Dump SQL tanpa database sqlite perantara dan tanpa menampung seluruh
+    dump dalam satu string. Menghasilkan SQL per potongan (1 INSERT berisi
+    maksimal `chunk_size` baris) sehingga memori tetap konstan berapapun
+    jumlah absensinya.
+    """
+    yield "BEGIN TRANSACTION;\n"
+
+    for statement in SCHEMA:
+        yield "%s;\n" % statement
+
+    tables = _iter_dump_tables(
+        kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs, chunk_size
+    )
+    for table, columns, rows in tables:
+        yield from _iter_inserts(table, columns, rows, chunk_size)
+
+    yield "COMMIT;"
+
+
+def iter_month_sql(
+    absensi_qs, lock_absensi_qs, date_start, date_end, chunk_size=DUMP_CHUNK_SIZE
+):
+    """
+    SQL shard satu bulan untuk diterapkan di atas database client. Isi
+    absensi & kunci absensi bulan tersebut di client diganti seluruhnya.
+    Seperti delta, id server tidak ikut dikirim: baris lokal client (di
+    luar bulan ini) bisa memakai id yang sama dan tidak boleh tertimpa.
+    """
+    yield "BEGIN TRANSACTION;\n"
+
+    for table in ("absensi", "kunci_absensi"):
+        yield "DELETE FROM %s WHERE date >= %s AND date <= %s;\n" % (
+            table,
+            sql_literal(date_start),
+            sql_literal(date_end),
+        )
+
+    yield from _iter_inserts(
+        "absensi",
+        ABSENSI_COLUMNS[1:],
+        (row[1:] for row in _absensi_rows(absensi_qs, chunk_size)),
+        chunk_size,
+        replace=True,
+    )
+    yield from _iter_inserts(
+        "kunci_absensi",
+        KUNCI_ABSENSI_COLUMNS[1:],
+        (row[1:] for row in _lock_rows(lock_absensi_qs, chunk_size)),
+        chunk_size,
+    )
+
+    yield "COMMIT;"
+
+
+def serialize_sqlite(conn: sqlite3.Connection) -> bytes:
+    """Ambil image file SQLite dari koneksi (in-memory) tanpa iterdump"""
+    if hasattr(conn, "serialize"):
+        # python >= 3.11
+        return conn.serialize()
+
+    with TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "dump.sqlite")
+        target = sqlite3.connect(path)
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
+
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def sql_literal(value) -> str:
+    """Ubah value python menjadi literal SQLite"""
+    if value is None:
+        return "NULL"
+
+    if isinstance(value, bool):
+        return str(int(value))
+
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    if isinstance(value, date):
+        value = value.isoformat()
+
+    return "'%s'" % str(value).replace("'", "''")
+
+
+def build_delta_sql(absensi_rows, lock_rows, deleted_absensies, deleted_locks):
+    """
+    Buat SQL untuk diterapkan di atas database client yang sudah ada.
+
+    absensi_rows      : (date, siswa_id, status, updated_at)
+    lock_rows         : (date, kelas_id, locked)
+    deleted_absensies : (date, siswa_id)
+    deleted_locks     : (date, kelas_id)
+
+    Baris dicocokkan dengan natural key (date + siswa/kelas) dan id server
+    tidak dikirim, karena client juga menulis baris lokal dengan id
+    AUTOINCREMENT miliknya sendiri. REPLACE dengan id server bisa menghapus
+    baris lokal lain yang kebetulan ber-id sama.
+    """
+    statements = ["BEGIN TRANSACTION;"]
+
+    statements.extend(
+        _delete_by_keys("absensi", "siswa_id", deleted_absensies)
+    )
+
+    absensi_values = [
+        "(%s, %d, %s, %d)"
+        % (sql_literal(d), siswa_id, sql_literal(status), int(updated_at.timestamp()))
+        for d, siswa_id, status, updated_at in absensi_rows
+    ]
+    if absensi_values:
+        # UNIQUE(date, siswa_id) membuat REPLACE menimpa baris lama client
+        statements.append(
+            "INSERT OR REPLACE INTO absensi (date, siswa_id, status, updated_at) VALUES %s;"
+            % ", ".join(absensi_values)
+        )
+
+    # lock yang berubah (termasuk yang di-unlock) dihapus dulu, lalu yang
+    # masih terkunci dimasukkan kembali
+    lock_keys = [(d, kelas_id) for d, kelas_id, _ in lock_rows]
+    lock_keys.extend(deleted_locks)
+    statements.extend(_delete_by_keys("kunci_absensi", "kelas_id", lock_keys))
+
+    lock_values = [
+        "(%s, %d)" % (sql_literal(d), kelas_id)
+        for d, kelas_id, locked in lock_rows
+        if locked
+    ]
+    if lock_values:
+        statements.append(
+            "INSERT INTO kunci_absensi (date, kelas_id) VALUES %s;"
+            % ", ".join(lock_values)
+        )
+
+    statements.append("COMMIT;")
+
+    return "\n".join(statements)
+
+
+def _delete_by_keys(table: str, column: str, keys):
+    """
+    DELETE per natural key (date, `column`) dalam potongan DELETE_CHUNK_SIZE.
+    Satu rantai OR untuk ribuan key melewati batas kedalaman ekspresi SQLite
+    (1000) dan seluruh script delta ditolak client.
+    """
+    keys = list(keys)
+
+    for start in range(0, len(keys), DELETE_CHUNK_SIZE):
+        values = ", ".join(
+            "(%s, %d)" % (sql_literal(d), natural_id)
+            for d, natural_id in keys[start : start + DELETE_CHUNK_SIZE]
+        )
+        yield "DELETE FROM %s WHERE (date, %s) IN (VALUES %s);" % (
+            table,
+            column,
+            values,
+        )
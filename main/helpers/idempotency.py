@@ -0,0 +1,85 @@
+import hashlib
+import json
+import threading
+from typing import Callable, Optional
+
+from main.helpers import redis
+
+IDEMPOTENCY_KEY = "idempotency_%s_%s"
+
+# hasil batch yang sudah commit disimpan selama ini
+RESULT_TTL = 60 * 60 * 24
+# penanda request yang masih diproses, dilepas sendiri jika worker mati.
+# Selama batch berjalan penanda diperpanjang setiap IN_PROGRESS_REFRESH
+# detik, upload yang lebih lama dari IN_PROGRESS_TTL tidak diproses 2 kali
+IN_PROGRESS_TTL = 60
+IN_PROGRESS_REFRESH = IN_PROGRESS_TTL // 4
+
+_IN_PROGRESS = b"-"
+
+
+def _key(user_id: int, idempotency_key: str) -> str:
+    # key dari client bisa panjang/berisi karakter apa saja
+    digest = hashlib.sha256(idempotency_key.encode()).hexdigest()
+    return IDEMPOTENCY_KEY % (user_id, digest)
+
+
+def begin(user_id: int, idempotency_key: str) -> Optional[tuple[int, dict]]:
+    """
+    None -> request pertama dengan key ini, lanjutkan proses lalu panggil
+    `save` atau `release`. Selain itu return (status_code, body) yang harus
+    langsung dikirim ke client.
+    """
+    redis_client = redis.get_singleton_client()
+    key = _key(user_id, idempotency_key)
+
+    if redis_client.set(key, _IN_PROGRESS, nx=True, ex=IN_PROGRESS_TTL):
+        return None
+
+    stored = redis_client.get(key)
+    if stored is None or stored == _IN_PROGRESS:
+        return 409, {"detail": "Upload dengan Idempotency-Key ini sedang diproses"}
+
+    status_code, body = json.loads(stored)
+    return status_code, body
+
+
+def keep_alive(user_id: int, idempotency_key: str) -> Callable[[], None]:
+    """
+    Perpanjang penanda dari `begin` di thread latar selama batch diproses.
+    Return fungsi untuk menghentikannya, panggil sebelum `save`/`release`.
+    """
+    redis_client = redis.get_singleton_client()
+    key = _key(user_id, idempotency_key)
+    stop = threading.Event()
+
+    def refresh():
+        while not stop.wait(IN_PROGRESS_REFRESH):
+            redis_client.expire(key, IN_PROGRESS_TTL)
+
+    thread = threading.Thread(
+        target=refresh, name="idempotency-keep-alive", daemon=True
+    )
+    thread.start()
+
+    def stop_refresh():
+        stop.set()
+        # refresh yang sedang berjalan selesai dulu, tidak menimpa TTL hasil
+        thread.join()
+
+    return stop_refresh
+
+
+def save(user_id: int, idempotency_key: str, status_code: int, body: dict):
+    redis_client = redis.get_singleton_client()
+    redis_client.set(
+        _key(user_id, idempotency_key),
+        json.dumps([status_code, body], default=str),
+        ex=RESULT_TTL,
+    )
+
+
+def release(user_id: int, idempotency_key: str):
+    """batch tidak commit, request berikutnya dengan key yang sama diproses ulang"""
+    redis_client = redis.get_singleton_client()
+    redis_client.delete(_key(user_id, idempotency_key))
@@ -1,18 +1,22 @@
+import calendar
+from collections import defaultdict
+from datetime import date
 from pathlib import Path
-from tempfile import NamedTemporaryFile
+from typing import NamedTuple, Optional
 
-import pdfkit
-from bs4 import BeautifulSoup
-from django.db.models import F
+from django.db.models import Count, Q
 from django.conf import settings
+from django.template import Context, Template
 from django.utils import timezone
 
+from main.helpers import render_pool
 from main.helpers.humanize import localize_month_to_string
 from main.models import Absensi, Kelas, Siswa
 
 HELPERS_DIR = Path(__file__).parent
 
-html_content = open(HELPERS_DIR / "pdf.html").read()
+# template di-compile sekali per proses
+template = Template((HELPERS_DIR / "pdf.html").read_text())
 
 options = {
     "page-size": "A4",
@@ -23,125 +27,111 @@ options = {
     "margin-right": "5mm",
 }
 
+# simbol status pada kolom tanggal
+STATUS_SYMBOLS = {
+    Absensi.StatusChoices.ALFA: "A",
+    Absensi.StatusChoices.BOLOS: "B",
+    Absensi.StatusChoices.HADIR: ".",
+    Absensi.StatusChoices.IZIN: "I",
+    Absensi.StatusChoices.SAKIT: "S",
+}
 
-def generate_pdf(kelas: Kelas, month: int, year: int):
-    if year <= 99:
-        year += 2000
-
-    soup = BeautifulSoup(html_content, "html.parser")
+DAYS_COLUMNS = 31
+
+
+class RekapRow(NamedTuple):
+    name: str
+    alfa: int
+    sakit: int
+    izin: int
+    bolos: int
+    # 31 kolom tanggal, "" jika tidak ada absensi
+    days: list
+
+
+def get_rekap_matrix(kelas_id: int, month: int, year: int) -> list[RekapRow]:
+    """
+    Matriks siswa x tanggal untuk rekap bulanan, urut nama siswa.
+    2 query berapapun jumlah siswa: total per status (conditional count) dan
+    status per tanggal.
+    """
+    return get_rekap_matrices([kelas_id], month, year)[kelas_id]
+
+
+def get_rekap_matrices(
+    kelas_ids: list[int], month: int, year: int
+) -> dict[int, list[RekapRow]]:
+    """
+    kelas_id → matriks rekap untuk banyak kelas sekaligus (rekap massal),
+    tetap 2 query berapapun jumlah kelas.
+    """
+    date_start = date(year, month, 1)
+    date_end = date(year, month, calendar.monthrange(year, month)[1])
+    in_month = Q(absensi__date__range=(date_start, date_end))
+
+    def total(status):
+        return Count("absensi", filter=in_month & Q(absensi___status=status))
+
+    siswas = (
+        Siswa.objects.filter(kelas__pk__in=kelas_ids)
+        .order_by("fullname")
+        .annotate(
+            alfa=total(Absensi.StatusChoices.ALFA),
+            sakit=total(Absensi.StatusChoices.SAKIT),
+            izin=total(Absensi.StatusChoices.IZIN),
+            bolos=total(Absensi.StatusChoices.BOLOS),
+        )
+        .values_list("pk", "kelas_id", "fullname", "alfa", "sakit", "izin", "bolos")
+    )
 
-    soup.find("span", attrs={"id": "kelas"}).string = kelas.name
+    grid = defaultdict(lambda: [""] * DAYS_COLUMNS)
+    absensies = Absensi.objects.filter(
+        siswa__kelas__pk__in=kelas_ids, date__range=(date_start, date_end)
+    ).values_list("siswa_id", "date", "_status")
 
-    now = timezone.now().astimezone(settings.TIME_ZONE_OBJ)
-    now_str = now.strftime("%d/%m/%Y %H:%M")
+    for siswa_id, absensi_date, status in absensies:
+        grid[siswa_id][absensi_date.day - 1] = STATUS_SYMBOLS.get(status, "")
 
-    month_str = "%s %s" % (localize_month_to_string(month), year)
+    matrices = {kelas_id: [] for kelas_id in kelas_ids}
+    for pk, kelas_id, name, alfa, sakit, izin, bolos in siswas:
+        matrices[kelas_id].append(RekapRow(name, alfa, sakit, izin, bolos, grid[pk]))
 
-    soup.find("span", attrs={"id": "tanggal_dibuat"}).string = now_str
-    soup.find("span", attrs={"id": "bulan"}).string = month_str
+    return matrices
 
-    siswas = Siswa.objects.filter(kelas__pk=kelas.pk).order_by("fullname")
 
-    for h, siswa in enumerate(siswas, start=1):
-        background_color = "odd-color"
+def render_html(
+    kelas: Kelas, month: int, year: int, rows: Optional[list[RekapRow]] = None
+) -> str:
+    if rows is None:
+        rows = get_rekap_matrix(kelas.pk, month, year)
 
-        siswa_id = siswa.pk
-        siswa_name = siswa.fullname[:30].upper()
-        siswa_absensies_queryset = (
-            Absensi.objects.filter(siswa__pk=siswa_id)
-            .filter(date__year=year)
-            .filter(date__month=month)
-            .annotate(status=F("_status"))
-        )
+    now = timezone.now().astimezone(settings.TIME_ZONE_OBJ)
 
-        siswa_alfa_total = siswa_absensies_queryset.filter(
-            status=Absensi.StatusChoices.ALFA
-        ).count()
-        siswa_sakit_total = siswa_absensies_queryset.filter(
-            status=Absensi.StatusChoices.SAKIT
-        ).count()
-        siswa_izin_total = siswa_absensies_queryset.filter(
-            status=Absensi.StatusChoices.IZIN
-        ).count()
-        siswa_bolos_total = siswa_absensies_queryset.filter(
-            status=Absensi.StatusChoices.BOLOS
-        ).count()
-
-        if h % 2 == 0:
-            background_color = "even-color"
-
-        tr_tag = soup.new_tag("tr", attrs={"class": background_color})
-        no_tag = soup.new_tag(
-            "td", string=str(h), attrs={"class": "number-point " + background_color}
-        )
-        name_tag = soup.new_tag(
-            "td", string=siswa_name, attrs={"class": background_color}
+    return template.render(
+        Context(
+            {
+                "kelas": kelas.name,
+                "bulan": "%s %s" % (localize_month_to_string(month), year),
+                "tanggal_dibuat": now.strftime("%d/%m/%Y %H:%M"),
+                "rows": rows,
+            }
         )
+    )
 
-        alfa_total_tag = soup.new_tag(
-            "td", string=str(siswa_alfa_total), attrs={"class": "rekap-point"}
-        )
-        sakit_total_tag = soup.new_tag(
-            "td", string=str(siswa_izin_total), attrs={"class": "rekap-point"}
-        )
-        izin_total_tag = soup.new_tag(
-            "td", string=str(siswa_sakit_total), attrs={"class": "rekap-point"}
-        )
-        bolos_total_tag = soup.new_tag(
-            "td", string=str(siswa_bolos_total), attrs={"class": "rekap-point"}
-        )
 
-        tr_tag.append(no_tag)
-        tr_tag.append(name_tag)
-        tr_tag.append(alfa_total_tag)
-        tr_tag.append(izin_total_tag)
-        tr_tag.append(sakit_total_tag)
-        tr_tag.append(bolos_total_tag)
-
-        keren = dict([(a.date.day, a) for a in siswa_absensies_queryset])
-
-        # for absensi in siswa_absensies_queryset:
-        for tanggal in range(1, 32):
-            absensi = keren.get(tanggal)
-            absensi_string = ""
-
-            if absensi:
-                absensi_status = absensi.status
-                if absensi_status == Absensi.StatusChoices.ALFA:
-                    absensi_string = "A"
-                elif absensi_status == Absensi.StatusChoices.BOLOS:
-                    absensi_string = "B"
-                elif absensi_status == Absensi.StatusChoices.HADIR:
-                    absensi_string = "."
-                elif absensi_status == Absensi.StatusChoices.IZIN:
-                    absensi_string = "I"
-                elif absensi_status == Absensi.StatusChoices.SAKIT:
-                    absensi_string = "S"
-
-            tr_tag.append(
-                soup.new_tag(
-                    "td",
-                    string=absensi_string,
-                    attrs={"class": "absen-point " + background_color},
-                )
-            )
-
-        soup.find("table").append(tr_tag)
-
-    # pdf_file = NamedTemporaryFile('wb', suffix = '.pdf') WINDOWS ISSUE
-    pdf_file = NamedTemporaryFile(
-        "wb", suffix=".pdf", delete=False, delete_on_close=True
+def get_filename(kelas: Kelas, month: int, year: int) -> str:
+    filename = "Rekap %s-%s%s.pdf" % (
+        kelas.name,
+        localize_month_to_string(month),
+        year,
     )
+    return filename.replace(" ", "-")
 
-    try:
-        html_result = soup.prettify()
 
-        pdfkit.from_string(
-            html_result, pdf_file.name, options=options, cover_first=True
-        )
+def generate_pdf(kelas: Kelas, month: int, year: int):
+    if year <= 99:
+        year += 2000
+
+    html_result = render_html(kelas, month, year)
 
-        with open(pdf_file.name, "rb") as f:
-            return f.read()
-    finally:
-        pdf_file.close()
-        # pdf_file.delete()
+    return render_pool.render(html_result, options)
@@ -0,0 +1,293 @@
+import json
+import logging
+import time
+import uuid
+from datetime import date, datetime
+from typing import Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main.helpers import redis, schedule, versions
+from main.models import Absensi, Siswa
+
+logger = logging.getLogger(__name__)
+
+# scan guru piket yang belum ditulis ke database (RPUSH masuk, flusher
+# membaca dari kiri). Tiap item: siswa, timestamp, type, by, queued_at
+QUEUE_KEY = "piket_queue_%s"
+# scan yang belum valid (mis. absen pulang sebelum absen masuk), dicoba lagi
+# setiap flush
+RETRY_KEY = "piket_queue_retry_%s"
+# domain yang punya antrian, dipakai `manage.py piketflush`
+DOMAINS_KEY = "piket_queue_domains"
+# hanya 1 flusher per domain
+FLUSH_LOCK_KEY = "piket_queue_flush_%s"
+FLUSH_LOCK_TTL = 60 * 5
+
+# jumlah scan yang diproses dalam 1 transaksi
+FLUSH_CHUNK_SIZE = 2000
+# scan yang tidak berhasil diproses lebih dari 2 hari dibuang
+RETRY_MAX_AGE = 86400 * 2
+
+# siswa yang boleh di-scan (kelas aktif), dipakai /api/piket/scan
+ROSTER_KEY = "piket_roster"
+# batas basi jika roster berubah lewat jalur tanpa signal (mis. bulk update)
+ROSTER_TTL = 60 * 10
+# penanda roster sudah dibangun walaupun belum ada siswa
+_ROSTER_SENTINEL = "-"
+
+def push(domain: str, user_id: int, scans: list[dict]) -> int:
+    """tambahkan scan ke antrian (atomik), return panjang antrian"""
+    if not scans:
+        return get_length(domain)
+
+    queued_at = time.time()
+    items = [
+        json.dumps({**scan, "by": user_id, "queued_at": queued_at})
+        for scan in scans
+    ]
+
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline() as pipe:
+        pipe.sadd(DOMAINS_KEY, domain)
+        pipe.rpush(QUEUE_KEY % domain, *items)
+        _, length = pipe.execute()
+
+    return length
+
+
+def is_known_siswa(siswa_id: int) -> bool:
+    """cek siswa di roster redis, 1 round trip selama roster masih ada"""
+    redis_client = redis.get_singleton_client()
+
+    with redis_client.pipeline() as pipe:
+        pipe.exists(ROSTER_KEY)
+        pipe.sismember(ROSTER_KEY, siswa_id)
+        exists, is_member = pipe.execute()
+
+    if exists:
+        return bool(is_member)
+
+    return siswa_id in _build_roster()
+
+
+def _build_roster() -> set:
+    siswa_ids = set(
+        Siswa.objects.filter(kelas__active=True).values_list("pk", flat=True)
+    )
+
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline() as pipe:
+        pipe.delete(ROSTER_KEY)
+        pipe.sadd(ROSTER_KEY, _ROSTER_SENTINEL, *siswa_ids)
+        pipe.expire(ROSTER_KEY, ROSTER_TTL)
+        pipe.execute()
+
+    return siswa_ids
+
+
+def invalidate_roster():
+    """dipanggil saat siswa/kelas berubah, roster dibangun ulang saat scan"""
+    redis.invalidate(_delete_roster)
+
+
+def _delete_roster():
+    redis.get_singleton_client().delete(ROSTER_KEY)
+
+
+def get_length(domain: str) -> int:
+    return redis.get_singleton_client().llen(QUEUE_KEY % domain)
+
+
+def get_domains() -> list[str]:
+    redis_client = redis.get_singleton_client()
+    return sorted(d.decode() for d in redis_client.smembers(DOMAINS_KEY))
+
+
+def is_due(domain: str, length: Optional[int] = None) -> bool:
+    """antrian harus di-flush jika jumlah atau umur scan tertua mencapai batas"""
+    redis_client = redis.get_singleton_client()
+
+    if length is None:
+        length = get_length(domain)
+
+    if length >= settings.PIKET_BATCH_SIZE:
+        return True
+
+    oldest = redis_client.lindex(QUEUE_KEY % domain, 0)
+    if oldest is None:
+        return False
+
+    age = time.time() - json.loads(oldest)["queued_at"]
+    return age >= settings.PIKET_BATCH_MAX_AGE
+
+
+def flush(domain: str) -> Optional[int]:
+    """
+    Tulis semua scan di antrian ke database. Return jumlah scan yang
+    diproses, atau None jika flusher lain sedang berjalan.
+    """
+    redis_client = redis.get_singleton_client()
+    lock_key = FLUSH_LOCK_KEY % domain
+    token = uuid.uuid4().hex
+
+    if not redis_client.set(lock_key, token, nx=True, ex=FLUSH_LOCK_TTL):
+        return None
+
+    try:
+        return _flush(domain)
+    finally:
+        if redis_client.get(lock_key) == token.encode():
+            redis_client.delete(lock_key)
+
+
+def _flush(domain: str) -> int:
+    redis_client = redis.get_singleton_client()
+    queue_key = QUEUE_KEY % domain
+    retry_key = RETRY_KEY % domain
+
+    retries = [json.loads(item) for item in redis_client.lrange(retry_key, 0, -1)]
+    invalids = []
+    processed = 0
+
+    while True:
+        # pusher hanya menambah di kanan, jadi item [0, n) aman dibaca lalu
+        # dibuang setelah commit. Jika flusher mati sebelum LTRIM, scan
+        # diproses ulang (idempotent: absen masuk tidak dibuat dua kali)
+        items = redis_client.lrange(queue_key, 0, FLUSH_CHUNK_SIZE - 1)
+        scans = [json.loads(item) for item in items]
+
+        if not scans and not retries:
+            break
+
+        invalids.extend(save_scans(retries + scans))
+        retries = []
+        processed += len(scans)
+
+        if items:
+            redis_client.ltrim(queue_key, len(items), -1)
+
+        if len(items) < FLUSH_CHUNK_SIZE:
+            break
+
+    expired_before = time.time() - RETRY_MAX_AGE
+    invalids = [
+        json.dumps(scan) for scan in invalids if scan["queued_at"] >= expired_before
+    ]
+
+    with redis_client.pipeline() as pipe:
+        pipe.delete(retry_key)
+        if invalids:
+            pipe.rpush(retry_key, *invalids)
+        pipe.execute()
+
+    return processed
+
+
+def _get_scan_date(scan: dict) -> Optional[date]:
+    """tanggal scan, None jika scan rusak (mis. timestamp di luar jangkauan)"""
+    if "siswa" not in scan or "type" not in scan:
+        return None
+
+    try:
+        return datetime.fromtimestamp(scan["timestamp"]).date()
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def save_scans(scans: list[dict]) -> list[dict]:
+    """
+    Tulis scan ke tabel Absensi dalam jumlah query yang tetap (preload siswa,
+    jadwal dan absensi). Return scan yang belum bisa diproses.
+    """
+    invalids = []
+
+    # scan rusak dibuang satu per satu, tidak menggagalkan seluruh batch
+    # (dan tidak ikut di-retry karena tidak akan pernah valid)
+    scan_dates = []
+    for scan in scans:
+        scan_date = _get_scan_date(scan)
+        if scan_date is None:
+            logger.warning("scan piket dibuang: %r", scan)
+            continue
+
+        scan_dates.append((scan, scan_date))
+
+    # sort agar absen type masuk di-proses terlebih dahulu
+    scan_dates.sort(key=lambda x: 0 if x[0]["type"] == "absen_masuk" else 1)
+
+    # --- preload: siswa dan absensi (2 query), jadwal dari index ---
+    siswa_ids = {scan["siswa"] for scan, _ in scan_dates}
+    dates = {scan_date for _, scan_date in scan_dates}
+
+    siswa_kelas = dict(
+        Siswa.objects.filter(pk__in=siswa_ids).values_list("pk", "kelas_id")
+    )
+    schedules = schedule.get_index()
+
+    # (siswa_id, date) → Absensi, termasuk yang baru dibuat di batch ini
+    absensi_map = {
+        (a.siswa_id, a.date): a
+        for a in Absensi.objects.filter(siswa_id__in=siswa_ids, date__in=dates)
+    }
+
+    new_absensies = []
+    updated_absensies = {}
+    # (kelas_id, date) absensi yang berubah
+    touched_absensi = set()
+
+    for scan, absensi_date in scan_dates:
+        # minggu tidak ada jadwal
+        if absensi_date.weekday() >= len(schedule.HARI):
+            continue
+
+        kelas_id = siswa_kelas.get(scan["siswa"])
+        absensi_session = schedules.get((kelas_id, absensi_date.weekday()))
+
+        if absensi_session is None:
+            invalids.append(scan)
+            continue
+
+        absensi_obj = absensi_map.get((scan["siswa"], absensi_date))
+
+        if scan["type"] == "absen_pulang":
+            if absensi_obj:
+                absensi_obj.status = Absensi.StatusChoices.HADIR
+                absensi_obj.changed_at = timezone.now()
+                # absensi baru cukup diubah statusnya sebelum bulk_create
+                if absensi_obj.pk is not None:
+                    updated_absensies[absensi_obj.pk] = absensi_obj
+                touched_absensi.add((kelas_id, absensi_date))
+            else:
+                invalids.append(scan)
+
+        elif scan["type"] == "absen_masuk" and absensi_obj is None:
+            jam_keluar = datetime.combine(
+                timezone.now().date(),
+                absensi_session.jam_keluar,
+                tzinfo=settings.TIME_ZONE_OBJ,
+            )
+
+            new_absensi = Absensi(
+                date=absensi_date,
+                siswa_id=scan["siswa"],
+                by_id=scan["by"],
+                wait_expired_at=jam_keluar,
+                status=Absensi.StatusChoices.WAIT,
+            )
+            new_absensies.append(new_absensi)
+            absensi_map[(scan["siswa"], absensi_date)] = new_absensi
+            touched_absensi.add((kelas_id, absensi_date))
+
+    # hit db
+    with transaction.atomic():
+        Absensi.objects.bulk_create(new_absensies)
+        Absensi.objects.bulk_update(
+            updated_absensies.values(), fields=["_status", "changed_at"]
+        )
+        # bulk_create/bulk_update tidak memicu signal
+        versions.bump_absensi(touched_absensi)
+
+    return invalids
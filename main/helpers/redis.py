@@ -1,4 +1,7 @@
+from typing import Callable
+
 from django.conf import settings
+from django.db import connection, transaction
 from redis import Redis
 
 
@@ -16,3 +19,15 @@ def get_singleton_client():
         _client = get_client()
 
     return _client
+
+
+def invalidate(func: Callable[[], None]):
+    """
+    Jalankan `func` (hapus cache / naikkan versi) sekarang dan sekali lagi
+    setelah transaksi commit. Pembaca yang berjalan sebelum commit bisa saja
+    membangun ulang cache dari data lama dan menyimpannya dengan versi baru.
+    """
+    func()
+
+    if connection.in_atomic_block:
+        transaction.on_commit(func)
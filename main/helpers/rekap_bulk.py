@@ -0,0 +1,217 @@
+import hashlib
+import logging
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import BinaryIO, Callable, Optional
+
+from django.db import close_old_connections, connection
+
+from main.helpers import artifacts
+from main.helpers import pdf as helpers_pdf
+from main.helpers import redis, render_pool
+from main.helpers.humanize import localize_month_to_string
+from main.models import Kelas
+
+logger = logging.getLogger(__name__)
+
+# hash: status, kelas_ids, month, year, total, done, file_id, created_at
+JOB_KEY = "rekap_bulk_%s"
+JOB_TTL = 60 * 60 * 24
+# 1 job per (kelas, bulan) yang sama, request berikutnya mendapat job_id ini
+LOCK_KEY = "rekap_bulk_lock_%s"
+LOCK_TTL = 60 * 30
+# slot render_pool yang tidak dipakai job massal, untuk /get-rekap interaktif
+RESERVED_RENDER_SLOTS = 1
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+_executor = None
+
+
+def get_filename(month: int, year: int) -> str:
+    return "Rekap-Semua-Kelas-%s%s.zip" % (localize_month_to_string(month), year)
+
+
+def build_zip(
+    kelas_list: list[Kelas],
+    month: int,
+    year: int,
+    file: BinaryIO,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+):
+    """
+    Tulis zip berisi pdf rekap tiap kelas ke `file`. Matriks semua kelas
+    diambil dengan 2 query, lalu pdf dirender paralel (wkhtmltopdf berjalan
+    sebagai proses terpisah, dibatasi slot render_pool dan menyisakan
+    RESERVED_RENDER_SLOTS slot untuk request lain). Setiap pdf langsung
+    ditulis ke file, yang ditahan di memori hanya pdf yang sedang selesai.
+    on_progress(done, total) dipanggil setiap 1 pdf selesai.
+    """
+    matrices = helpers_pdf.get_rekap_matrices([k.pk for k in kelas_list], month, year)
+    htmls = {
+        kelas: helpers_pdf.render_html(kelas, month, year, matrices[kelas.pk])
+        for kelas in kelas_list
+    }
+
+    # pdf sudah terkompresi, cukup disimpan
+    with zipfile.ZipFile(file, "w", zipfile.ZIP_STORED) as zip_file:
+        with ThreadPoolExecutor(
+            max_workers=render_pool.get_limit(RESERVED_RENDER_SLOTS),
+            thread_name_prefix="rekap-bulk",
+        ) as executor:
+            futures = {
+                # antrian bisa panjang, tunggu slot selama job boleh berjalan
+                executor.submit(
+                    render_pool.render,
+                    html,
+                    helpers_pdf.options,
+                    LOCK_TTL,
+                    RESERVED_RENDER_SLOTS,
+                ): kelas
+                for kelas, html in htmls.items()
+            }
+
+            names = set()
+            for done, future in enumerate(as_completed(futures), start=1):
+                kelas = futures[future]
+
+                name = helpers_pdf.get_filename(kelas, month, year)
+                if name in names:
+                    # nama kelas boleh sama (mis. kelas lama yang nonaktif)
+                    name = "%s-%s" % (kelas.pk, name)
+                names.add(name)
+
+                zip_file.writestr(name, future.result())
+
+                if on_progress is not None:
+                    on_progress(done, len(futures))
+
+
+def start(month: int, year: int, kelas_ids: Optional[list[int]] = None) -> str:
+    """
+    Mulai job rekap massal (semua kelas aktif jika kelas_ids None) di thread
+    latar. Return job_id, atau job_id yang sudah berjalan untuk kelas dan bulan
+    yang sama.
+    """
+    if kelas_ids is None:
+        kelas_ids = list(Kelas.objects.only_active().values_list("pk", flat=True))
+
+    kelas_ids = sorted(kelas_ids)
+    scope = "%s|%s|%s" % (year, month, ",".join(map(str, kelas_ids)))
+    lock_key = LOCK_KEY % hashlib.md5(scope.encode()).hexdigest()
+
+    redis_client = redis.get_singleton_client()
+    job_id = uuid.uuid4().hex
+
+    if not redis_client.set(lock_key, job_id, nx=True, ex=LOCK_TTL):
+        running_job_id = redis_client.get(lock_key)
+        if running_job_id is not None:
+            return running_job_id.decode()
+
+    key = JOB_KEY % job_id
+    with redis_client.pipeline() as pipe:
+        pipe.hset(
+            key,
+            mapping={
+                "status": STATUS_PENDING,
+                "kelas_ids": ",".join(map(str, kelas_ids)),
+                "month": month,
+                "year": year,
+                "total": len(kelas_ids),
+                "done": 0,
+                "created_at": time.time(),
+            },
+        )
+        pipe.expire(key, JOB_TTL)
+        pipe.execute()
+
+    submit(job_id, lock_key)
+
+    return job_id
+
+
+def submit(job_id: str, lock_key: str):
+    global _executor
+
+    # job berjalan di thread proses web yang menerima request. Jika rekap
+    # massal mulai mengganggu request lain, pindahkan ke worker terpisah
+    # seperti `manage.py uploadworker` (antrian redis + BRPOPLPUSH)
+    if _executor is None:
+        # render di dalam job sudah paralel
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rekap-bulk")
+
+    _executor.submit(_run_in_background, job_id, lock_key)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    job = redis.get_singleton_client().hgetall(JOB_KEY % job_id)
+    if not job:
+        return None
+
+    job = {k.decode(): v.decode() for k, v in job.items()}
+    for field in ("month", "year", "total", "done"):
+        job[field] = int(job[field])
+
+    return job
+
+
+def run(job_id: str, lock_key: Optional[str] = None):
+    redis_client = redis.get_singleton_client()
+    key = JOB_KEY % job_id
+    job = get_job(job_id)
+
+    try:
+        kelas_ids = [int(pk) for pk in job["kelas_ids"].split(",") if pk]
+        kelas_list = list(Kelas.objects.filter(pk__in=kelas_ids).order_by("name"))
+
+        redis_client.hset(
+            key, mapping={"status": STATUS_PROCESSING, "total": len(kelas_list)}
+        )
+
+        file_id = "rekap-bulk-%s" % job_id
+
+        # zip ditulis langsung ke disk, ukurannya bisa ratusan MB
+        zip_file, tmp_path = artifacts.create_temp_file(file_id)
+        try:
+            with zip_file:
+                build_zip(
+                    kelas_list,
+                    job["month"],
+                    job["year"],
+                    zip_file,
+                    on_progress=lambda done, total: redis_client.hset(
+                        key, "done", done
+                    ),
+                )
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        artifacts.store_file(
+            file_id,
+            get_filename(job["month"], job["year"]),
+            "application/zip",
+            tmp_path,
+        )
+        redis_client.hset(key, mapping={"status": STATUS_DONE, "file_id": file_id})
+    except Exception:
+        redis_client.hset(key, "status", STATUS_ERROR)
+        raise
+    finally:
+        if lock_key is not None and redis_client.get(lock_key) == job_id.encode():
+            redis_client.delete(lock_key)
+
+
+def _run_in_background(job_id: str, lock_key: str):
+    close_old_connections()
+    try:
+        run(job_id, lock_key)
+    except Exception:
+        logger.exception("rekap massal %s gagal", job_id)
+    finally:
+        connection.close()
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from main.helpers import artifacts
+from main.helpers import pdf as helpers_pdf
+from main.helpers import redis, render_pool, versions
+from main.models import Kelas
+
+logger = logging.getLogger(__name__)
+
+# rekap id terakhir yang pdf-nya sudah dibuat per (kelas, tahun, bulan)
+CURRENT_KEY = "rekap_current_%s_%s_%s"
+
+# hanya 1 render per rekap id di semua worker, pemegang lock yang membuat pdf
+LOCK_KEY = "rekap_job_lock_%s"
+# lebih lama dari menunggu slot + render, lock milik worker yang mati lepas
+# sendiri setelah ini
+LOCK_TTL = 60 * 10
+# job gagal, dibaca sekali oleh request berikutnya lalu boleh dicoba lagi
+ERROR_KEY = "rekap_job_error_%s"
+ERROR_TTL = 60
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+# jeda polling saat menunggu job worker lain (detik)
+WAIT_POLL_INTERVAL = 0.2
+
+_executor = None
+
+
+class RekapJobStatus(NamedTuple):
+    status: str
+    status_code: int = 200
+    detail: str = ""
+
+
+def get_rekap_id(kelas_id: int, year: int, month: int) -> tuple[str, bool]:
+    """
+    Rekap id dari versi absensi bulan ini dan versi kelas/siswa (nama, pindah
+    kelas) kelas ini. 1 round trip redis tanpa query database, return
+    (file_id, True) jika pdf untuk versi ini sudah ada.
+    """
+    redis_client = redis.get_singleton_client()
+
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(versions.GENERATION_KEY)
+        pipe.get(versions.REKAP_VERSION_KEY % (kelas_id, year, month))
+        pipe.get(versions.STRUCTURE_VERSION_KEY % kelas_id)
+        pipe.get(CURRENT_KEY % (kelas_id, year, month))
+        generation, version, structure_version, current = pipe.execute()
+
+    version = "%s|%s|%s" % (
+        versions.get_generation(generation),
+        int(version or 0),
+        int(structure_version or 0),
+    )
+    file_id = "rekap-%s-%s-%02d-%s" % (
+        kelas_id,
+        year,
+        month,
+        hashlib.md5(version.encode()).hexdigest()[:16],
+    )
+
+    return file_id, current == file_id.encode()
+
+
+def get_status(file_id: str) -> Optional[RekapJobStatus]:
+    """status job (1 round trip redis), None jika belum pernah dibuat"""
+    redis_client = redis.get_singleton_client()
+
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.exists(artifacts.ARTIFACT_KEY % file_id)
+        pipe.exists(LOCK_KEY % file_id)
+        pipe.getdel(ERROR_KEY % file_id)
+        exists, locked, error = pipe.execute()
+
+    if exists:
+        return RekapJobStatus(STATUS_DONE)
+    if error is not None:
+        error = json.loads(error)
+        return RekapJobStatus(STATUS_ERROR, error["status_code"], error["detail"])
+    if locked:
+        return RekapJobStatus(STATUS_PENDING)
+
+    return None
+
+
+def acquire(file_id: str) -> Optional[str]:
+    """ambil lock job, return token atau None jika job sudah ada/berjalan"""
+    redis_client = redis.get_singleton_client()
+    token = uuid.uuid4().hex
+
+    if not redis_client.set(LOCK_KEY % file_id, token, nx=True, ex=LOCK_TTL):
+        return None
+
+    # job lain bisa saja selesai di antara cek status dan lock
+    if redis_client.exists(artifacts.ARTIFACT_KEY % file_id):
+        release(file_id, token)
+        return None
+
+    return token
+
+
+def release(file_id: str, token: str):
+    redis_client = redis.get_singleton_client()
+    lock_key = LOCK_KEY % file_id
+
+    if redis_client.get(lock_key) == token.encode():
+        redis_client.delete(lock_key)
+
+
+def save(
+    file_id: str, kelas_id: int, month: int, year: int, filename: str, content: bytes
+):
+    """simpan pdf dan tandai sebagai rekap terbaru kelas dan bulan tersebut"""
+    artifacts.store(file_id, filename, "application/pdf", content)
+    redis.get_singleton_client().set(
+        CURRENT_KEY % (kelas_id, year, month), file_id, ex=artifacts.DEFAULT_TTL
+    )
+
+
+def run(
+    file_id: str,
+    token: str,
+    kelas: Kelas,
+    month: int,
+    year: int,
+    filename: str,
+    record_error: bool = True,
+):
+    """
+    Buat pdf lalu simpan. Error dicatat untuk request yang polling, kecuali
+    record_error=False (error langsung dikembalikan ke pemanggil).
+    """
+    redis_client = redis.get_singleton_client()
+
+    try:
+        content = helpers_pdf.generate_pdf(kelas, month, year)
+        save(file_id, kelas.pk, month, year, filename, content)
+    except Exception as e:
+        if not record_error:
+            raise
+
+        if isinstance(e, render_pool.RenderPoolBusy):
+            error = {"status_code": 503, "detail": "Server sedang sibuk, coba lagi"}
+        else:
+            error = {"status_code": 500, "detail": "Gagal membuat rekap"}
+
+        redis_client.set(ERROR_KEY % file_id, json.dumps(error), ex=ERROR_TTL)
+        raise
+    finally:
+        release(file_id, token)
+
+
+def submit(file_id: str, token: str, kelas: Kelas, month: int, year: int, filename: str):
+    """jalankan job di thread latar proses ini, request langsung kembali"""
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.REKAP_RENDER_CONCURRENCY,
+            thread_name_prefix="rekap",
+        )
+
+    _executor.submit(_run_in_background, file_id, token, kelas, month, year, filename)
+
+
+def _run_in_background(*args):
+    close_old_connections()
+    try:
+        run(*args)
+    except Exception:
+        logger.exception("rekap job %s gagal", args[0])
+    finally:
+        # koneksi db thread ini tidak dipakai lagi oleh request
+        connection.close()
+
+
+def wait(file_id: str, timeout: float) -> Optional[RekapJobStatus]:
+    """tunggu job worker lain, None jika job hilang (lock kadaluarsa)"""
+    deadline = time.monotonic() + timeout
+
+    while True:
+        status = get_status(file_id)
+        if status is None or status.status != STATUS_PENDING:
+            return status
+
+        if time.monotonic() >= deadline:
+            return status
+
+        time.sleep(WAIT_POLL_INTERVAL)
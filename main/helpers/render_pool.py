@@ -0,0 +1,219 @@
+import threading
+import time
+import uuid
+from typing import Optional
+
+import pdfkit
+from django.conf import settings
+
+from main.helpers import redis
+
+# slot render yang sedang dipakai (semua worker/mesin yang memakai redis yang
+# sama), zset token → waktu terakhir di-refresh. Slot milik worker yang mati
+# dibuang setelah RENDER_SLOT_TTL
+RENDER_SLOTS_KEY = "render_pool_slots"
+# antrian, zset "limit:token" → nomor tiket dari RENDER_COUNTER_KEY. Tiket
+# diambil sekali saat mulai menunggu, urutan dari counter (bukan jam) agar
+# adil walaupun jam antar mesin berbeda
+RENDER_OWNERS_KEY = "render_pool_owners"
+RENDER_COUNTER_KEY = "render_pool_counter"
+# pemeriksaan antrian dan pengambilan slot harus berurutan, jika tidak 2
+# penunggu bisa sama-sama mengambil slot terakhir
+RENDER_ACQUIRE_LOCK_KEY = "render_pool_acquire_lock"
+RENDER_ACQUIRE_LOCK_TTL = 1
+# request yang sedang menunggu slot, zset "limit:token" → waktu terakhir
+# memeriksa antrian. Penunggu yang mati dibuang setelah RENDER_SLOT_TTL
+RENDER_WAITING_KEY = "render_pool_waiting"
+# hash: renders, errors, timeouts, total_ms, max_ms
+RENDER_STATS_KEY = "render_pool_stats"
+# durasi render terakhir (ms), untuk persentil
+RENDER_DURATIONS_KEY = "render_pool_durations"
+RENDER_DURATIONS_SIZE = 1000
+
+RENDER_SLOT_TTL = 60 * 2
+# slot di-refresh selama render berjalan, render yang lebih lama dari
+# RENDER_SLOT_TTL tidak kehilangan slotnya
+RENDER_SLOT_REFRESH = RENDER_SLOT_TTL // 4
+# jeda antar percobaan mengambil slot (detik)
+RENDER_POLL_INTERVAL = 0.1
+
+
+class RenderPoolBusy(Exception):
+    """tidak mendapat slot render dalam REKAP_RENDER_TIMEOUT detik"""
+
+
+def render(
+    html: str, options: dict, timeout: Optional[int] = None, reserve: int = 0
+) -> bytes:
+    """
+    Render html menjadi pdf lewat wkhtmltopdf. Hasil dibaca dari stdout (tanpa
+    file sementara). Maksimal REKAP_RENDER_CONCURRENCY render berjalan
+    bersamaan, request lain menunggu slot kosong paling lama `timeout` detik
+    (default REKAP_RENDER_TIMEOUT).
+
+    `reserve` slot dibiarkan kosong untuk pemanggil lain: render dari job
+    massal tidak boleh memakai semua slot agar /get-rekap tetap dilayani.
+    """
+    redis_client = redis.get_singleton_client()
+    token = uuid.uuid4().hex
+
+    if timeout is None:
+        timeout = settings.REKAP_RENDER_TIMEOUT
+
+    _acquire(redis_client, token, timeout, get_limit(reserve))
+
+    stop_refresh = threading.Event()
+    threading.Thread(
+        target=_refresh,
+        args=(redis_client, token, stop_refresh),
+        name="render-pool-refresh",
+        daemon=True,
+    ).start()
+
+    start = time.perf_counter()
+    try:
+        return pdfkit.from_string(html, False, options=options, cover_first=True)
+    except Exception:
+        redis_client.hincrby(RENDER_STATS_KEY, "errors")
+        raise
+    finally:
+        stop_refresh.set()
+        _release(redis_client, token)
+        _record(redis_client, int((time.perf_counter() - start) * 1000))
+
+
+def get_limit(reserve: int = 0) -> int:
+    """
+    Jumlah slot yang boleh dipakai pemanggil yang menyisakan `reserve` slot.
+    Minimal 1 agar pemanggil tetap bisa berjalan jika pool hanya 1 slot.
+    """
+    return max(1, settings.REKAP_RENDER_CONCURRENCY - reserve)
+
+
+def _acquire(redis_client, token: str, timeout: int, limit: int):
+    """
+    Semaphore adil: tiket diambil sekali saat mulai menunggu dan tetap di
+    antrian sampai mendapat slot atau timeout. Slot diberikan jika slot yang
+    dipakai ditambah penunggu di depan (tiket lebih kecil) masih di bawah
+    `limit`. Penunggu dengan `limit` lebih kecil (menyisakan slot) tidak
+    menghalangi penunggu di belakangnya yang boleh memakai slot tersisa.
+    """
+    deadline = time.monotonic() + timeout
+    waiter = "%d:%s" % (limit, token)
+
+    ticket = redis_client.incr(RENDER_COUNTER_KEY)
+    pipe = redis_client.pipeline()
+    pipe.zadd(RENDER_OWNERS_KEY, {waiter: ticket})
+    pipe.zadd(RENDER_WAITING_KEY, {waiter: time.time()})
+    pipe.execute()
+
+    try:
+        while True:
+            if _try_acquire(redis_client, token, waiter, ticket, limit):
+                return
+
+            if time.monotonic() >= deadline:
+                redis_client.hincrby(RENDER_STATS_KEY, "timeouts")
+                raise RenderPoolBusy
+
+            time.sleep(RENDER_POLL_INTERVAL)
+    finally:
+        pipe = redis_client.pipeline()
+        pipe.zrem(RENDER_WAITING_KEY, waiter)
+        pipe.zrem(RENDER_OWNERS_KEY, waiter)
+        pipe.execute()
+
+
+def _try_acquire(redis_client, token: str, waiter: str, ticket: int, limit: int):
+    if not redis_client.set(
+        RENDER_ACQUIRE_LOCK_KEY, token, nx=True, ex=RENDER_ACQUIRE_LOCK_TTL
+    ):
+        return False
+
+    try:
+        now = time.time()
+
+        pipe = redis_client.pipeline()
+        pipe.zadd(RENDER_WAITING_KEY, {waiter: now}, xx=True)
+        # slot dan penunggu basi dibuang, antrian hanya berisi penunggu hidup
+        pipe.zremrangebyscore(RENDER_SLOTS_KEY, "-inf", now - RENDER_SLOT_TTL)
+        pipe.zremrangebyscore(RENDER_WAITING_KEY, "-inf", now - RENDER_SLOT_TTL)
+        pipe.zinterstore(
+            RENDER_OWNERS_KEY, {RENDER_OWNERS_KEY: 1, RENDER_WAITING_KEY: 0}
+        )
+        pipe.zcard(RENDER_SLOTS_KEY)
+        pipe.zrangebyscore(RENDER_OWNERS_KEY, "-inf", "(%d" % ticket)
+        running, ahead = pipe.execute()[-2:]
+
+        # penunggu di depan yang limit-nya lebih kecil tidak mendapat slot
+        # sebelum slot yang dipakai turun di bawah limit-nya, jadi tidak
+        # dihitung
+        ahead = sum(1 for w in ahead if int(w.split(b":", 1)[0]) >= limit)
+
+        if running + ahead >= limit:
+            return False
+
+        redis_client.zadd(RENDER_SLOTS_KEY, {token: now})
+        return True
+    finally:
+        if redis_client.get(RENDER_ACQUIRE_LOCK_KEY) == token.encode():
+            redis_client.delete(RENDER_ACQUIRE_LOCK_KEY)
+
+
+def _refresh(redis_client, token: str, stop: threading.Event):
+    while not stop.wait(RENDER_SLOT_REFRESH):
+        # xx: slot yang sudah dilepas tidak dibuat lagi
+        redis_client.zadd(RENDER_SLOTS_KEY, {token: time.time()}, xx=True)
+
+
+def _release(redis_client, token: str):
+    redis_client.zrem(RENDER_SLOTS_KEY, token)
+
+
+def _record(redis_client, duration_ms: int):
+    pipe = redis_client.pipeline()
+    pipe.hincrby(RENDER_STATS_KEY, "renders")
+    pipe.hincrby(RENDER_STATS_KEY, "total_ms", duration_ms)
+    pipe.lpush(RENDER_DURATIONS_KEY, duration_ms)
+    pipe.ltrim(RENDER_DURATIONS_KEY, 0, RENDER_DURATIONS_SIZE - 1)
+    pipe.execute()
+
+    # max_ms tidak atomik, cukup untuk metrik
+    if duration_ms > int(redis_client.hget(RENDER_STATS_KEY, "max_ms") or 0):
+        redis_client.hset(RENDER_STATS_KEY, "max_ms", duration_ms)
+
+
+def get_metrics() -> dict:
+    redis_client = redis.get_singleton_client()
+    stale = time.time() - RENDER_SLOT_TTL
+
+    pipe = redis_client.pipeline()
+    pipe.zremrangebyscore(RENDER_SLOTS_KEY, "-inf", stale)
+    pipe.zremrangebyscore(RENDER_WAITING_KEY, "-inf", stale)
+    pipe.zcard(RENDER_SLOTS_KEY)
+    pipe.zcard(RENDER_WAITING_KEY)
+    pipe.hgetall(RENDER_STATS_KEY)
+    pipe.lrange(RENDER_DURATIONS_KEY, 0, -1)
+    _, _, running, waiting, stats, durations = pipe.execute()
+
+    stats = {key.decode(): int(value) for key, value in stats.items()}
+    durations = sorted(int(d) for d in durations)
+    renders = stats.get("renders", 0)
+
+    def percentile(p):
+        if not durations:
+            return None
+        return durations[min(len(durations) - 1, int(len(durations) * p))]
+
+    return {
+        "concurrency": settings.REKAP_RENDER_CONCURRENCY,
+        "running": running,
+        "waiting": waiting,
+        "renders": renders,
+        "errors": stats.get("errors", 0),
+        "timeouts": stats.get("timeouts", 0),
+        "avg_ms": stats.get("total_ms", 0) // renders if renders else None,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "max_ms": stats.get("max_ms"),
+    }
@@ -0,0 +1,97 @@
+import pickle
+from datetime import time, timedelta
+from typing import NamedTuple, Optional
+
+from django.db.models import F
+
+from main.helpers import redis, versions
+from main.models import AbsensiSession
+
+# dinaikkan setiap AbsensiSession / kelas-nya berubah
+SCHEDULE_VERSION_KEY = "schedule_index_version"
+SCHEDULE_INDEX_KEY = "schedule_index_%s"
+SCHEDULE_INDEX_TTL = 60 * 60 * 24
+
+# urutan sesuai date.weekday(), minggu tidak punya kolom jadwal
+HARI = ("senin", "selasa", "rabu", "kamis", "jumat", "sabtu")
+
+
+class Schedule(NamedTuple):
+    id: str
+    jam_masuk: time
+    jam_masuk_toleransi: timedelta
+    jam_keluar_mulai_absen: Optional[time]
+    jam_keluar: time
+
+
+# ((generation, version), index) milik proses ini. Counter versi mulai dari 0
+# lagi setelah redis di-restart, generation membedakannya dari versi lama
+_local = (None, None)
+
+
+def get_index() -> dict:
+    """
+    (kelas_id, weekday) → Schedule, sesi pertama (urut pk) yang aktif di hari
+    tersebut. 1 round trip redis jika index proses ini masih berlaku, query
+    database hanya saat index belum ada di redis.
+    """
+    global _local
+
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(versions.GENERATION_KEY)
+        pipe.get(SCHEDULE_VERSION_KEY)
+        generation, version = pipe.execute()
+
+    generation = versions.get_generation(generation)
+    version = int(version or 0)
+
+    local_version, index = _local
+    if local_version == (generation, version):
+        return index
+
+    key = SCHEDULE_INDEX_KEY % version
+    cached = redis_client.get(key)
+    if cached is not None:
+        index = pickle.loads(cached)
+    else:
+        index = _build_index()
+        redis_client.set(key, pickle.dumps(index), ex=SCHEDULE_INDEX_TTL)
+
+    _local = ((generation, version), index)
+    return index
+
+
+def get_schedule(kelas_id: int, weekday: int) -> Optional[Schedule]:
+    return get_index().get((kelas_id, weekday))
+
+
+def _build_index() -> dict:
+    index = {}
+    sessions = (
+        AbsensiSession.objects.filter(kelas__isnull=False)
+        .annotate(schedule_kelas_id=F("kelas"))
+        .order_by("pk")
+    )
+
+    for session in sessions:
+        schedule = Schedule(
+            id=str(session.pk),
+            jam_masuk=session.jam_masuk,
+            jam_masuk_toleransi=session.jam_masuk_toleransi,
+            jam_keluar_mulai_absen=session.jam_keluar_mulai_absen,
+            jam_keluar=session.jam_keluar,
+        )
+        for weekday, hari in enumerate(HARI):
+            if getattr(session, hari):
+                index.setdefault((session.schedule_kelas_id, weekday), schedule)
+
+    return index
+
+
+def invalidate():
+    redis.invalidate(_incr_version)
+
+
+def _incr_version():
+    redis.get_singleton_client().incr(SCHEDULE_VERSION_KEY)
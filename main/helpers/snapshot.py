@@ -0,0 +1,218 @@
+import gzip
+import io
+from typing import Optional
+
+from main.helpers import database as helpers_database
+from main.helpers import redis, sync
+from main.models import Absensi, Kelas, KunciAbsensi, Siswa
+
+# snapshot disimpan ter-gzip per (format, versi scope, jendela tanggal)
+SNAPSHOT_KEY = "data_snapshot_%s_%s_%s_%s"
+SNAPSHOT_TTL = 60 * 60 * 12
+
+# shard per bulan disimpan ter-gzip per (bulan, versi scope)
+MONTH_SHARD_KEY = "data_month_%s_%s"
+
+# snapshot terkompresi yang lebih besar dari ini tidak disimpan di redis
+SNAPSHOT_MAX_SIZE = 32 * 1024 * 1024
+
+FORMAT_SQL = "sql"
+FORMAT_SQLITE = "sqlite"
+
+# (date_from, date_to), None berarti tidak dibatasi
+NO_WINDOW = (None, None)
+
+
+class _TeeBuffer:
+    """
+    fileobj untuk GzipFile. Hasil kompresi diteruskan ke client per potong
+    dan disimpan untuk cache selama ukurannya belum melewati `limit`.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.pending = []
+        self.stored = []
+        self.size = 0
+        self.overflow = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.pending.append(data)
+
+        if self.overflow:
+            return
+
+        self.size += len(data)
+        if self.size > self.limit:
+            # terlalu besar untuk di-cache, lepaskan agar memori tetap konstan
+            self.overflow = True
+            self.stored = []
+        else:
+            self.stored.append(data)
+
+    def read(self) -> bytes:
+        data = b"".join(self.pending)
+        self.pending = []
+        return data
+
+    def flush(self):
+        pass
+
+
+def scope_querysets(kelas_ids, window=NO_WINDOW):
+    """
+    querysets dump untuk sekumpulan kelas (scope). Jendela tanggal hanya
+    membatasi absensi dan kunci absensi, kelas & siswa selalu lengkap.
+    """
+    date_from, date_to = window
+
+    kelas_qs = Kelas.objects.filter(pk__in=kelas_ids)
+    siswa_qs = Siswa.objects.filter(kelas__pk__in=kelas_ids)
+    absensi_qs = Absensi.objects.filter(siswa__kelas__pk__in=kelas_ids)
+    lock_absensi_qs = KunciAbsensi.objects.filter(
+        kelas__pk__in=kelas_ids, locked=True
+    )
+
+    if date_from is not None:
+        absensi_qs = absensi_qs.filter(date__gte=date_from)
+        lock_absensi_qs = lock_absensi_qs.filter(date__gte=date_from)
+
+    if date_to is not None:
+        absensi_qs = absensi_qs.filter(date__lte=date_to)
+        lock_absensi_qs = lock_absensi_qs.filter(date__lte=date_to)
+
+    return kelas_qs, siswa_qs, absensi_qs, lock_absensi_qs
+
+
+def _snapshot_key(fmt: str, version: str, window) -> str:
+    date_from, date_to = window
+    return SNAPSHOT_KEY % (fmt, version, date_from or "", date_to or "")
+
+
+def _get_cached(key: str) -> Optional[tuple[bytes, int]]:
+    redis_client = redis.get_singleton_client()
+    content, watermark = redis_client.hmget(key, "content", "watermark")
+    if content is None:
+        return None
+
+    return content, int(watermark)
+
+
+def _store(key: str, content: bytes, watermark: int):
+    redis_client = redis.get_singleton_client()
+
+    with redis_client.pipeline() as pipe:
+        pipe.hset(key, mapping={"content": content, "watermark": watermark})
+        pipe.expire(key, SNAPSHOT_TTL)
+        pipe.execute()
+
+
+def _compress(chunks) -> bytes:
+    buf = io.BytesIO()
+
+    with gzip.GzipFile(mode="wb", compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        for chunk in chunks:
+            zfile.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+    return buf.getvalue()
+
+
+def get_cached_snapshot(
+    fmt: str, version: str, window=NO_WINDOW
+) -> Optional[tuple[bytes, int]]:
+    """return (konten ter-gzip, watermark) atau None jika belum ada"""
+    return _get_cached(_snapshot_key(fmt, version, window))
+
+
+def store_snapshot(
+    fmt: str, version: str, content: bytes, watermark: int, window=NO_WINDOW
+):
+    _store(_snapshot_key(fmt, version, window), content, watermark)
+
+
+def stream_snapshot(
+    kelas_ids, version: str, watermark: int, compressed: bool, window=NO_WINDOW
+):
+    """
+    Bangun dump SQL secara streaming. Setiap potongan langsung dikirim ke
+    client (ter-gzip jika `compressed`) sambil dikompresi untuk cache,
+    snapshot disimpan hanya jika seluruh dump selesai dikirim.
+    """
+    buf = _TeeBuffer(SNAPSHOT_MAX_SIZE)
+
+    with gzip.GzipFile(mode="wb", compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        querysets = scope_querysets(kelas_ids, window)
+        for chunk in helpers_database.iter_sql_dump(*querysets):
+            data = chunk.encode()
+            zfile.write(data)
+
+            compressed_data = buf.read()
+            if not compressed:
+                yield data
+            elif compressed_data:
+                yield compressed_data
+
+    compressed_data = buf.read()
+    if compressed and compressed_data:
+        yield compressed_data
+
+    if not buf.overflow:
+        store_snapshot(FORMAT_SQL, version, b"".join(buf.stored), watermark, window)
+
+
+def build_snapshot(kelas_ids, fmt: str, window=NO_WINDOW) -> bytes:
+    """return snapshot ter-gzip"""
+    querysets = scope_querysets(kelas_ids, window)
+
+    if fmt == FORMAT_SQL:
+        return _compress(helpers_database.iter_sql_dump(*querysets))
+
+    conn = helpers_database.dump_to_sqlite(*querysets)
+    try:
+        return _compress([helpers_database.serialize_sqlite(conn)])
+    finally:
+        conn.close()
+
+
+def get_snapshot(
+    kelas_ids, fmt: str, version: str, window=NO_WINDOW
+) -> tuple[bytes, int]:
+    """
+    Ambil snapshot dari cache atau buat baru. Semua user dengan scope yang
+    sama (mis. seluruh kesiswaan, wali + sekretaris satu kelas) berbagi
+    snapshot yang sama selama versi datanya belum berubah.
+
+    return (konten ter-gzip, watermark)
+    """
+    cached = get_cached_snapshot(fmt, version, window)
+    if cached is not None:
+        return cached
+
+    watermark = sync.now()
+    content = build_snapshot(kelas_ids, fmt, window)
+    store_snapshot(fmt, version, content, watermark, window)
+
+    return content, watermark
+
+
+def get_month_shard(kelas_ids, date_start, date_end, version: str) -> bytes:
+    """shard SQL absensi & kunci absensi satu bulan (ter-gzip)"""
+    key = MONTH_SHARD_KEY % (date_start.strftime("%Y-%m"), version)
+
+    cached = _get_cached(key)
+    if cached is not None:
+        return cached[0]
+
+    watermark = sync.now()
+    _, _, absensi_qs, lock_absensi_qs = scope_querysets(
+        kelas_ids, (date_start, date_end)
+    )
+    content = _compress(
+        helpers_database.iter_month_sql(
+            absensi_qs, lock_absensi_qs, date_start, date_end
+        )
+    )
+    _store(key, content, watermark)
+
+    return content
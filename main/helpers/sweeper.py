@@ -0,0 +1,52 @@
+from datetime import datetime
+from typing import Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from main.helpers import versions
+from main.models import Absensi
+
+# jumlah baris per UPDATE agar lock tabel tidak lama
+SWEEP_CHUNK_SIZE = 5000
+
+
+def sweep_expired_waits(now: Optional[datetime] = None) -> int:
+    """
+    Ubah absensi "tunggu" yang melewati wait_expired_at menjadi "bolos" di
+    database, sehingga pembacaan bisa memakai _status apa adanya. Return
+    jumlah baris yang diubah.
+    """
+    now = now or timezone.now()
+    swept = 0
+
+    expired = Absensi.objects.filter(
+        _status=Absensi.StatusChoices.WAIT, wait_expired_at__lte=now
+    )
+
+    while True:
+        rows = list(
+            expired.order_by("pk").values_list("pk", "siswa__kelas_id", "date")[
+                :SWEEP_CHUNK_SIZE
+            ]
+        )
+        if not rows:
+            break
+
+        with transaction.atomic():
+            # filter status diulang: absen pulang yang masuk di antara select
+            # dan update tidak ditimpa
+            count = expired.filter(pk__in=[pk for pk, _, _ in rows]).update(
+                _status=Absensi.StatusChoices.BOLOS, changed_at=now
+            )
+            # update() tidak memicu signal
+            versions.bump_absensi(
+                {(kelas_id, date) for _, kelas_id, date in rows}
+            )
+
+        swept += count
+
+        if len(rows) < SWEEP_CHUNK_SIZE:
+            break
+
+    return swept
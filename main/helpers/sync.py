@@ -0,0 +1,114 @@
+import time
+from typing import Optional
+
+from main.helpers import redis
+
+# watermark lebih tua dari ini tidak dilayani delta, client dapat full dump
+DELTA_MAX_AGE = 60 * 60 * 24 * 30
+
+# toleransi untuk transaksi yang baru commit setelah sync sebelumnya dimulai
+WATERMARK_OVERLAP = 60
+
+STRUCTURE_CHANGED_KEY = "sync_structure_changed_at"
+TOMBSTONE_KEY = "sync_tombstone_%s"
+
+
+def now() -> int:
+    return int(time.time())
+
+
+def mark_structure_changed():
+    """
+    Tandai perubahan kelas/siswa/role. Delta sync hanya mengirim absensi dan
+    kunci absensi, jadi watermark sebelum penanda ini harus full dump.
+    """
+    redis.invalidate(_set_structure_changed)
+
+
+def _set_structure_changed():
+    redis_client = redis.get_singleton_client()
+    redis_client.set(STRUCTURE_CHANGED_KEY, time.time())
+
+
+def get_structure_changed_at() -> float:
+    redis_client = redis.get_singleton_client()
+    value = redis_client.get(STRUCTURE_CHANGED_KEY)
+    if value is None:
+        return 0
+
+    return float(value)
+
+
+def format_watermark(timestamp: int, generation: str) -> str:
+    """
+    Watermark untuk client: waktu sync + generation redis (versions). Tombstone
+    dan penanda struktur hanya ada di redis, jadi watermark dari generation
+    lain tidak boleh dilayani delta.
+    """
+    return "%d-%s" % (timestamp, generation)
+
+
+def parse_watermark(value: str) -> Optional[tuple[int, str]]:
+    """return (timestamp, generation) atau None jika format tidak dikenal"""
+    timestamp, _, generation = value.partition("-")
+    if not timestamp.isdigit() or not generation:
+        return None
+
+    return int(timestamp), generation
+
+
+def can_use_delta(since: str, generation: str) -> bool:
+    """
+    `since` adalah watermark dari sync sebelumnya, `generation` generation
+    redis saat ini. Setelah redis di-restart tombstone bisa hilang, maka
+    watermark generation lama selalu mendapat full dump.
+    """
+    parsed = parse_watermark(since)
+    if parsed is None or parsed[1] != generation:
+        return False
+
+    timestamp = parsed[0]
+    current = now()
+
+    if timestamp > current or timestamp < current - DELTA_MAX_AGE:
+        return False
+
+    return get_structure_changed_at() <= timestamp - WATERMARK_OVERLAP
+
+
+def record_tombstone(table: str, kelas_id: int, date, natural_id: int):
+    """
+    Simpan jejak baris yang dihapus agar delta sync bisa ikut menghapusnya
+    di database client. Baris diidentifikasi dengan natural key (date + id)
+    karena id lokal client bisa berbeda dengan id server.
+    """
+    current = time.time()
+    member = "%s:%s:%s" % (kelas_id, date, natural_id)
+
+    redis_client = redis.get_singleton_client()
+    key = TOMBSTONE_KEY % table
+
+    with redis_client.pipeline() as pipe:
+        pipe.zadd(key, {member: current})
+        pipe.zremrangebyscore(key, "-inf", current - DELTA_MAX_AGE)
+        pipe.execute()
+
+
+def get_tombstones(table: str, since: int, kelas_ids=None) -> list[tuple[str, int]]:
+    """return list (date, natural_id) yang dihapus sejak watermark `since`"""
+    redis_client = redis.get_singleton_client()
+    members = redis_client.zrangebyscore(
+        TOMBSTONE_KEY % table, since - WATERMARK_OVERLAP, "+inf"
+    )
+
+    if kelas_ids is not None:
+        kelas_ids = {str(k) for k in kelas_ids}
+
+    results = []
+
+    for member in members:
+        kelas_id, date, natural_id = member.decode().split(":")
+        if kelas_ids is None or kelas_id in kelas_ids:
+            results.append((date, int(natural_id)))
+
+    return results
@@ -0,0 +1,156 @@
+import json
+import logging
+import time
+import uuid
+from typing import Optional
+
+from django.db import transaction
+from django.http import HttpRequest
+
+from main.helpers import redis
+
+logger = logging.getLogger(__name__)
+
+# antrian job upload (LPUSH masuk, worker mengambil dari kanan)
+QUEUE_KEY = "upload_queue"
+# job yang sedang diproses worker, dikembalikan ke antrian jika worker mati
+PROCESSING_KEY = "upload_queue_processing_%s"
+JOB_KEY = "upload_job_%s"
+
+# hasil job disimpan selama client belum sempat polling
+JOB_TTL = 60 * 60 * 24
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+
+
+def enqueue(user_id: int, data: list[dict]) -> str:
+    job_id = uuid.uuid4().hex
+    key = JOB_KEY % job_id
+
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline() as pipe:
+        pipe.hset(
+            key,
+            mapping={
+                "status": STATUS_PENDING,
+                "user_id": user_id,
+                "payload": json.dumps(data),
+                "created_at": time.time(),
+            },
+        )
+        pipe.expire(key, JOB_TTL)
+        pipe.lpush(QUEUE_KEY, job_id)
+        pipe.execute()
+
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    redis_client = redis.get_singleton_client()
+    job = redis_client.hgetall(JOB_KEY % job_id)
+    if not job:
+        return None
+
+    job = {k.decode(): v.decode() for k, v in job.items()}
+    job["user_id"] = int(job["user_id"])
+    if "result" in job:
+        job["result"] = json.loads(job["result"])
+        job["status_code"] = int(job["status_code"])
+
+    return job
+
+
+def requeue_stale(worker_name: str) -> int:
+    """kembalikan job yang tertinggal saat worker ini berhenti mendadak"""
+    redis_client = redis.get_singleton_client()
+    processing_key = PROCESSING_KEY % worker_name
+
+    count = 0
+    while redis_client.rpoplpush(processing_key, QUEUE_KEY) is not None:
+        count += 1
+
+    return count
+
+
+def pop(worker_name: str, timeout: int = 0) -> Optional[str]:
+    """
+    Ambil 1 job dan pindahkan ke daftar processing milik worker secara
+    atomik, job tidak hilang walaupun worker mati sebelum selesai.
+    timeout=0 -> tidak menunggu.
+    """
+    redis_client = redis.get_singleton_client()
+    processing_key = PROCESSING_KEY % worker_name
+
+    if timeout:
+        job_id = redis_client.brpoplpush(QUEUE_KEY, processing_key, timeout)
+    else:
+        job_id = redis_client.rpoplpush(QUEUE_KEY, processing_key)
+
+    return job_id.decode() if job_id is not None else None
+
+
+def process(job_id: str, worker_name: str):
+    """
+    Proses 1 job. Job selalu diakhiri status done (termasuk jika gagal,
+    dengan status_code 400/500) dan selalu dilepas dari daftar processing,
+    sehingga payload rusak tidak diulang terus oleh requeue_stale.
+    """
+    redis_client = redis.get_singleton_client()
+    key = JOB_KEY % job_id
+
+    try:
+        job = get_job(job_id)
+
+        # job sudah kedaluwarsa atau sudah selesai sebelum worker sempat LREM
+        if job is not None and job["status"] != STATUS_DONE:
+            redis_client.hset(key, "status", STATUS_PROCESSING)
+
+            try:
+                status_code, result = _handle(job)
+            except (KeyError, ValueError) as e:
+                # payload tidak lengkap/format salah, batch sudah di-rollback
+                logger.warning("upload job %s ditolak: %r", job_id, e)
+                status_code, result = 400, {"detail": "Data tidak valid: %s" % e}
+            except Exception:
+                logger.exception("upload job %s gagal", job_id)
+                status_code, result = 500, {"detail": "Gagal memproses upload"}
+
+            _finish(key, status_code, result)
+    finally:
+        redis_client.lrem(PROCESSING_KEY % worker_name, 1, job_id)
+
+
+def _handle(job: dict) -> tuple[int, dict]:
+    from main.api.router.upload import UploadView
+    from main.api.schemas import DataUploadSchema
+    from main.models import User
+
+    request = HttpRequest()
+    request.auth = User.objects.filter(pk=job["user_id"]).first()
+    if request.auth is None:
+        return 403, {"detail": "Ditolak"}
+
+    data = DataUploadSchema(data=json.loads(job["payload"]))
+    with transaction.atomic():
+        rv = UploadView(request, data).handle()
+
+    return rv if isinstance(rv, tuple) else (200, rv)
+
+
+def _finish(key: str, status_code: int, result: dict):
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline() as pipe:
+        pipe.hset(
+            key,
+            mapping={
+                "status": STATUS_DONE,
+                "status_code": status_code,
+                "result": json.dumps(result, default=str),
+                "finished_at": time.time(),
+            },
+        )
+        # payload tidak dibutuhkan lagi
+        pipe.hdel(key, "payload")
+        pipe.execute()
@@ -0,0 +1,148 @@
+import hashlib
+import uuid
+from typing import Optional
+
+from main.helpers import redis
+
+KELAS_VERSION_KEY = "data_version_kelas_%s"
+# versi kelas & siswa (nama, pindah kelas) per kelas, dipakai rekap bulanan
+STRUCTURE_VERSION_KEY = "data_version_structure_%s"
+# versi absensi per (kelas, tahun, bulan), dipakai rekap bulanan
+REKAP_VERSION_KEY = "data_version_rekap_%s_%s_%s"
+# versi absensi & kunci absensi per (kelas, tahun, bulan), dipakai shard
+# /data/month. Terpisah dari versi rekap agar kunci tidak membuat ulang pdf
+MONTH_VERSION_KEY = "data_version_month_%s_%s_%s"
+# id acak yang dibuat saat pertama dipakai. Counter versi mulai dari 0 lagi
+# jika redis di-restart tanpa persistence, generation baru membuat versi
+# setelah restart tidak sama dengan versi (ETag) yang pernah dikirim
+GENERATION_KEY = "data_version_generation"
+
+
+def _incr(keys):
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.incr(key)
+        pipe.execute()
+
+
+def bump_locks(kelas_dates):
+    """
+    Naikkan versi kelas dan versi bulan (kelas_id, date) yang kunci
+    absensinya berubah. Dipanggil oleh signal dan manual dari upload.
+    """
+    keys = set()
+    for kelas_id, date in kelas_dates:
+        if kelas_id is None:
+            continue
+
+        keys.add(KELAS_VERSION_KEY % kelas_id)
+        keys.add(MONTH_VERSION_KEY % (kelas_id, date.year, date.month))
+
+    _bump(keys)
+
+
+def bump_structure(kelas_ids):
+    """
+    Naikkan versi kelas yang kelas/siswanya berubah (nama, pindah kelas,
+    siswa baru/dihapus). Snapshot /api/data dan rekap semua bulan kelas ini
+    tidak berlaku lagi, kelas lain tidak terpengaruh.
+    """
+    keys = set()
+    for kelas_id in kelas_ids:
+        if kelas_id is None:
+            continue
+
+        keys.add(KELAS_VERSION_KEY % kelas_id)
+        keys.add(STRUCTURE_VERSION_KEY % kelas_id)
+
+    _bump(keys)
+
+
+def bump_absensi(kelas_dates):
+    """
+    Naikkan versi kelas, versi rekap dan versi bulan (kelas_id, date) yang
+    absensinya berubah. Dipanggil dari semua jalur tulis absensi: signal
+    (admin), upload, antrian piket dan sweeper.
+    """
+    keys = set()
+    for kelas_id, date in kelas_dates:
+        if kelas_id is None:
+            continue
+
+        keys.add(KELAS_VERSION_KEY % kelas_id)
+        keys.add(REKAP_VERSION_KEY % (kelas_id, date.year, date.month))
+        keys.add(MONTH_VERSION_KEY % (kelas_id, date.year, date.month))
+
+    _bump(keys)
+
+
+def _bump(keys):
+    if keys:
+        redis.invalidate(lambda: _incr(keys))
+
+
+def get_generation(value: Optional[bytes] = None) -> str:
+    """
+    Generation data saat ini. `value` adalah hasil GET GENERATION_KEY yang
+    sudah diambil pemanggil (mis. dalam pipeline), None jika belum ada.
+    """
+    if value is None:
+        redis_client = redis.get_singleton_client()
+        redis_client.set(GENERATION_KEY, uuid.uuid4().hex, nx=True)
+        value = redis_client.get(GENERATION_KEY)
+
+    return value.decode()
+
+
+def get_scope_version(kelas_ids) -> str:
+    """
+    Versi gabungan dari sekumpulan kelas (1 round trip redis). Berubah jika
+    salah satu kelas berubah atau redis di-restart.
+    """
+    kelas_ids = sorted(kelas_ids)
+
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(GENERATION_KEY)
+        if kelas_ids:
+            pipe.mget([KELAS_VERSION_KEY % k for k in kelas_ids])
+        results = pipe.execute()
+
+    versions = results[1] if kelas_ids else []
+
+    parts = [get_generation(results[0])]
+    for kelas_id, version in zip(kelas_ids, versions):
+        parts.append("%s:%s" % (kelas_id, int(version or 0)))
+
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+def get_month_version(kelas_ids, year: int, month: int) -> str:
+    """
+    Versi shard satu bulan dari sekumpulan kelas. Hanya berubah jika
+    absensi/kunci bulan tersebut atau kelas & siswa (struktur) berubah,
+    perubahan bulan lain tidak mempengaruhi.
+    """
+    kelas_ids = sorted(kelas_ids)
+
+    redis_client = redis.get_singleton_client()
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.get(GENERATION_KEY)
+        if kelas_ids:
+            pipe.mget([MONTH_VERSION_KEY % (k, year, month) for k in kelas_ids])
+            pipe.mget([STRUCTURE_VERSION_KEY % k for k in kelas_ids])
+        results = pipe.execute()
+
+    month_versions, structure_versions = results[1:] if kelas_ids else ([], [])
+
+    parts = [get_generation(results[0]), "%04d-%02d" % (year, month)]
+    for kelas_id, month_version, structure_version in zip(
+        kelas_ids, month_versions, structure_versions
+    ):
+        parts.append(
+            "%s:%s:%s"
+            % (kelas_id, int(month_version or 0), int(structure_version or 0))
+        )
+
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
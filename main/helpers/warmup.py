@@ -0,0 +1,185 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+
+from main.helpers import pdf as helpers_pdf
+from main.helpers import rekap_job, render_pool
+from main.helpers import snapshot as helpers_snapshot
+from main.helpers import versions
+from main.models import Kelas
+
+logger = logging.getLogger(__name__)
+
+
+def get_next_run(now: datetime, times: list[time]) -> datetime:
+    """jadwal warmup berikutnya setelah `now` dari jam-jam WARMUP_TIMES"""
+    if not times:
+        raise ValueError("WARMUP_TIMES tidak boleh kosong")
+
+    candidates = []
+    for day in (now.date(), now.date() + timedelta(days=1)):
+        for at in times:
+            run_at = datetime.combine(day, at, tzinfo=now.tzinfo)
+            if run_at > now:
+                candidates.append(run_at)
+
+    return min(candidates)
+
+
+def get_months(today: date) -> list[tuple[int, int]]:
+    """
+    (bulan, tahun) yang rekapnya dibuat: bulan ini, ditambah bulan lalu
+    selama WARMUP_PREVIOUS_MONTH_DAYS hari pertama (tutup bulan).
+    """
+    months = [(today.month, today.year)]
+
+    if today.day <= settings.WARMUP_PREVIOUS_MONTH_DAYS:
+        previous = today - relativedelta(months=1)
+        months.append((previous.month, previous.year))
+
+    return months
+
+
+def get_scopes() -> set[tuple[int, ...]]:
+    """
+    Scope kelas yang datanya diunduh lewat /data: semua kelas aktif
+    (kesiswaan), kelas per wali kelas dan kelas per sekretaris.
+    """
+    all_kelas = set()
+    by_wali_kelas = defaultdict(set)
+    by_sekretaris = defaultdict(set)
+
+    rows = Kelas.objects.only_active().values_list("pk", "wali_kelas", "sekretaris")
+    for pk, wali_kelas_id, sekretaris_id in rows:
+        all_kelas.add(pk)
+        if wali_kelas_id is not None:
+            by_wali_kelas[wali_kelas_id].add(pk)
+        if sekretaris_id is not None:
+            by_sekretaris[sekretaris_id].add(pk)
+
+    scopes = {tuple(sorted(all_kelas))}
+    for kelas_ids in (*by_wali_kelas.values(), *by_sekretaris.values()):
+        scopes.add(tuple(sorted(kelas_ids)))
+
+    scopes.discard(())
+    return scopes
+
+
+def warm_snapshots() -> int:
+    """
+    Buat snapshot /data (SQL, tanpa jendela tanggal seperti yang diminta
+    frontend) yang belum ada di cache. Return jumlah snapshot yang dibuat.
+    """
+    built = 0
+
+    for kelas_ids in get_scopes():
+        version = versions.get_scope_version(kelas_ids)
+        if helpers_snapshot.get_cached_snapshot(helpers_snapshot.FORMAT_SQL, version):
+            continue
+
+        helpers_snapshot.get_snapshot(kelas_ids, helpers_snapshot.FORMAT_SQL, version)
+        built += 1
+
+    return built
+
+
+def warm_rekaps(month: int, year: int) -> int:
+    """
+    Buat pdf rekap semua kelas aktif yang belum ada untuk versi data saat
+    ini, sehingga /get-rekap langsung mendapat status "done". Rekap yang
+    sedang dibuat worker lain dilewati. Return jumlah pdf yang dibuat.
+    """
+    kelas_list = list(Kelas.objects.only_active().order_by("name"))
+
+    # rekap id dibaca sebelum query matriks, perubahan setelahnya menaikkan
+    # versi sehingga pdf ini tidak dipakai
+    pending = []
+    for kelas in kelas_list:
+        file_id, is_cached = rekap_job.get_rekap_id(kelas.pk, year, month)
+        if not is_cached:
+            pending.append((kelas, file_id))
+
+    if not pending:
+        return 0
+
+    matrices = helpers_pdf.get_rekap_matrices(
+        [kelas.pk for kelas, _ in pending], month, year
+    )
+
+    built = 0
+    batch_size = settings.REKAP_RENDER_CONCURRENCY
+
+    # lock diambil per batch, tidak ditahan selama antrian semua kelas
+    for start in range(0, len(pending), batch_size):
+        jobs = {}
+        for kelas, file_id in pending[start : start + batch_size]:
+            token = rekap_job.acquire(file_id)
+            if token is not None:
+                jobs[kelas] = (file_id, token)
+
+        try:
+            built += _render_batch(jobs, matrices, month, year)
+        finally:
+            for file_id, token in jobs.values():
+                rekap_job.release(file_id, token)
+
+    return built
+
+
+def _render_batch(jobs: dict, matrices: dict, month: int, year: int) -> int:
+    if not jobs:
+        return 0
+
+    built = 0
+
+    with ThreadPoolExecutor(
+        max_workers=len(jobs), thread_name_prefix="rekap-warmup"
+    ) as executor:
+        futures = {
+            executor.submit(
+                render_pool.render,
+                helpers_pdf.render_html(kelas, month, year, matrices[kelas.pk]),
+                helpers_pdf.options,
+                rekap_job.LOCK_TTL,
+            ): kelas
+            for kelas in jobs
+        }
+
+        for future in as_completed(futures):
+            kelas = futures[future]
+            file_id, _ = jobs[kelas]
+
+            try:
+                content = future.result()
+            except Exception:
+                # kelas lain tetap dibuat, yang gagal dibuat saat diminta
+                logger.exception("warmup rekap %s gagal", file_id)
+                continue
+
+            rekap_job.save(
+                file_id,
+                kelas.pk,
+                month,
+                year,
+                helpers_pdf.get_filename(kelas, month, year),
+                content,
+            )
+            built += 1
+
+    return built
+
+
+def run(today: date) -> dict:
+    """warmup rekap (bulan dari get_months) dan snapshot /data"""
+    result = {"rekap": 0, "snapshot": 0}
+
+    for month, year in get_months(today):
+        result["rekap"] += warm_rekaps(month, year)
+
+    result["snapshot"] = warm_snapshots()
+
+    return result
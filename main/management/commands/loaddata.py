@@ -3,6 +3,7 @@ import pickle
 from django.core.management import BaseCommand
 from django.db import transaction
 
+from main.helpers import sync, versions
 from main.models import Absensi, Kelas, KunciAbsensi, Siswa, User
 
 
@@ -82,3 +83,20 @@ class Command(BaseCommand):
         
         Absensi.objects.bulk_create(absensies_obj)
 
+        # bulk_create tidak memicu signal, rekap, snapshot dan shard bulan
+        # yang terkena dinaikkan versinya di sini
+        siswa_kelas_ids = dict(
+            Siswa.objects.filter(
+                pk__in = {absensi.siswa_id for absensi in absensies_obj}
+            ).values_list('pk', 'kelas_id')
+        )
+        date_field = Absensi._meta.get_field('date')
+        versions.bump_absensi({
+            (siswa_kelas_ids.get(absensi.siswa_id), date_field.to_python(absensi.date))
+            for absensi in absensies_obj
+        })
+
+        # delta sync tidak membawa tombstone data yang ditimpa, client harus
+        # mengambil full dump
+        sync.mark_structure_changed()
+
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.helpers import piket_queue
+
+
+class Command(BaseCommand):
+    help = "Menulis antrian scan guru piket (/api/piket/upload) ke database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Periksa semua antrian sekali lalu berhenti",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Flush walaupun batas jumlah/umur scan belum tercapai",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=5,
+            help="Jeda antar pemeriksaan antrian dalam detik (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if not options["once"]:
+                # berjalan lama, koneksi db bisa sudah ditutup server
+                close_old_connections()
+
+            for domain in piket_queue.get_domains():
+                if not options["force"] and not piket_queue.is_due(domain):
+                    continue
+
+                processed = piket_queue.flush(domain)
+                if processed:
+                    self.stdout.write("%s: %d scan ditulis" % (domain, processed))
+
+            if options["once"]:
+                break
+
+            time.sleep(options["interval"])
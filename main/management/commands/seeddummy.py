@@ -17,10 +17,17 @@ class Command(BaseCommand):
             default=14,
             help="Jumlah hari ke belakang untuk diisi data absensinya (default: 14 hari)",
         )
+        parser.add_argument(
+            "--siswa",
+            type=int,
+            default=12,
+            help="Jumlah siswa per kelas, sisanya dibuat dengan nama generik (default: 12)",
+        )
 
     @transaction.atomic
     def handle(self, *args, **options):
         days = options["days"]
+        siswa_per_kelas = options["siswa"]
 
         # Validasi bahwa database kosong (abaikan superuser)
         has_normal_users = User.objects.filter(is_superuser=False).exists()
@@ -218,6 +225,17 @@ class Command(BaseCommand):
             ("Sule Sutisna", "1212", "0078765412"),
         ]
 
+        # tambah siswa generik jika diminta lebih dari daftar di atas
+        for prefix, students in (
+            ("10", students_ipa),
+            ("11", students_ips),
+            ("12", students_bahasa),
+        ):
+            for i in range(len(students), siswa_per_kelas):
+                nis = "%s%03d" % (prefix, i + 1)
+                students.append((f"Siswa Dummy {nis}", nis, f"00{prefix}{i + 1:06d}"))
+            del students[siswa_per_kelas:]
+
         siswa_objects = []
 
         for name, nis, nisn in students_ipa:
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.helpers import sweeper
+
+
+class Command(BaseCommand):
+    help = 'Mengubah absensi "tunggu" yang sudah lewat jam keluar menjadi "bolos"'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Jalankan sekali lalu berhenti (mis. dari cron)",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=60,
+            help="Jeda antar sweep dalam detik (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if not options["once"]:
+                # berjalan lama, koneksi db bisa sudah ditutup server
+                close_old_connections()
+
+            swept = sweeper.sweep_expired_waits()
+            if swept:
+                self.stdout.write("%d absensi diubah menjadi bolos" % swept)
+
+            if options["once"]:
+                break
+
+            time.sleep(options["interval"])
@@ -0,0 +1,52 @@
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.helpers import upload_queue
+
+
+class Command(BaseCommand):
+    help = "Memproses antrian upload absensi (/api/upload?async=1)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--name",
+            type=str,
+            default=socket.gethostname(),
+            help="Nama worker, harus tetap sama setiap restart (default: hostname)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Proses antrian sampai kosong lalu berhenti",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=int,
+            default=5,
+            help="Lama menunggu job baru dalam detik (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        name = options["name"]
+
+        requeued = upload_queue.requeue_stale(name)
+        if requeued:
+            self.stdout.write("%d job dikembalikan ke antrian" % requeued)
+
+        while True:
+            timeout = 0 if options["once"] else options["timeout"]
+            job_id = upload_queue.pop(name, timeout)
+
+            if job_id is None:
+                if options["once"]:
+                    break
+                continue
+
+            if not options["once"]:
+                # worker berjalan lama, koneksi db bisa sudah ditutup server
+                close_old_connections()
+
+            upload_queue.process(job_id, name)
+            self.stdout.write("job %s selesai" % job_id)
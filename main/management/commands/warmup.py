@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from main.helpers import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Membuat rekap pdf semua kelas aktif dan snapshot /data di luar jam "
+        "sibuk, setiap hari pada jam WARMUP_TIMES"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Jalankan sekali lalu berhenti (mis. dari cron)",
+        )
+        parser.add_argument(
+            "--month",
+            type=int,
+            help="Hanya buat rekap bulan ini (1-12), bersama --year",
+        )
+        parser.add_argument("--year", type=int)
+
+    def handle(self, *args, **options):
+        if options["month"] is not None:
+            year = options["year"] or timezone.localdate().year
+            built = warmup.warm_rekaps(options["month"], year)
+            self.stdout.write("%d rekap dibuat" % built)
+            return
+
+        if options["once"]:
+            self._run()
+            return
+
+        next_run = warmup.get_next_run(timezone.localtime(), settings.WARMUP_TIMES)
+        self.stdout.write("warmup berikutnya: %s" % next_run)
+
+        while True:
+            now = timezone.localtime()
+            if now >= next_run:
+                # berjalan lama, koneksi db bisa sudah ditutup server
+                close_old_connections()
+                self._run()
+
+                now = timezone.localtime()
+                next_run = warmup.get_next_run(now, settings.WARMUP_TIMES)
+                self.stdout.write("warmup berikutnya: %s" % next_run)
+
+            # tidur sebentar-sebentar agar perubahan jam sistem ikut terbaca
+            time.sleep(min((next_run - now).total_seconds(), 60))
+
+    def _run(self):
+        result = warmup.run(timezone.localdate())
+        self.stdout.write(
+            "%d rekap dan %d snapshot dibuat" % (result["rekap"], result["snapshot"])
+        )
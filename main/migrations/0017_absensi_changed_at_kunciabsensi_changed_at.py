@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_user_full_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='absensi',
+            name='changed_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='kunciabsensi',
+            name='changed_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_absensi_changed_at_kunciabsensi_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absensi',
+            index=models.Index(fields=['_status', 'wait_expired_at'], name='absensi_status_wait_idx'),
+        ),
+    ]
@@ -33,19 +33,39 @@ class CustomUserManager(BaseManager, UserManager):
         )
 
 
-class AbsensiOriginalManager(models.Manager):
-    status_expression = models.Case(
+def get_status_expression():
+    """
+    Fallback untuk absensi "tunggu" yang belum diubah jadi "bolos" oleh
+    `manage.py sweepabsensi`. Dibuat per query agar waktu sekarang tidak basi
+    di worker yang berjalan lama.
+    """
+    return models.Case(
         models.When(~models.Q(_status="tunggu"), then=models.F("_status")),
         models.When(wait_expired_at__lte=timezone.now(), then=models.Value("bolos")),
         default=models.Value("tunggu"),
     )
 
+
+def get_final_status(status, wait_expired_at, now=None):
+    """
+    Sama dengan get_status_expression, dihitung di python. Dipakai jalur baca
+    besar (dump, delta, daftar absensi) yang membaca `_status` apa adanya
+    sehingga CASE tidak dievaluasi untuk setiap baris, hanya baris "tunggu"
+    yang diperiksa waktunya.
+    """
+    if status != "tunggu" or wait_expired_at is None:
+        return status
+
+    return "bolos" if wait_expired_at <= (now or timezone.now()) else status
+
+
+class AbsensiOriginalManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset().annotate(final_status=self.status_expression)
+        return super().get_queryset().annotate(final_status=get_status_expression())
 
 
 class AbsensiManager(BaseManager):
     def get_queryset(self):
         return BaseManager.get_queryset(self).annotate(
-            final_status=AbsensiOriginalManager.status_expression
+            final_status=get_status_expression()
         )
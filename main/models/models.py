@@ -143,6 +143,8 @@ class KunciAbsensi(BaseModel):
     date = models.DateField(default=timezone.now, verbose_name="Tanggal")
     kelas = models.ForeignKey(Kelas, on_delete=models.CASCADE)
     locked = models.BooleanField(default=True, verbose_name="Kunci")
+    # waktu perubahan versi server, dipakai sebagai watermark delta sync
+    changed_at = models.DateTimeField(auto_now=True, db_index=True, editable=False)
 
     def __str__(self):
         return "Lock: %s" % self.kelas
@@ -160,6 +162,12 @@ class Absensi(BaseModel):
                 name="wait_expired_at_must_not_null_while_status_is_wait",
             )
         ]
+        indexes = [
+            # dipakai `manage.py sweepabsensi` mencari "tunggu" yang kedaluwarsa
+            models.Index(
+                fields=["_status", "wait_expired_at"], name="absensi_status_wait_idx"
+            )
+        ]
 
     objects = AbsensiManager()
 
@@ -183,6 +191,8 @@ class Absensi(BaseModel):
     created_at = models.DateTimeField(default=timezone.now, verbose_name="Dibuat")
     updated_at = models.DateTimeField(default=timezone.now, verbose_name="Diubah")
     wait_expired_at = models.DateTimeField(editable=False, null=True)
+    # updated_at dikirim oleh client, changed_at selalu waktu server
+    changed_at = models.DateTimeField(auto_now=True, db_index=True, editable=False)
     by = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, verbose_name="Oleh"
     )
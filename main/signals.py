@@ -1,9 +1,12 @@
 from typing import Union
 
-from django.db.models.signals import pre_delete, pre_save
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
 from django.dispatch import receiver
 
-from main.models import Siswa, User
+from main.helpers import piket_queue, schedule, sync, versions
+from main.models import (Absensi, AbsensiSession, Kelas, KunciAbsensi, Siswa,
+                         User)
 
 
 @receiver(pre_delete, sender=User)
@@ -50,3 +53,160 @@ def save_photo_handler(sender, **kwargs):
         current_instance.photo.delete(save=False)
 
     # end: photo baru akan disimpan
+
+
+@receiver(post_save, sender=Kelas)
+@receiver(post_delete, sender=Kelas)
+@receiver(post_save, sender=Siswa)
+@receiver(post_delete, sender=Siswa)
+@receiver(m2m_changed, sender=Kelas.sekretaris.through)
+def structure_changed_handler(sender, **kwargs):
+    """delta sync tidak membawa kelas/siswa, client harus full dump"""
+    if kwargs.get("action", "post_").startswith("pre_"):
+        return
+
+    sync.mark_structure_changed()
+
+
+@receiver(pre_save, sender=Siswa)
+def siswa_pre_save_handler(sender, **kwargs):
+    """simpan kelas lama, siswa yang pindah mengubah kelas lama dan baru"""
+    instance: Siswa = kwargs["instance"]
+    if instance._state.adding:
+        return
+
+    instance._previous_kelas_id = (
+        Siswa.objects.filter(pk=instance.pk).values_list("kelas_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Kelas)
+@receiver(post_delete, sender=Kelas)
+def kelas_changed_handler(sender, **kwargs):
+    """snapshot /api/data dan rekap kelas ini tidak berlaku lagi"""
+    versions.bump_structure([kwargs["instance"].pk])
+
+
+@receiver(post_save, sender=Siswa)
+@receiver(post_delete, sender=Siswa)
+def siswa_changed_handler(sender, **kwargs):
+    instance: Siswa = kwargs["instance"]
+    versions.bump_structure(
+        {instance.kelas_id, getattr(instance, "_previous_kelas_id", None)}
+    )
+
+
+@receiver(m2m_changed, sender=Kelas.sekretaris.through)
+def sekretaris_changed_handler(sender, **kwargs):
+    if not kwargs["action"].startswith("post_"):
+        return
+
+    if kwargs["reverse"]:
+        # user.kelas_set.add(...), pk_set berisi id kelas
+        kelas_ids = kwargs["pk_set"] or ()
+    else:
+        kelas_ids = [kwargs["instance"].pk]
+
+    versions.bump_structure(kelas_ids)
+
+
+@receiver(post_save, sender=Kelas)
+@receiver(post_delete, sender=Kelas)
+@receiver(post_save, sender=Siswa)
+@receiver(post_delete, sender=Siswa)
+def roster_changed_handler(sender, **kwargs):
+    """roster /api/piket/scan dibangun ulang"""
+    piket_queue.invalidate_roster()
+
+
+@receiver(post_save, sender=AbsensiSession)
+@receiver(post_delete, sender=AbsensiSession)
+@receiver(m2m_changed, sender=AbsensiSession.kelas.through)
+@receiver(post_save, sender=Kelas)
+@receiver(post_delete, sender=Kelas)
+def schedule_changed_handler(sender, **kwargs):
+    """index jadwal (kelas, hari) → sesi dibangun ulang"""
+    if kwargs.get("action", "post_").startswith("pre_"):
+        return
+
+    schedule.invalidate()
+
+
+def _get_absensi_kelas_id(instance: Absensi):
+    return (
+        Siswa.objects.filter(pk=instance.siswa_id)
+        .values_list("kelas_id", flat=True)
+        .first()
+    )
+
+
+def _get_absensi_date(instance: Absensi):
+    # date bisa masih berupa string jika di-assign manual
+    return Absensi._meta.get_field("date").to_python(instance.date)
+
+
+@receiver(pre_save, sender=Absensi)
+def absensi_pre_save_handler(sender, **kwargs):
+    """
+    simpan (kelas, tanggal, siswa) lama, rekap bulan lama juga berubah dan
+    baris dengan natural key lama harus dihapus di client
+    """
+    instance: Absensi = kwargs["instance"]
+    if instance._state.adding:
+        return
+
+    instance._previous_absensi = (
+        Absensi.objects.filter(pk=instance.pk)
+        .values_list("siswa__kelas_id", "date", "siswa_id")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Absensi)
+def absensi_saved_handler(sender, **kwargs):
+    """snapshot /api/data dan rekap bulan kelas ini tidak berlaku lagi"""
+    instance: Absensi = kwargs["instance"]
+    date = _get_absensi_date(instance)
+    kelas_dates = {(_get_absensi_kelas_id(instance), date)}
+
+    previous = getattr(instance, "_previous_absensi", None)
+    if previous is not None:
+        previous_kelas_id, previous_date, previous_siswa_id = previous
+        kelas_dates.add((previous_kelas_id, previous_date))
+
+        # delta mencocokkan baris dengan (date, siswa), baris lama di client
+        # hanya terhapus lewat tombstone
+        if (previous_date, previous_siswa_id) != (date, instance.siswa_id):
+            sync.record_tombstone(
+                "absensi", previous_kelas_id, previous_date, previous_siswa_id
+            )
+
+    versions.bump_absensi(kelas_dates)
+
+
+@receiver(post_delete, sender=Absensi)
+def absensi_deleted_handler(sender, **kwargs):
+    instance: Absensi = kwargs["instance"]
+    kelas_id = _get_absensi_kelas_id(instance)
+
+    sync.record_tombstone("absensi", kelas_id, instance.date, instance.siswa_id)
+    versions.bump_absensi([(kelas_id, _get_absensi_date(instance))])
+
+
+def _get_kunci_date(instance: KunciAbsensi):
+    return KunciAbsensi._meta.get_field("date").to_python(instance.date)
+
+
+@receiver(post_save, sender=KunciAbsensi)
+def kunci_absensi_saved_handler(sender, **kwargs):
+    instance: KunciAbsensi = kwargs["instance"]
+    versions.bump_locks([(instance.kelas_id, _get_kunci_date(instance))])
+
+
+@receiver(post_delete, sender=KunciAbsensi)
+def kunci_absensi_deleted_handler(sender, **kwargs):
+    instance: KunciAbsensi = kwargs["instance"]
+    sync.record_tombstone(
+        "kunci_absensi", instance.kelas_id, instance.date, instance.kelas_id
+    )
+    versions.bump_locks([(instance.kelas_id, _get_kunci_date(instance))])
@@ -4,7 +4,8 @@ Admin Panel Tests.
 Covers:
   - Access control (login required, staff-only)
   - List/changelist views for all registered models
-  - Custom AdminSite views: naik_kelas, export_absensi, import_siswa
+  - Custom AdminSite views: naik_kelas, export_absensi, import_siswa,
+    rekap_bulk_progress
   - Custom ModelAdmin behaviours (save_model, actions, permissions)
   - DataAdmin add restriction
   - AbsensiAdmin permission restrictions (no add/delete)
@@ -16,6 +17,7 @@ Run:
 import io
 import json
 from datetime import date
+from unittest.mock import patch
 
 import openpyxl
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -23,6 +25,7 @@ from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from main.admin import admin_site
+from main.helpers import redis, rekap_bulk
 from main.models import Absensi, Data, Kelas, KunciAbsensi, Siswa, User
 
 
@@ -666,3 +669,62 @@ class KelasAdminTest(AdminTestBase):
         # On success Django redirects to the changelist (302)
         self.assertIn(response.status_code, [200, 302])
         self.assertTrue(Kelas.objects.filter(name="11-I").exists())
+
+
+# ---------------------------------------------------------------------------
+# 12. KelasAdmin: rekap_pdf action (rekap massal ZIP)
+# ---------------------------------------------------------------------------
+
+
+@override_settings(DEBUG=True, CACHEOPS_ENABLED=False)
+class KelasAdminRekapActionTest(AdminTestBase):
+    def setUp(self):
+        super().setUp()
+        self.kelas = [
+            Kelas.objects.create(name=f"12-{i}", active=True) for i in range(2)
+        ]
+        self.redis = redis.get_singleton_client()
+        for key in self.redis.scan_iter("rekap_bulk_*"):
+            self.redis.delete(key)
+
+    def test_rekap_pdf_asks_for_month(self):
+        response = self.post(
+            f"{ADMIN_ROOT}main/kelas/",
+            data={
+                "action": "rekap_pdf",
+                "_selected_action": [k.pk for k in self.kelas],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="month"')
+        self.assertContains(response, 'name="apply"')
+
+    @patch("main.helpers.rekap_bulk.submit")
+    def test_rekap_pdf_starts_job(self, mock_submit):
+        response = self.post(
+            f"{ADMIN_ROOT}main/kelas/",
+            data={
+                "action": "rekap_pdf",
+                "_selected_action": [self.kelas[0].pk],
+                "apply": "1",
+                "month": "3",
+                "year": "2026",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+
+        job_id, _ = mock_submit.call_args.args
+        self.assertEqual(response["Location"], f"{ADMIN_ROOT}rekap-bulk/{job_id}/")
+
+        job = rekap_bulk.get_job(job_id)
+        self.assertEqual(job["kelas_ids"], str(self.kelas[0].pk))
+        self.assertEqual((job["month"], job["year"]), (3, 2026))
+
+        # halaman progress diperbarui otomatis selama job berjalan
+        response = self.get(response["Location"])
+        self.assertContains(response, "0 / 1")
+        self.assertContains(response, 'http-equiv="refresh"')
+
+    def test_progress_unknown_job(self):
+        response = self.get(f"{ADMIN_ROOT}rekap-bulk/unknown/")
+        self.assertEqual(response.status_code, 404)
@@ -1,4 +1,9 @@
+from datetime import date, timedelta
+
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from main.helpers import redis
 from main.models import User, Kelas, Siswa, Absensi
 from main.api.api import api
 from django.utils import timezone
@@ -43,6 +48,28 @@ class AbsensiApiTest(TestCase):
         self.assertIn("data", data)
         self.assertEqual(data["data"][str(self.siswa.pk)], Absensi.StatusChoices.HADIR)
 
+    def test_get_absensi_expired_wait_is_bolos(self):
+        siswa_2 = Siswa.objects.create(fullname="Siswa 2", kelas=self.kelas)
+        siswa_3 = Siswa.objects.create(fullname="Siswa 3", kelas=self.kelas)
+        Absensi.objects.create(
+            date=timezone.now().date(),
+            siswa=siswa_2,
+            _status=Absensi.StatusChoices.WAIT,
+            wait_expired_at=timezone.now() - timedelta(minutes=1),
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                f"/api/absensi?date={self.date_str}&kelas_id={self.kelas.pk}",
+                headers={"Authorization": "Bearer testtoken"},
+            )
+
+        data = response.json()["data"]
+        self.assertEqual(data[str(siswa_2.pk)], Absensi.StatusChoices.BOLOS)
+        self.assertIsNone(data[str(siswa_3.pk)])
+        # status dihitung tanpa CASE di database
+        self.assertFalse([q for q in queries if "CASE" in q["sql"]])
+
     def test_get_absensi_not_found(self):
         # Request for a non-existent class
         response = self.client.get(
@@ -61,3 +88,118 @@ class AbsensiApiTest(TestCase):
         self.assertIn(self.date_str, data["data"])
         self.assertTrue(data["data"][self.date_str]["is_complete"])
         self.assertEqual(data["data"][self.date_str]["total_tidak_masuk"], 0)
+
+
+def _clear_progress_cache():
+    redis_client = redis.get_singleton_client()
+    for key in redis_client.scan_iter("absensi_progress_*"):
+        redis_client.delete(key)
+
+
+@override_settings(DEBUG=True)
+class AbsensiProgressTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.addCleanup(_clear_progress_cache)
+        _clear_progress_cache()
+
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="progressuser", password="pw",
+            full_name="Progress User", type="kesiswaan", token="progresstoken",
+        )
+        self.kelas = Kelas.objects.create(name="Progress-K", active=True)
+        self.other_kelas = Kelas.objects.create(name="Progress-L", active=True)
+        self.budi = Siswa.objects.create(fullname="Budi", kelas=self.kelas)
+        self.ani = Siswa.objects.create(fullname="Ani", kelas=self.kelas)
+        other = Siswa.objects.create(fullname="Lain", kelas=self.other_kelas)
+
+        for siswa, day, status in [
+            (self.budi, 2, "hadir"),
+            (self.ani, 2, "alfa"),
+            (self.budi, 3, "sakit"),
+            (other, 4, "alfa"),
+        ]:
+            Absensi.objects.create(
+                siswa=siswa, date=date(2026, 3, day), _status=status, by=self.user
+            )
+
+    def _get_progress(self, dates):
+        return self.client.get(
+            "/api/absensi/progress",
+            {"kelas_id": self.kelas.pk, "dates": dates},
+            headers={"Authorization": "Bearer progresstoken"},
+        )
+
+    def _absensi_queries(self, queries):
+        return [q["sql"] for q in queries.captured_queries if "main_absensi" in q["sql"]]
+
+    def test_progress_per_date(self):
+        response = self._get_progress("2026-03-02,2026-03-03,2026-03-04")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["data"],
+            {
+                "2026-03-02": {"total_tidak_masuk": 1, "is_complete": True},
+                "2026-03-03": {"total_tidak_masuk": 1, "is_complete": False},
+                # absensi kelas lain tidak dihitung
+                "2026-03-04": {"total_tidak_masuk": 0, "is_complete": False},
+            },
+        )
+
+    def test_single_filtered_query(self):
+        dates = ",".join("2026-03-%02d" % day for day in range(1, 32))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get_progress(dates)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]), 31)
+
+        absensi_queries = self._absensi_queries(queries)
+        self.assertEqual(len(absensi_queries), 1)
+        self.assertIn("WHERE", absensi_queries[0])
+        self.assertIn("GROUP BY", absensi_queries[0])
+
+    def test_cached_until_absensi_changes(self):
+        self._get_progress("2026-03-02,2026-03-03")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get_progress("2026-03-02,2026-03-03")
+
+        self.assertFalse(self._absensi_queries(queries))
+        self.assertEqual(response.json()["data"]["2026-03-03"]["total_tidak_masuk"], 1)
+
+        # tanggal yang belum di-cache saja yang di-query
+        with CaptureQueriesContext(connection) as queries:
+            self._get_progress("2026-03-02,2026-03-05")
+        self.assertEqual(len(self._absensi_queries(queries)), 1)
+        self.assertIn("2026-03-05", self._absensi_queries(queries)[0])
+        self.assertNotIn("2026-03-02", self._absensi_queries(queries)[0])
+
+        Absensi.objects.create(
+            siswa=self.ani, date=date(2026, 3, 3), _status="hadir", by=self.user
+        )
+
+        response = self._get_progress("2026-03-02,2026-03-03")
+        self.assertTrue(response.json()["data"]["2026-03-03"]["is_complete"])
+
+    def test_new_siswa_invalidates_cache(self):
+        self.assertTrue(
+            self._get_progress("2026-03-02").json()["data"]["2026-03-02"]["is_complete"]
+        )
+
+        Siswa.objects.create(fullname="Baru", kelas=self.kelas)
+
+        self.assertFalse(
+            self._get_progress("2026-03-02").json()["data"]["2026-03-02"]["is_complete"]
+        )
+
+    def test_invalid_date(self):
+        response = self._get_progress("2026-03-02,bukan-tanggal")
+        self.assertEqual(response.status_code, 400)
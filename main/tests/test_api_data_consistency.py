@@ -9,14 +9,16 @@ yang berbeda. Juga mengecek invariant-invariant pada level model.
 import json
 import time
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from main.api.api import api
+from main.helpers import piket_queue, redis
 from main.models import Absensi, AbsensiSession, Kelas, KunciAbsensi, Siswa, User
 
 
@@ -353,6 +355,52 @@ class LockConsistencyTest(TestCase):
         )
 
 
+    def test_lock_whole_month_in_one_upload(self):
+        """Lock banyak tanggal: query tidak bertambah per action."""
+        def lock_days(days):
+            return [
+                _make_lock_payload(self.kelas.pk, "%02d-03-26" % day, "lock")
+                for day in range(1, days + 1)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self._upload(lock_days(2)).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self._upload(lock_days(30)).status_code, 200)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(
+            KunciAbsensi.objects.filter(kelas=self.kelas, locked=True).count(), 30
+        )
+
+    def test_lock_then_unlock_in_same_upload(self):
+        """State terakhir per tanggal yang disimpan, baris lama di-update."""
+        lock = KunciAbsensi.objects.create(
+            kelas=self.kelas, date=self.date_iso, locked=False
+        )
+
+        resp = self._upload([
+            _make_lock_payload(self.kelas.pk, self.date_str, "unlock"),
+            _make_lock_payload(self.kelas.pk, self.date_str, "lock"),
+        ])
+        self.assertEqual(resp.status_code, 200)
+
+        lock.refresh_from_db()
+        self.assertTrue(lock.locked)
+        self.assertEqual(KunciAbsensi.objects.filter(kelas=self.kelas).count(), 1)
+
+    def test_lock_other_kelas_rejected(self):
+        """Satu kelas bukan milik wali -> seluruh upload ditolak."""
+        other_kelas = Kelas.objects.create(name="Lock-Other", active=True)
+
+        resp = self._upload([
+            _make_lock_payload(self.kelas.pk, self.date_str, "lock"),
+            _make_lock_payload(other_kelas.pk, self.date_str, "lock"),
+        ])
+        self.assertEqual(resp.status_code, 403)
+        self.assertFalse(KunciAbsensi.objects.exists())
+
+
 # ===================================================================
 # 4. Konsistensi multi-user (conflict detection)
 # ===================================================================
@@ -574,7 +622,7 @@ class CrossEndpointConsistencyTest(TestCase):
 # 6. Konsistensi data piket upload (round-trip)
 # ===================================================================
 
-@override_settings(DEBUG=True)
+@override_settings(DEBUG=True, PIKET_BATCH_SIZE=1)
 class PiketUploadConsistencyTest(TestCase):
     """
     Memastikan flow piket (masuk → tunggu → pulang → hadir) menjaga
@@ -587,6 +635,13 @@ class PiketUploadConsistencyTest(TestCase):
         api.throttle = []
 
     def setUp(self):
+        # redis tidak di-reset antar test
+        redis.get_singleton_client().delete(
+            piket_queue.QUEUE_KEY % "testserver",
+            piket_queue.RETRY_KEY % "testserver",
+            piket_queue.FLUSH_LOCK_KEY % "testserver",
+        )
+
         self.client = Client()
 
         self.guru_piket = User.objects.create_user(
@@ -615,16 +670,12 @@ class PiketUploadConsistencyTest(TestCase):
         self.session.kelas.add(self.kelas)
 
     @patch("django.utils.timezone.now")
-    @patch("main.helpers.redis.get_singleton_client")
-    def test_piket_masuk_pulang_roundtrip(self, mock_redis, mock_tz):
+    def test_piket_masuk_pulang_roundtrip(self, mock_tz):
         """
         Flow piket: masuk creates tunggu → pulang updates to hadir.
         Verify via GET /absensi.
         """
         mock_tz.return_value = self.mock_now
-        mock_redis_client = MagicMock()
-        mock_redis_client.get.return_value = None
-        mock_redis.return_value = mock_redis_client
 
         ts = int(self.mock_now.timestamp())
 
@@ -656,16 +707,12 @@ class PiketUploadConsistencyTest(TestCase):
         self.assertEqual(absensi._status, "hadir")
 
     @patch("django.utils.timezone.now")
-    @patch("main.helpers.redis.get_singleton_client")
-    def test_piket_pulang_tanpa_masuk_tidak_buat_record(self, mock_redis, mock_tz):
+    def test_piket_pulang_tanpa_masuk_tidak_buat_record(self, mock_tz):
         """
         Absen pulang tanpa absen masuk sebelumnya tidak boleh
         membuat record absensi baru.
         """
         mock_tz.return_value = self.mock_now
-        mock_redis_client = MagicMock()
-        mock_redis_client.get.return_value = None
-        mock_redis.return_value = mock_redis_client
 
         ts = int(self.mock_now.timestamp())
 
@@ -6,13 +6,18 @@ kelas, siswa, absensi, dan kunci_absensi yang sudah difilter
 berdasarkan role user yang sedang login.
 """
 
+import gzip
 import sqlite3
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.test import Client, TestCase, override_settings
 from django.utils import timezone
 
 from main.api.api import api
+from main.helpers import database as helpers_database
+from main.helpers import snapshot as helpers_snapshot
+from main.helpers import redis, sync, versions
 from main.models import Absensi, Kelas, KunciAbsensi, Siswa, User
 
 
@@ -107,7 +112,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_sql_dump_is_valid_and_executable(self):
         """SQL dump harus valid dan bisa dieksekusi di SQLite."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
         # Semua tabel harus ada
         tables = [
             row[0] for row in conn.execute(
@@ -121,7 +126,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_kesiswaan_sees_all_active_kelas(self):
         """Kesiswaan harus bisa lihat semua kelas yang aktif saja."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_names = _get_column_values(conn, "kelas", "name")
         self.assertIn("XII-IPA-1", kelas_names)
@@ -134,7 +139,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_kesiswaan_sees_siswa_of_active_kelas_only(self):
         """Siswa dari kelas tidak aktif tidak boleh masuk dump."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         siswa_names = _get_column_values(conn, "siswa", "fullname")
         self.assertIn("Andi", siswa_names)
@@ -148,7 +153,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_kesiswaan_sees_absensi_of_active_kelas_only(self):
         """Absensi dari kelas tidak aktif tidak boleh masuk dump."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         self.assertEqual(_count_rows(conn, "absensi"), 2)
 
@@ -161,7 +166,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_kesiswaan_sees_lock_of_active_kelas_only(self):
         """Kunci absensi hanya untuk kelas aktif."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         self.assertEqual(_count_rows(conn, "kunci_absensi"), 1)
         conn.close()
@@ -169,7 +174,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_absensi_status_consistent_with_db(self):
         """Status absensi di dump harus sesuai status di Django DB."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         rows = conn.execute(
             "SELECT siswa_id, status FROM absensi ORDER BY siswa_id"
@@ -183,7 +188,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_siswa_kelas_id_references_valid_kelas(self):
         """Setiap siswa.kelas_id di dump harus mereferensi kelas yang ada."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_ids = set(_get_column_values(conn, "kelas", "id"))
         siswa_kelas_ids = set(_get_column_values(conn, "siswa", "kelas_id"))
@@ -197,7 +202,7 @@ class DumpDataKesiswaanTest(TestCase):
     def test_absensi_siswa_id_references_valid_siswa(self):
         """Setiap absensi.siswa_id di dump harus mereferensi siswa yang ada."""
         resp = self._get_dump()
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         siswa_ids = set(_get_column_values(conn, "siswa", "id"))
         absensi_siswa_ids = set(_get_column_values(conn, "absensi", "siswa_id"))
@@ -265,7 +270,7 @@ class DumpDataWaliKelasTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer walidumpatoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_names = _get_column_values(conn, "kelas", "name")
         self.assertEqual(kelas_names, ["XI-A"])
@@ -282,7 +287,7 @@ class DumpDataWaliKelasTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer walidumpbtoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_names = _get_column_values(conn, "kelas", "name")
         self.assertEqual(kelas_names, ["XI-B"])
@@ -301,7 +306,7 @@ class DumpDataWaliKelasTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer walidumpatoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_ids = set(_get_column_values(conn, "kelas", "id"))
         siswa_kelas_ids = set(_get_column_values(conn, "siswa", "kelas_id"))
@@ -364,7 +369,7 @@ class DumpDataSekretarisTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer sekdumptoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_names = _get_column_values(conn, "kelas", "name")
         self.assertEqual(kelas_names, ["X-1"])
@@ -381,7 +386,7 @@ class DumpDataSekretarisTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer sekdumptoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         kelas_ids = set(_get_column_values(conn, "kelas", "id"))
         siswa_kelas_ids = set(_get_column_values(conn, "siswa", "kelas_id"))
@@ -427,7 +432,7 @@ class DumpDataOtherRoleTest(TestCase):
         )
         self.assertEqual(resp.status_code, 200)
 
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         self.assertEqual(_count_rows(conn, "kelas"), 0)
         self.assertEqual(_count_rows(conn, "siswa"), 0)
@@ -466,7 +471,7 @@ class DumpDataEdgeCasesTest(TestCase):
         )
         self.assertEqual(resp.status_code, 200)
 
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
         self.assertEqual(_count_rows(conn, "kelas"), 0)
         self.assertEqual(_count_rows(conn, "siswa"), 0)
         self.assertEqual(_count_rows(conn, "absensi"), 0)
@@ -489,11 +494,37 @@ class DumpDataEdgeCasesTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer edgetoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         self.assertEqual(_count_rows(conn, "absensi"), 5)
         conn.close()
 
+    def test_expired_wait_is_dumped_as_bolos(self):
+        """Absensi "tunggu" yang lewat jam keluar dikirim sebagai bolos."""
+        kelas = Kelas.objects.create(name="Wait-Edge-K", active=True)
+        today = timezone.now().date()
+
+        for i, expired_at in enumerate(
+            (timezone.now() - timedelta(hours=1), timezone.now() + timedelta(hours=1))
+        ):
+            Absensi.objects.create(
+                date=today,
+                siswa=Siswa.objects.create(fullname="Wait-%d" % i, kelas=kelas),
+                _status="tunggu",
+                wait_expired_at=expired_at,
+            )
+
+        resp = self.client.get(
+            "/api/data",
+            headers={"Authorization": "Bearer edgetoken"},
+        )
+        conn = _parse_dump_to_db(resp.getvalue().decode())
+
+        self.assertEqual(
+            sorted(_get_column_values(conn, "absensi", "status")), ["bolos", "tunggu"]
+        )
+        conn.close()
+
     def test_locked_only_shows_locked_true(self):
         """Kunci absensi di dump harus hanya yang locked=True."""
         kelas = Kelas.objects.create(name="Lock-Edge-K", active=True)
@@ -508,7 +539,7 @@ class DumpDataEdgeCasesTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer edgetoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         # Hanya lock yang locked=True yang masuk dump
         self.assertEqual(_count_rows(conn, "kunci_absensi"), 1)
@@ -532,7 +563,7 @@ class DumpDataEdgeCasesTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer edgetoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         # Cek unique constraint di dump
         rows = conn.execute(
@@ -553,8 +584,661 @@ class DumpDataEdgeCasesTest(TestCase):
             "/api/data",
             headers={"Authorization": "Bearer edgetoken"},
         )
-        conn = _parse_dump_to_db(resp.content.decode())
+        conn = _parse_dump_to_db(resp.getvalue().decode())
 
         self.assertEqual(_count_rows(conn, "siswa"), expected_count)
         self.assertEqual(_count_rows(conn, "kelas"), 1)
         conn.close()
+
+
+# ===================================================================
+# 6. Delta sync dengan parameter `since`
+# ===================================================================
+
+@override_settings(DEBUG=True)
+@patch("main.helpers.sync.get_structure_changed_at", return_value=0)
+class DumpDataDeltaSyncTest(TestCase):
+    """`since` hanya mengirim absensi/kunci yang berubah setelah watermark."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.wali = User.objects.create_user(
+            username="wali_delta", password="pw",
+            full_name="Wali Delta", type="wali_kelas",
+        )
+        self.wali.token = "walideltatoken"
+        self.wali.save()
+
+        self.kelas = Kelas.objects.create(
+            name="Delta-K", active=True, wali_kelas=self.wali,
+        )
+        self.siswa_1 = Siswa.objects.create(fullname="Delta-1", kelas=self.kelas)
+        self.siswa_2 = Siswa.objects.create(fullname="Delta-2", kelas=self.kelas)
+
+        self.today = timezone.now().date()
+        self.yesterday = self.today - timedelta(days=1)
+        self.absensi_old = Absensi.objects.create(
+            date=self.yesterday, siswa=self.siswa_1,
+            _status="hadir", by=self.wali,
+        )
+        self.absensi_new = Absensi.objects.create(
+            date=self.today, siswa=self.siswa_2,
+            _status="hadir", by=self.wali,
+        )
+
+        # absensi_old dianggap sudah tersinkron jauh sebelum watermark
+        Absensi.objects.filter(pk=self.absensi_old.pk).update(
+            changed_at=timezone.now() - timedelta(days=2)
+        )
+
+    def _get(self, since=None):
+        url = "/api/data"
+        if since is not None:
+            url += "?since=%s" % since
+
+        return self.client.get(url, headers={"Authorization": "Bearer walideltatoken"})
+
+    def test_full_dump_returns_watermark(self, _):
+        resp = self._get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Sync-Mode"], "full")
+        _, generation = sync.parse_watermark(resp["X-Sync-Watermark"])
+        self.assertEqual(generation, versions.get_generation())
+
+    def test_delta_only_contains_changed_rows(self, _):
+        watermark = self._get()["X-Sync-Watermark"]
+
+        resp = self._get(since=watermark)
+        self.assertEqual(resp["X-Sync-Mode"], "delta")
+
+        sql = resp.getvalue().decode()
+        self.assertNotIn("CREATE TABLE", sql)
+
+        conn = _parse_dump_to_db(self._get().getvalue().decode())
+        conn.execute("UPDATE absensi SET status='alfa'")
+        conn.executescript(sql)
+
+        statuses = dict(conn.execute("SELECT siswa_id, status FROM absensi").fetchall())
+        # baris lama tidak ikut dikirim, baris baru ditimpa versi server
+        self.assertEqual(statuses[self.siswa_1.pk], "alfa")
+        self.assertEqual(statuses[self.siswa_2.pk], "hadir")
+        conn.close()
+
+    def test_delta_applies_deletes_and_unlock(self, _):
+        lock = KunciAbsensi.objects.create(
+            kelas=self.kelas, date=self.yesterday, locked=True,
+        )
+        conn = _parse_dump_to_db(self._get().getvalue().decode())
+        watermark = self._get()["X-Sync-Watermark"]
+
+        Absensi.objects.filter(pk=self.absensi_new.pk).delete()
+        lock.locked = False
+        lock.save()
+
+        conn.executescript(self._get(since=watermark).getvalue().decode())
+
+        self.assertEqual(
+            _get_column_values(conn, "absensi", "siswa_id"), [self.siswa_1.pk]
+        )
+        self.assertEqual(_count_rows(conn, "kunci_absensi"), 0)
+        conn.close()
+
+    def test_delta_removes_old_key_when_date_changes(self, _):
+        conn = _parse_dump_to_db(self._get().getvalue().decode())
+        watermark = self._get()["X-Sync-Watermark"]
+
+        # tanggal diubah lewat admin, natural key (date, siswa) berubah
+        self.absensi_new.date = self.yesterday
+        self.absensi_new.save()
+
+        conn.executescript(self._get(since=watermark).getvalue().decode())
+
+        rows = conn.execute(
+            "SELECT date, siswa_id FROM absensi WHERE siswa_id=?",
+            (self.siswa_2.pk,),
+        ).fetchall()
+        self.assertEqual(rows, [(self.yesterday.isoformat(), self.siswa_2.pk)])
+        conn.close()
+
+    def test_delta_keeps_local_rows_with_same_id(self, _):
+        conn = _parse_dump_to_db(self._get().getvalue().decode())
+        watermark = self._get()["X-Sync-Watermark"]
+
+        # baris lokal client yang id AUTOINCREMENT-nya sama dengan id server
+        local_date = (self.today - timedelta(days=10)).isoformat()
+        conn.execute("DELETE FROM absensi WHERE id=?", (self.absensi_new.pk,))
+        conn.execute(
+            "INSERT INTO absensi (id, date, siswa_id, status) VALUES (?, ?, ?, 'sakit')",
+            (self.absensi_new.pk, local_date, self.siswa_1.pk),
+        )
+
+        self.absensi_new._status = "alfa"
+        self.absensi_new.save()
+        KunciAbsensi.objects.create(kelas=self.kelas, date=self.today, locked=True)
+
+        conn.executescript(self._get(since=watermark).getvalue().decode())
+
+        rows = conn.execute("SELECT date, siswa_id, status FROM absensi").fetchall()
+        self.assertIn((local_date, self.siswa_1.pk, "sakit"), rows)
+        self.assertIn((self.today.isoformat(), self.siswa_2.pk, "alfa"), rows)
+        self.assertEqual(_count_rows(conn, "kunci_absensi"), 1)
+        conn.close()
+
+    def test_expired_watermark_falls_back_to_full(self, _):
+        resp = self._get(since=sync.format_watermark(1, versions.get_generation()))
+        self.assertEqual(resp["X-Sync-Mode"], "full")
+        conn = _parse_dump_to_db(resp.getvalue().decode())
+        self.assertEqual(_count_rows(conn, "absensi"), 2)
+        conn.close()
+
+    def test_structure_change_falls_back_to_full(self, mock_structure_changed_at):
+        watermark = self._get()["X-Sync-Watermark"]
+        mock_structure_changed_at.return_value = sync.parse_watermark(watermark)[0]
+
+        resp = self._get(since=watermark)
+        self.assertEqual(resp["X-Sync-Mode"], "full")
+
+    def test_redis_reset_falls_back_to_full(self, _):
+        watermark = self._get()["X-Sync-Watermark"]
+
+        # tombstone sebelum restart sudah hilang, delta akan melewatkan hapus
+        redis.get_singleton_client().delete(versions.GENERATION_KEY)
+
+        resp = self._get(since=watermark)
+        self.assertEqual(resp["X-Sync-Mode"], "full")
+
+    def test_watermark_without_generation_falls_back_to_full(self, _):
+        timestamp = sync.parse_watermark(self._get()["X-Sync-Watermark"])[0]
+
+        resp = self._get(since=timestamp)
+        self.assertEqual(resp["X-Sync-Mode"], "full")
+
+    def test_delta_with_many_changed_locks(self, _):
+        conn = _parse_dump_to_db(self._get().getvalue().decode())
+        watermark = self._get()["X-Sync-Watermark"]
+
+        # lebih dari batas kedalaman ekspresi SQLite (1000) dalam satu DELETE
+        KunciAbsensi.objects.bulk_create(
+            KunciAbsensi(
+                kelas=self.kelas, date=self.today - timedelta(days=i), locked=True
+            )
+            for i in range(1200)
+        )
+
+        resp = self._get(since=watermark)
+        self.assertEqual(resp["X-Sync-Mode"], "delta")
+
+        conn.executescript(resp.getvalue().decode())
+        self.assertEqual(_count_rows(conn, "kunci_absensi"), 1200)
+
+        # hapus ribuan key sekaligus juga harus diterima sqlite
+        deleted = [(self.today - timedelta(days=i), self.kelas.pk) for i in range(1200)]
+        conn.executescript(helpers_database.build_delta_sql([], [], [], deleted))
+        self.assertEqual(_count_rows(conn, "kunci_absensi"), 0)
+        conn.close()
+
+
+# ===================================================================
+# 7. Dump dalam format file SQLite
+# ===================================================================
+
+@override_settings(DEBUG=True)
+class DumpDataSqliteFormatTest(TestCase):
+    """Full dump bisa dikirim sebagai file SQLite siap pakai."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.kesiswaan = User.objects.create_user(
+            username="kesiswaan_sqlite", password="pw",
+            full_name="Kesiswaan SQLite", type="kesiswaan",
+        )
+        self.kesiswaan.token = "sqlitetoken"
+        self.kesiswaan.save()
+
+        self.kelas = Kelas.objects.create(name="SQLite-K", active=True)
+        self.siswa = Siswa.objects.create(fullname="O'Brien", kelas=self.kelas)
+        Absensi.objects.create(
+            date=timezone.now().date(), siswa=self.siswa,
+            _status="izin", by=self.kesiswaan,
+        )
+
+    def _open(self, content: bytes) -> sqlite3.Connection:
+        conn = sqlite3.connect(":memory:")
+        conn.deserialize(content)
+        return conn
+
+    def test_format_param_returns_sqlite_file(self):
+        resp = self.client.get(
+            "/api/data?format=sqlite",
+            headers={"Authorization": "Bearer sqlitetoken"},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/vnd.sqlite3")
+        self.assertTrue(resp.getvalue().startswith(b"SQLite format 3\x00"))
+
+        conn = self._open(resp.getvalue())
+        self.assertEqual(_get_column_values(conn, "siswa", "fullname"), ["O'Brien"])
+        self.assertEqual(_get_column_values(conn, "absensi", "status"), ["izin"])
+        conn.close()
+
+    def test_accept_header_returns_sqlite_file(self):
+        resp = self.client.get(
+            "/api/data",
+            headers={
+                "Authorization": "Bearer sqlitetoken",
+                "Accept": "application/vnd.sqlite3",
+            },
+        )
+        self.assertEqual(resp["Content-Type"], "application/vnd.sqlite3")
+
+        conn = self._open(resp.getvalue())
+        self.assertEqual(_count_rows(conn, "kelas"), 1)
+        conn.close()
+
+    def test_same_content_as_sql_dump(self):
+        sqlite_resp = self.client.get(
+            "/api/data?format=sqlite",
+            headers={"Authorization": "Bearer sqlitetoken"},
+        )
+        sql_resp = self.client.get(
+            "/api/data",
+            headers={"Authorization": "Bearer sqlitetoken"},
+        )
+
+        from_file = self._open(sqlite_resp.getvalue())
+        from_sql = _parse_dump_to_db(sql_resp.getvalue().decode())
+
+        for table in ["kelas", "siswa", "absensi", "kunci_absensi"]:
+            self.assertEqual(_get_all(from_file, table), _get_all(from_sql, table))
+
+        from_file.close()
+        from_sql.close()
+
+
+# ===================================================================
+# 8. Snapshot ter-cache dengan ETag
+# ===================================================================
+
+@override_settings(DEBUG=True)
+class DumpDataSnapshotCacheTest(TestCase):
+    """Full dump di-cache per scope & versi data, If-None-Match -> 304."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.wali = User.objects.create_user(
+            username="wali_snapshot", password="pw",
+            full_name="Wali Snapshot", type="wali_kelas",
+        )
+        self.wali.token = "walisnapshottoken"
+        self.wali.save()
+
+        self.sekretaris = User.objects.create_user(
+            username="sek_snapshot", password="pw",
+            full_name="Sekretaris Snapshot", type="sekretaris",
+        )
+        self.sekretaris.token = "seksnapshottoken"
+        self.sekretaris.save()
+
+        self.kelas = Kelas.objects.create(
+            name="Snapshot-K", active=True, wali_kelas=self.wali,
+        )
+        self.kelas.sekretaris.add(self.sekretaris)
+        self.siswa = Siswa.objects.create(fullname="Snapshot-1", kelas=self.kelas)
+        self.absensi = Absensi.objects.create(
+            date=timezone.now().date(), siswa=self.siswa,
+            _status="hadir", by=self.wali,
+        )
+
+    def _get(self, token="walisnapshottoken", **headers):
+        return self.client.get(
+            "/api/data", headers={"Authorization": "Bearer %s" % token, **headers}
+        )
+
+    def test_if_none_match_returns_304(self):
+        etag = self._get()["ETag"]
+
+        resp = self._get(**{"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], etag)
+        self.assertEqual(resp.getvalue(), b"")
+
+    def test_etag_differs_per_format(self):
+        sql_etag = self._get()["ETag"]
+        sqlite_etag = self._get(Accept="application/vnd.sqlite3")["ETag"]
+        self.assertNotEqual(sql_etag, sqlite_etag)
+
+    def test_wali_and_sekretaris_share_snapshot(self):
+        wali_resp = self._get()
+        sek_resp = self._get(token="seksnapshottoken")
+
+        self.assertEqual(wali_resp["ETag"], sek_resp["ETag"])
+        self.assertEqual(wali_resp.getvalue(), sek_resp.getvalue())
+
+    def test_absensi_change_invalidates_snapshot(self):
+        etag = self._get()["ETag"]
+
+        self.absensi.status = "sakit"
+        self.absensi.save()
+
+        resp = self._get(**{"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+        conn = _parse_dump_to_db(resp.getvalue().decode())
+        self.assertEqual(_get_column_values(conn, "absensi", "status"), ["sakit"])
+        conn.close()
+
+    def test_absensi_delete_invalidates_snapshot(self):
+        etag = self._get()["ETag"]
+
+        self.absensi.delete()
+
+        resp = self._get()
+        self.assertNotEqual(resp["ETag"], etag)
+
+        conn = _parse_dump_to_db(resp.getvalue().decode())
+        self.assertEqual(_count_rows(conn, "absensi"), 0)
+        conn.close()
+
+    def test_lock_change_invalidates_snapshot(self):
+        etag = self._get()["ETag"]
+
+        KunciAbsensi.objects.create(
+            kelas=self.kelas, date=timezone.now().date(), locked=True,
+        )
+
+        self.assertNotEqual(self._get()["ETag"], etag)
+
+    def test_siswa_change_only_invalidates_own_kelas(self):
+        other_kelas = Kelas.objects.create(name="Snapshot-L", active=True)
+        other_siswa = Siswa.objects.create(fullname="Lain", kelas=other_kelas)
+        etag = self._get()["ETag"]
+
+        other_siswa.fullname = "Lain Baru"
+        other_siswa.save()
+        self.assertEqual(self._get(**{"If-None-Match": etag}).status_code, 304)
+
+        self.siswa.fullname = "Snapshot-1 Baru"
+        self.siswa.save()
+        self.assertNotEqual(self._get()["ETag"], etag)
+
+    def test_moved_siswa_invalidates_both_kelas(self):
+        other_kelas = Kelas.objects.create(name="Snapshot-L", active=True)
+        before = {
+            k: versions.get_scope_version([k]) for k in (self.kelas.pk, other_kelas.pk)
+        }
+
+        self.siswa.kelas = other_kelas
+        self.siswa.save()
+
+        for kelas_id, version in before.items():
+            self.assertNotEqual(versions.get_scope_version([kelas_id]), version)
+
+    def test_redis_reset_does_not_reuse_etag(self):
+        redis_client = redis.get_singleton_client()
+
+        def reset():
+            # redis tanpa persistence di-restart: semua counter kembali ke 0
+            redis_client.delete(
+                versions.GENERATION_KEY, versions.KELAS_VERSION_KEY % self.kelas.pk
+            )
+
+        reset()
+        etag = self._get()["ETag"]
+
+        reset()
+        self.assertEqual(self._get(**{"If-None-Match": etag}).status_code, 200)
+
+    def test_gzip_snapshot_served_as_is(self):
+        plain = self._get().getvalue()
+
+        resp = self._get(**{"Accept-Encoding": "gzip"})
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(resp.getvalue()), plain)
+
+
+# ===================================================================
+# 9. Dump streaming
+# ===================================================================
+
+@override_settings(DEBUG=True)
+class DumpDataStreamingTest(TestCase):
+    """Cache miss dikirim sebagai stream, hasilnya sama dengan snapshot."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.kesiswaan = User.objects.create_user(
+            username="kesiswaan_stream", password="pw",
+            full_name="Kesiswaan Stream", type="kesiswaan",
+        )
+        self.kesiswaan.token = "streamtoken"
+        self.kesiswaan.save()
+
+        self.kelas = Kelas.objects.create(name="Stream-K", active=True)
+        self.siswas = [
+            Siswa.objects.create(fullname="Stream-%d" % i, kelas=self.kelas)
+            for i in range(5)
+        ]
+        for siswa in self.siswas:
+            Absensi.objects.create(
+                date=timezone.now().date(), siswa=siswa,
+                _status="hadir", by=self.kesiswaan,
+            )
+
+    def _get(self, **headers):
+        return self.client.get(
+            "/api/data", headers={"Authorization": "Bearer streamtoken", **headers}
+        )
+
+    def test_cache_miss_streams_then_hit_is_cached(self):
+        first = self._get()
+        self.assertTrue(first.streaming)
+        first_content = first.getvalue()
+
+        second = self._get()
+        self.assertFalse(second.streaming)
+        self.assertEqual(second.getvalue(), first_content)
+        self.assertEqual(second["X-Sync-Watermark"], first["X-Sync-Watermark"])
+
+    def test_gzip_stream(self):
+        resp = self._get(**{"Accept-Encoding": "gzip"})
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+
+        conn = _parse_dump_to_db(gzip.decompress(resp.getvalue()).decode())
+        self.assertEqual(_count_rows(conn, "absensi"), 5)
+        conn.close()
+
+    def test_insert_split_per_chunk(self):
+        sql = "".join(
+            helpers_database.iter_sql_dump(
+                *helpers_snapshot.scope_querysets([self.kelas.pk]), chunk_size=2
+            )
+        )
+        self.assertEqual(sql.count('INSERT INTO "absensi"'), 3)
+
+        conn = _parse_dump_to_db(sql)
+        self.assertEqual(
+            sorted(_get_column_values(conn, "siswa", "fullname")),
+            ["Stream-%d" % i for i in range(5)],
+        )
+        self.assertEqual(_count_rows(conn, "absensi"), 5)
+        conn.close()
+
+
+# ===================================================================
+# 10. Jendela tanggal & shard per bulan
+# ===================================================================
+
+@override_settings(DEBUG=True)
+class DumpDataWindowTest(TestCase):
+    """Full dump berjendela + shard bulan lama yang diambil belakangan."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.wali = User.objects.create_user(
+            username="wali_window", password="pw",
+            full_name="Wali Window", type="wali_kelas",
+        )
+        self.wali.token = "waliwindowtoken"
+        self.wali.save()
+
+        self.kelas = Kelas.objects.create(
+            name="Window-K", active=True, wali_kelas=self.wali,
+        )
+        self.siswa = Siswa.objects.create(fullname="Window-1", kelas=self.kelas)
+
+        self.today = timezone.localdate()
+        self.old_date = self.today.replace(day=1) - timedelta(days=70)
+        self.old_month = self.old_date.strftime("%Y-%m")
+
+        for d in (self.today, self.old_date):
+            Absensi.objects.create(
+                date=d, siswa=self.siswa, _status="hadir", by=self.wali,
+            )
+        KunciAbsensi.objects.create(kelas=self.kelas, date=self.old_date)
+
+    def _get(self, url, **headers):
+        return self.client.get(
+            url, headers={"Authorization": "Bearer waliwindowtoken", **headers}
+        )
+
+    def test_months_only_sends_recent_absensi(self):
+        resp = self._get("/api/data?months=1")
+        self.assertEqual(resp.status_code, 200)
+
+        conn = _parse_dump_to_db(resp.getvalue().decode())
+        self.assertEqual(
+            _get_column_values(conn, "absensi", "date"), [str(self.today)]
+        )
+        self.assertEqual(_count_rows(conn, "kunci_absensi"), 0)
+        self.assertEqual(_count_rows(conn, "siswa"), 1)
+        conn.close()
+
+    def test_from_to_window(self):
+        resp = self._get(
+            "/api/data?from=%s&to=%s" % (self.old_date, self.old_date)
+        )
+        self.assertEqual(
+            resp["X-Sync-Window"], "%s/%s" % (self.old_date, self.old_date)
+        )
+
+        conn = _parse_dump_to_db(resp.getvalue().decode())
+        self.assertEqual(
+            _get_column_values(conn, "absensi", "date"), [str(self.old_date)]
+        )
+        conn.close()
+
+    def test_window_has_own_etag(self):
+        full_etag = self._get("/api/data")["ETag"]
+        window_etag = self._get("/api/data?months=1")["ETag"]
+        self.assertNotEqual(full_etag, window_etag)
+
+    def test_month_shard_completes_windowed_dump(self):
+        conn = _parse_dump_to_db(self._get("/api/data?months=1").getvalue().decode())
+
+        resp = self._get("/api/data/month/%s" % self.old_month)
+        self.assertEqual(resp.status_code, 200)
+        conn.executescript(resp.getvalue().decode())
+
+        self.assertEqual(
+            sorted(_get_column_values(conn, "absensi", "date")),
+            sorted([str(self.old_date), str(self.today)]),
+        )
+        self.assertEqual(
+            _get_column_values(conn, "kunci_absensi", "date"), [str(self.old_date)]
+        )
+        conn.close()
+
+    def test_closed_month_revalidates(self):
+        resp = self._get("/api/data/month/%s" % self.old_month)
+        self.assertIn("no-cache", resp["Cache-Control"])
+        self.assertIn("private", resp["Cache-Control"])
+
+        resp = self._get(
+            "/api/data/month/%s" % self.old_month,
+            **{"If-None-Match": resp["ETag"]},
+        )
+        self.assertEqual(resp.status_code, 304)
+
+    def test_month_etag_follows_own_month(self):
+        url = "/api/data/month/%s" % self.old_month
+        etag = self._get(url)["ETag"]
+
+        # perubahan bulan lain tidak mengubah shard bulan lama
+        Absensi.objects.filter(date=self.today).update(_status="sakit")
+        Absensi.objects.get(date=self.today).save()
+        self.assertEqual(self._get(url)["ETag"], etag)
+
+        # koreksi absensi bulan lama
+        Absensi.objects.get(date=self.old_date).save()
+        resp = self._get(url, **{"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+
+        # buka kunci bulan lama
+        KunciAbsensi.objects.filter(date=self.old_date).delete()
+        resp = self._get(url, **{"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        conn = _parse_dump_to_db(self._get("/api/data?months=1").getvalue().decode())
+        conn.executescript(resp.getvalue().decode())
+        self.assertEqual(_count_rows(conn, "kunci_absensi"), 0)
+        conn.close()
+
+    def test_month_shard_keeps_local_rows_with_same_id(self):
+        conn = _parse_dump_to_db(self._get("/api/data?months=1").getvalue().decode())
+
+        # baris lokal bulan lain yang id-nya sama dengan id server bulan lama
+        old_absensi = Absensi.objects.get(date=self.old_date)
+        conn.execute("DELETE FROM absensi")
+        conn.execute(
+            "INSERT INTO absensi (id, date, siswa_id, status) VALUES (?, ?, ?, 'sakit')",
+            (old_absensi.pk, str(self.today), self.siswa.pk),
+        )
+
+        conn.executescript(
+            self._get("/api/data/month/%s" % self.old_month).getvalue().decode()
+        )
+
+        rows = conn.execute("SELECT date, status FROM absensi").fetchall()
+        self.assertIn((str(self.today), "sakit"), rows)
+        self.assertIn((str(self.old_date), "hadir"), rows)
+        conn.close()
+
+    def test_current_month_must_revalidate(self):
+        resp = self._get("/api/data/month/%s" % self.today.strftime("%Y-%m"))
+        self.assertIn("no-cache", resp["Cache-Control"])
+
+    def test_invalid_month(self):
+        self.assertEqual(self._get("/api/data/month/2024-13").status_code, 400)
+        self.assertEqual(self._get("/api/data/month/januari").status_code, 400)
@@ -0,0 +1,137 @@
+"""
+Test GET /api/jadwal dan index jadwal (kelas, hari) → sesi di
+main/helpers/schedule.py.
+"""
+
+from datetime import timedelta
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from main.api.api import api
+from main.helpers import redis, schedule, versions
+from main.models import AbsensiSession, Kelas, User
+
+
+@override_settings(DEBUG=True)
+class JadwalApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.piket = User.objects.create_user(
+            username="piket_jadwal", password="pw",
+            full_name="Piket Jadwal", type="guru_piket",
+        )
+        self.piket.token = "piketjadwaltoken"
+        self.piket.save()
+
+        self.kelas = Kelas.objects.create(name="Jadwal-K", active=True)
+        self.other = Kelas.objects.create(name="Jadwal-L", active=True)
+
+        self.session = AbsensiSession.objects.create(
+            senin=True, selasa=True,
+            jam_masuk="07:00:00",
+            jam_masuk_toleransi=timedelta(minutes=15),
+            jam_keluar_mulai_absen="13:30:00",
+            jam_keluar="14:00:00",
+        )
+        self.session.kelas.add(self.kelas)
+
+    def _get(self):
+        return self.client.get(
+            "/api/jadwal", headers={"Authorization": "Bearer piketjadwaltoken"}
+        )
+
+    def test_jadwal_per_kelas_per_hari(self):
+        data = self._get().json()["data"]
+
+        jadwal = data[str(self.kelas.pk)]
+        self.assertEqual(jadwal["name"], "Jadwal-K")
+        self.assertEqual(
+            jadwal["senin"],
+            {"jam_masuk": "07:00", "jam_masuk_sampai": "07:15", "jam_keluar": "13:30"},
+        )
+        self.assertEqual(jadwal["selasa"], jadwal["senin"])
+        self.assertIsNone(jadwal["rabu"])
+        self.assertIsNone(data[str(self.other.pk)]["senin"])
+
+    def test_jadwal_without_schedule_queries(self):
+        self._get()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._get().status_code, 200)
+
+        # hanya auth + daftar kelas
+        self.assertFalse(
+            any("main_absensisession" in q["sql"] for q in ctx.captured_queries)
+        )
+
+    def test_jadwal_only_for_guru_piket(self):
+        self.piket.type = "kesiswaan"
+        self.piket.save()
+
+        self.assertEqual(self._get().status_code, 403)
+
+    def test_index_invalidated_on_m2m_change(self):
+        self._get()
+
+        self.session.kelas.add(self.other)
+        self.assertIsNotNone(self._get().json()["data"][str(self.other.pk)]["senin"])
+
+        self.session.kelas.remove(self.kelas)
+        self.assertIsNone(self._get().json()["data"][str(self.kelas.pk)]["senin"])
+
+    def test_index_invalidated_on_session_change(self):
+        self._get()
+
+        self.session.rabu = True
+        self.session.save()
+        self.assertIsNotNone(self._get().json()["data"][str(self.kelas.pk)]["rabu"])
+
+        self.session.delete()
+        self.assertIsNone(self._get().json()["data"][str(self.kelas.pk)]["senin"])
+
+    def test_first_session_by_pk_wins(self):
+        other_session = AbsensiSession.objects.create(
+            senin=True, jam_masuk="06:00:00", jam_keluar="12:00:00",
+        )
+        other_session.kelas.add(self.kelas)
+
+        first = min(self.session, other_session, key=lambda s: s.pk)
+        index = schedule.get_index()
+        self.assertEqual(index[(self.kelas.pk, 0)].id, str(first.pk))
+        self.assertEqual(index[(self.kelas.pk, 1)].id, str(self.session.pk))
+
+    def test_index_cached_per_process_and_in_redis(self):
+        index = schedule.get_index()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertIs(schedule.get_index(), index)
+
+            # proses lain: index diambil dari redis
+            schedule._local = (None, None)
+            self.assertEqual(schedule.get_index(), index)
+
+        self.assertEqual(len(ctx), 0)
+
+    def test_local_index_dropped_after_redis_reset(self):
+        redis_client = redis.get_singleton_client()
+        schedule.get_index()
+        version = int(redis_client.get(schedule.SCHEDULE_VERSION_KEY) or 0)
+
+        # tanpa signal, index hanya berubah jika dibangun ulang
+        AbsensiSession.objects.filter(pk=self.session.pk).update(rabu=True)
+
+        # redis di-restart: counter kembali ke nilai yang kebetulan sama
+        redis_client.delete(
+            versions.GENERATION_KEY, schedule.SCHEDULE_INDEX_KEY % version
+        )
+        redis_client.set(schedule.SCHEDULE_VERSION_KEY, version)
+
+        self.assertIn((self.kelas.pk, 2), schedule.get_index())
@@ -1,12 +1,21 @@
+import json
+import time
 from datetime import datetime
-from unittest.mock import MagicMock, patch
+from io import StringIO
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
 from main.models import User, Kelas, Siswa, AbsensiSession, Absensi
 from main.api.api import api
+from main.helpers import piket_queue, redis, schedule
 
+DOMAIN = "testserver"
 
-@override_settings(DEBUG=True)
+
+@override_settings(DEBUG=True, PIKET_BATCH_SIZE=1, PIKET_BATCH_MAX_AGE=3600)
 class PiketUploadApiTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -14,6 +23,13 @@ class PiketUploadApiTest(TestCase):
         api.throttle = []
 
     def setUp(self):
+        # redis tidak di-reset antar test
+        redis.get_singleton_client().delete(
+            piket_queue.QUEUE_KEY % DOMAIN,
+            piket_queue.RETRY_KEY % DOMAIN,
+            piket_queue.FLUSH_LOCK_KEY % DOMAIN,
+        )
+
         self.client = Client()
         self.user = User.objects.create_user(
             username="testuser",
@@ -36,45 +52,38 @@ class PiketUploadApiTest(TestCase):
         )
         self.session.kelas.add(self.kelas)
 
-    @patch("django.utils.timezone.now")
-    @patch("main.helpers.redis.get_singleton_client")
-    def test_piket_upload_masuk_success(self, mock_redis, mock_timezone_now):
-        mock_timezone_now.return_value = self.mock_now
-
-        mock_redis_client = MagicMock()
-        mock_redis_client.get.return_value = None
-        mock_redis.return_value = mock_redis_client
+        patcher = patch("django.utils.timezone.now", return_value=self.mock_now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
-        timestamp = int(self.mock_now.timestamp())
-        data = [{"siswa": self.siswa.pk, "timestamp": timestamp, "type": "absen_masuk"}]
+        self.timestamp = int(self.mock_now.timestamp())
 
-        response = self.client.post(
+    def _upload(self, data):
+        return self.client.post(
             "/api/piket/upload",
             data=data,
             content_type="application/json",
             headers={"Authorization": "Bearer testtoken"},
-            HTTP_HOST="testserver",
+            HTTP_HOST=DOMAIN,
         )
 
+    def _scan(self, siswa, type):
+        return {"siswa": siswa.pk, "timestamp": self.timestamp, "type": type}
+
+    def test_piket_upload_masuk_success(self):
+        response = self._upload([self._scan(self.siswa, "absen_masuk")])
+
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"data": {"invalids": []}})
 
         # Verify Absensi created
-        self.assertTrue(
-            Absensi.objects.filter(
-                siswa=self.siswa, _status=Absensi.StatusChoices.WAIT
-            ).exists()
+        absensi = Absensi.objects.get(
+            siswa=self.siswa, _status=Absensi.StatusChoices.WAIT
         )
+        self.assertEqual(absensi.by, self.user)
+        self.assertEqual(piket_queue.get_length(DOMAIN), 0)
 
-    @patch("django.utils.timezone.now")
-    @patch("main.helpers.redis.get_singleton_client")
-    def test_piket_upload_pulang_success(self, mock_redis, mock_timezone_now):
-        mock_timezone_now.return_value = self.mock_now
-
-        mock_redis_client = MagicMock()
-        mock_redis_client.get.return_value = None
-        mock_redis.return_value = mock_redis_client
-
+    def test_piket_upload_pulang_success(self):
         # Create "masuk" record first
         date = self.mock_now.date()
         Absensi.objects.create(
@@ -86,21 +95,251 @@ class PiketUploadApiTest(TestCase):
         )
 
         # Use the same date for the "pulang" upload
-        timestamp = int(self.mock_now.timestamp())
-        data = [
-            {"siswa": self.siswa.pk, "timestamp": timestamp, "type": "absen_pulang"}
+        response = self._upload([self._scan(self.siswa, "absen_pulang")])
+
+        self.assertEqual(response.status_code, 200)
+
+        # Verify Absensi updated to HADIR
+        absensi = Absensi.objects.get(siswa=self.siswa, date=date)
+        self.assertEqual(absensi.status, Absensi.StatusChoices.HADIR)
+
+    def test_piket_upload_masuk_then_pulang_in_same_batch(self):
+        response = self._upload([
+            self._scan(self.siswa, "absen_pulang"),
+            self._scan(self.siswa, "absen_masuk"),
+            self._scan(self.siswa, "absen_masuk"),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        absensi = Absensi.objects.get(siswa=self.siswa)
+        self.assertEqual(absensi.status, Absensi.StatusChoices.HADIR)
+
+        # tidak ada yang masuk daftar retry
+        retry_key = piket_queue.RETRY_KEY % DOMAIN
+        self.assertEqual(redis.get_singleton_client().llen(retry_key), 0)
+
+    def test_piket_upload_query_count_is_constant(self):
+        def upload(siswas, type):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._upload([self._scan(s, type) for s in siswas])
+            self.assertEqual(response.status_code, 200)
+            return len(ctx)
+
+        other_kelas = Kelas.objects.create(name="Kelas 10-B", active=True)
+        self.session.kelas.add(other_kelas)
+        siswas = Siswa.objects.bulk_create(
+            Siswa(fullname="Siswa %d" % i, kelas=kelas)
+            for i in range(30)
+            for kelas in (self.kelas, other_kelas)
+        )
+
+        # index jadwal dibangun sekali, setelahnya tanpa query
+        schedule.get_index()
+
+        single = upload([self.siswa], "absen_masuk")
+        many = upload(siswas, "absen_masuk")
+        self.assertEqual(single, many)
+        self.assertEqual(
+            Absensi.objects.filter(_status=Absensi.StatusChoices.WAIT).count(), 61
+        )
+
+        single = upload([self.siswa], "absen_pulang")
+        many = upload(siswas, "absen_pulang")
+        self.assertEqual(single, many)
+        self.assertEqual(
+            Absensi.objects.filter(_status=Absensi.StatusChoices.HADIR).count(), 61
+        )
+
+    @override_settings(PIKET_BATCH_SIZE=3)
+    def test_scans_wait_until_batch_size(self):
+        siswas = [
+            Siswa.objects.create(fullname="Siswa %d" % i, kelas=self.kelas)
+            for i in range(2)
         ]
 
-        response = self.client.post(
-            "/api/piket/upload",
-            data=data,
+        with CaptureQueriesContext(connection) as ctx:
+            self._upload([self._scan(self.siswa, "absen_masuk")])
+            self._upload([self._scan(siswas[0], "absen_masuk")])
+
+        # hanya query auth, belum ada yang ditulis
+        self.assertFalse(any("main_absensi" in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(piket_queue.get_length(DOMAIN), 2)
+
+        self._upload([self._scan(siswas[1], "absen_masuk")])
+
+        self.assertEqual(Absensi.objects.count(), 3)
+        self.assertEqual(piket_queue.get_length(DOMAIN), 0)
+
+    @override_settings(PIKET_BATCH_SIZE=100, PIKET_BATCH_MAX_AGE=30)
+    def test_flush_command_flushes_old_scans(self):
+        self._upload([self._scan(self.siswa, "absen_masuk")])
+
+        call_command("piketflush", once=True, stdout=StringIO())
+        self.assertFalse(Absensi.objects.exists())
+
+        # scan tertua sudah melewati PIKET_BATCH_MAX_AGE
+        with patch("time.time", return_value=time.time() + 31):
+            call_command("piketflush", once=True, stdout=StringIO())
+
+        self.assertTrue(Absensi.objects.filter(siswa=self.siswa).exists())
+        self.assertEqual(piket_queue.get_length(DOMAIN), 0)
+
+    def test_invalid_scans_are_retried_on_next_flush(self):
+        self._upload([self._scan(self.siswa, "absen_pulang")])
+
+        retry_key = piket_queue.RETRY_KEY % DOMAIN
+        retries = redis.get_singleton_client().lrange(retry_key, 0, -1)
+        self.assertEqual(len(retries), 1)
+        self.assertEqual(json.loads(retries[0])["by"], self.user.pk)
+
+        # absen masuk datang belakangan, scan pulang yang tertunda ikut diproses
+        self._upload([self._scan(self.siswa, "absen_masuk")])
+
+        absensi = Absensi.objects.get(siswa=self.siswa)
+        self.assertEqual(absensi.status, Absensi.StatusChoices.HADIR)
+        self.assertEqual(redis.get_singleton_client().llen(retry_key), 0)
+
+    def test_expired_invalid_scans_are_dropped(self):
+        self._upload([self._scan(self.siswa, "absen_pulang")])
+
+        with patch("time.time", return_value=time.time() + piket_queue.RETRY_MAX_AGE + 1):
+            piket_queue.flush(DOMAIN)
+
+        retry_key = piket_queue.RETRY_KEY % DOMAIN
+        self.assertEqual(redis.get_singleton_client().llen(retry_key), 0)
+
+    def test_broken_scan_does_not_block_queue(self):
+        # timestamp di luar jangkauan datetime (ValueError: year out of range)
+        broken = {**self._scan(self.siswa, "absen_masuk"), "timestamp": 10**12}
+        piket_queue.push(DOMAIN, self.user.pk, [broken])
+
+        with self.assertLogs("main.helpers.piket_queue", "WARNING"):
+            self._upload([self._scan(self.siswa, "absen_masuk")])
+
+        self.assertTrue(Absensi.objects.filter(siswa=self.siswa).exists())
+        self.assertEqual(piket_queue.get_length(DOMAIN), 0)
+        # dibuang, tidak ikut di-retry
+        retry_key = piket_queue.RETRY_KEY % DOMAIN
+        self.assertEqual(redis.get_singleton_client().llen(retry_key), 0)
+
+    def test_failed_flush_still_accepts_scan(self):
+        with patch(
+            "main.helpers.piket_queue.save_scans", side_effect=RuntimeError("db")
+        ), self.assertLogs("main.api.router.piket_upload", "ERROR"):
+            response = self._upload([self._scan(self.siswa, "absen_masuk")])
+
+        # scan tetap di antrian, ditulis oleh flush berikutnya
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(piket_queue.get_length(DOMAIN), 1)
+
+        piket_queue.flush(DOMAIN)
+        self.assertTrue(Absensi.objects.filter(siswa=self.siswa).exists())
+
+    def test_single_flusher(self):
+        lock_key = piket_queue.FLUSH_LOCK_KEY % DOMAIN
+        redis.get_singleton_client().set(lock_key, "x")
+        self.addCleanup(redis.get_singleton_client().delete, lock_key)
+
+        response = self._upload([self._scan(self.siswa, "absen_masuk")])
+
+        # flusher lain sedang berjalan, scan tetap aman di antrian
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Absensi.objects.exists())
+        self.assertEqual(piket_queue.get_length(DOMAIN), 1)
+        self.assertIsNone(piket_queue.flush(DOMAIN))
+
+
+@override_settings(DEBUG=True)
+class PiketScanApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        redis.get_singleton_client().delete(
+            piket_queue.QUEUE_KEY % DOMAIN,
+            piket_queue.RETRY_KEY % DOMAIN,
+            piket_queue.FLUSH_LOCK_KEY % DOMAIN,
+            piket_queue.ROSTER_KEY,
+        )
+
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="scanuser",
+            password="testpassword",
+            full_name="Scan User",
+            type="guru_piket",
+        )
+        self.user.token = "scantoken"
+        self.user.save()
+
+        self.kelas = Kelas.objects.create(name="Kelas Scan", active=True)
+        self.siswa = Siswa.objects.create(fullname="Siswa Scan", kelas=self.kelas)
+
+        # Monday 2026-03-23
+        self.mock_now = datetime(2026, 3, 23, 8, 0, 0, tzinfo=settings.TIME_ZONE_OBJ)
+        self.session = AbsensiSession.objects.create(
+            jam_masuk="07:00:00", jam_keluar="14:00:00", senin=True
+        )
+        self.session.kelas.add(self.kelas)
+
+    def _scan(self, siswa_id, type="absen_masuk"):
+        return self.client.post(
+            "/api/piket/scan",
+            data={
+                "siswa": siswa_id,
+                "timestamp": int(self.mock_now.timestamp()),
+                "type": type,
+            },
             content_type="application/json",
-            headers={"Authorization": "Bearer testtoken"},
-            HTTP_HOST="testserver",
+            headers={"Authorization": "Bearer scantoken"},
+            HTTP_HOST=DOMAIN,
         )
 
+    def test_scan_is_buffered(self):
+        self.assertEqual(self._scan(self.siswa.pk).status_code, 200)
+
+        # roster sudah di redis: hanya query auth
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._scan(self.siswa.pk, "absen_pulang")
+
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"data": {"queued": True}})
+        self.assertEqual(len(ctx), 1)
 
-        # Verify Absensi updated to HADIR
-        absensi = Absensi.objects.get(siswa=self.siswa, date=date)
+        self.assertFalse(Absensi.objects.exists())
+        self.assertEqual(piket_queue.get_length(DOMAIN), 2)
+
+    def test_unknown_siswa_rejected(self):
+        response = self._scan(self.siswa.pk + 1000)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(piket_queue.get_length(DOMAIN), 0)
+
+    def test_inactive_kelas_rejected(self):
+        kelas = Kelas.objects.create(name="Kelas Lama", active=False)
+        siswa = Siswa.objects.create(fullname="Siswa Lama", kelas=kelas)
+
+        self.assertEqual(self._scan(siswa.pk).status_code, 404)
+
+    def test_roster_invalidated_on_new_siswa(self):
+        self._scan(self.siswa.pk)
+
+        siswa = Siswa.objects.create(fullname="Siswa Baru", kelas=self.kelas)
+
+        self.assertEqual(self._scan(siswa.pk).status_code, 200)
+
+    @patch("django.utils.timezone.now")
+    def test_flusher_writes_buffered_scans(self, mock_tz):
+        mock_tz.return_value = self.mock_now
+
+        self._scan(self.siswa.pk)
+        self._scan(self.siswa.pk, "absen_pulang")
+
+        call_command("piketflush", once=True, force=True, stdout=StringIO())
+
+        absensi = Absensi.objects.get(siswa=self.siswa)
         self.assertEqual(absensi.status, Absensi.StatusChoices.HADIR)
+        self.assertEqual(absensi.by, self.user)
+        self.assertEqual(piket_queue.get_length(DOMAIN), 0)
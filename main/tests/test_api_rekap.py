@@ -0,0 +1,732 @@
+"""
+Test rekap absensi bulanan (PDF): data matriks siswa x tanggal di
+main/helpers/pdf.py, pool render di main/helpers/render_pool.py dan endpoint
+/api/get-rekap.
+"""
+
+import io
+import json
+import threading
+import time
+import zipfile
+from datetime import date
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from main.api.api import api
+from main.helpers import artifacts
+from main.helpers import pdf as helpers_pdf
+from main.helpers import redis, rekap_bulk, rekap_job, render_pool, versions
+from main.models import Absensi, Kelas, Siswa, User
+
+
+def _fake_pdfkit(html, path, **kwargs):
+    # path False: pdf dikembalikan dari stdout
+    assert path is False
+    return b"%PDF-fake"
+
+
+def _clear_render_pool():
+    redis.get_singleton_client().delete(
+        render_pool.RENDER_SLOTS_KEY,
+        render_pool.RENDER_OWNERS_KEY,
+        render_pool.RENDER_COUNTER_KEY,
+        render_pool.RENDER_ACQUIRE_LOCK_KEY,
+        render_pool.RENDER_WAITING_KEY,
+        render_pool.RENDER_STATS_KEY,
+        render_pool.RENDER_DURATIONS_KEY,
+    )
+
+
+def _clear_rekap_jobs():
+    redis_client = redis.get_singleton_client()
+    for pattern in ("rekap_current_*", "rekap_job_*", "artifact_*"):
+        for key in redis_client.scan_iter(pattern):
+            redis_client.delete(key)
+
+
+class RekapMatrixTest(TestCase):
+    def setUp(self):
+        _clear_render_pool()
+        self.user = User.objects.create_user(
+            username="wali_rekap", password="pw",
+            full_name="Wali Rekap", type="wali_kelas",
+        )
+        self.kelas = Kelas.objects.create(name="Rekap-K", active=True)
+
+    def _add_siswas(self, count):
+        siswas = Siswa.objects.bulk_create(
+            Siswa(fullname="Siswa %02d" % i, kelas=self.kelas) for i in range(count)
+        )
+        statuses = ["hadir", "alfa", "sakit", "izin", "bolos"]
+        Absensi.objects.bulk_create(
+            Absensi(
+                siswa=siswa,
+                date=date(2026, 3, day),
+                _status=statuses[(i + day) % len(statuses)],
+                by=self.user,
+            )
+            for i, siswa in enumerate(siswas)
+            for day in range(1, 29)
+        )
+        return siswas
+
+    def test_matrix_content(self):
+        budi = Siswa.objects.create(fullname="Budi", kelas=self.kelas)
+        ani = Siswa.objects.create(fullname="Ani", kelas=self.kelas)
+        other = Siswa.objects.create(
+            fullname="Lain", kelas=Kelas.objects.create(name="Rekap-L")
+        )
+
+        for siswa, day, status in [
+            (budi, 1, "alfa"),
+            (budi, 2, "alfa"),
+            (budi, 3, "sakit"),
+            (budi, 31, "hadir"),
+            (ani, 5, "izin"),
+            (ani, 6, "bolos"),
+            (other, 1, "alfa"),
+        ]:
+            Absensi.objects.create(
+                siswa=siswa, date=date(2026, 3, day), _status=status, by=self.user
+            )
+
+        # bulan lain tidak dihitung
+        Absensi.objects.create(
+            siswa=budi, date=date(2026, 4, 1), _status="alfa", by=self.user
+        )
+
+        rows = helpers_pdf.get_rekap_matrix(self.kelas.pk, 3, 2026)
+
+        self.assertEqual([row.name for row in rows], ["Ani", "Budi"])
+        ani_row, budi_row = rows
+
+        self.assertEqual(
+            (budi_row.alfa, budi_row.sakit, budi_row.izin, budi_row.bolos),
+            (2, 1, 0, 0),
+        )
+        self.assertEqual(budi_row.days[:4], ["A", "A", "S", ""])
+        self.assertEqual(budi_row.days[30], ".")
+        self.assertEqual(len(budi_row.days), 31)
+
+        self.assertEqual(
+            (ani_row.alfa, ani_row.sakit, ani_row.izin, ani_row.bolos),
+            (0, 0, 1, 1),
+        )
+        self.assertEqual(ani_row.days[4:6], ["I", "B"])
+
+    def test_query_count_constant_in_class_size(self):
+        self._add_siswas(3)
+        with CaptureQueriesContext(connection) as small:
+            helpers_pdf.get_rekap_matrix(self.kelas.pk, 3, 2026)
+
+        self._add_siswas(40)
+        with CaptureQueriesContext(connection) as large:
+            rows = helpers_pdf.get_rekap_matrix(self.kelas.pk, 3, 2026)
+
+        self.assertEqual(len(rows), 43)
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), len(small))
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_generate_pdf_query_count_constant(self, mock_pdfkit):
+        self._add_siswas(3)
+        with CaptureQueriesContext(connection) as small:
+            helpers_pdf.generate_pdf(self.kelas, 3, 2026)
+
+        self._add_siswas(40)
+        with CaptureQueriesContext(connection) as large:
+            content = helpers_pdf.generate_pdf(self.kelas, 3, 2026)
+
+        self.assertEqual(content, b"%PDF-fake")
+        self.assertEqual(len(large), len(small))
+
+        html = mock_pdfkit.call_args.args[0]
+        self.assertIn("SISWA 39", html)
+
+    def test_render_html(self):
+        budi = Siswa.objects.create(fullname="Budi", kelas=self.kelas)
+        Siswa.objects.create(fullname="Ani " + "x" * 40, kelas=self.kelas)
+        Absensi.objects.create(
+            siswa=budi, date=date(2026, 3, 2), _status="alfa", by=self.user
+        )
+
+        html = helpers_pdf.render_html(self.kelas, 3, 2026)
+
+        self.assertIn('<span id="kelas">Rekap-K</span>', html)
+        self.assertIn('<span id="bulan">Maret 2026</span>', html)
+        # nama dipotong 30 karakter, baris berselang-seling
+        self.assertIn(
+            '<td class="odd-color">%s</td>' % ("ANI " + "X" * 26), html
+        )
+        self.assertIn('<td class="even-color">BUDI</td>', html)
+        self.assertIn(
+            '<td class="absen-point even-color"></td>'
+            '<td class="absen-point even-color">A</td>',
+            html,
+        )
+        self.assertEqual(html.count('<tr class="even-color">'), 1)
+        self.assertNotIn("{%", html)
+
+
+@override_settings(DEBUG=True, REKAP_RENDER_CONCURRENCY=1, REKAP_RENDER_TIMEOUT=0)
+class RenderPoolTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        _clear_render_pool()
+        _clear_rekap_jobs()
+        self.addCleanup(_clear_render_pool)
+        self.addCleanup(_clear_rekap_jobs)
+
+        self.client = Client()
+        self.redis = redis.get_singleton_client()
+
+        self.wali = User.objects.create_user(
+            username="wali_pool", password="pw",
+            full_name="Wali Pool", type="wali_kelas", token="walipooltoken",
+        )
+        self.kesiswaan = User.objects.create_user(
+            username="kesiswaan_pool", password="pw",
+            full_name="Kesiswaan Pool", type="kesiswaan", token="kesiswaanpooltoken",
+        )
+        self.kelas = Kelas.objects.create(
+            name="Pool-K", active=True, wali_kelas=self.wali
+        )
+        siswa = Siswa.objects.create(fullname="Budi", kelas=self.kelas)
+        Absensi.objects.create(
+            siswa=siswa, date=date(2026, 3, 2), _status="alfa", by=self.wali
+        )
+
+    def _get_rekap(self):
+        return self.client.get(
+            "/api/get-rekap",
+            {"bulan": 3, "kelas": self.kelas.pk, "tahun": 2026},
+            headers={"Authorization": "Bearer walipooltoken"},
+        )
+
+    def _take_slot(self, token, at):
+        """slot dipakai worker lain yang mengambil slot lebih dulu"""
+        counter = self.redis.incr(render_pool.RENDER_COUNTER_KEY)
+        self.redis.zadd(render_pool.RENDER_SLOTS_KEY, {token: at})
+        self.redis.zadd(render_pool.RENDER_OWNERS_KEY, {token: counter})
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_render_releases_slot(self, mock_pdfkit):
+        self.assertEqual(render_pool.render("<html></html>", {}), b"%PDF-fake")
+        self.assertEqual(render_pool.render("<html></html>", {}), b"%PDF-fake")
+
+        self.assertEqual(self.redis.zcard(render_pool.RENDER_SLOTS_KEY), 0)
+        self.assertEqual(self.redis.zcard(render_pool.RENDER_WAITING_KEY), 0)
+
+        metrics = render_pool.get_metrics()
+        self.assertEqual(metrics["renders"], 2)
+        self.assertEqual(metrics["running"], 0)
+        self.assertEqual(metrics["waiting"], 0)
+        self.assertIsNotNone(metrics["p95_ms"])
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_busy_when_all_slots_taken(self, mock_pdfkit):
+        self._take_slot("other", time.time())
+
+        with self.assertRaises(render_pool.RenderPoolBusy):
+            render_pool.render("<html></html>", {})
+
+        mock_pdfkit.assert_not_called()
+        self.assertEqual(render_pool.get_metrics()["timeouts"], 1)
+
+        response = self._get_rekap()
+        self.assertEqual(response.status_code, 503)
+
+        # setelah slot kosong request berikutnya langsung dibuatkan pdf
+        render_pool._release(self.redis, "other")
+        response = self._get_rekap()
+        self.assertEqual(response.status_code, 200)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_stale_slot_is_reclaimed(self, mock_pdfkit):
+        # worker yang mati tidak menahan slot selamanya
+        self._take_slot("dead", time.time() - render_pool.RENDER_SLOT_TTL - 1)
+
+        self.assertEqual(render_pool.render("<html></html>", {}), b"%PDF-fake")
+        self.assertEqual(self.redis.zcard(render_pool.RENDER_OWNERS_KEY), 0)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_slot_order_ignores_clock(self, mock_pdfkit):
+        # jam mesin pemilik slot lebih cepat, slot tetap miliknya
+        self._take_slot("other", time.time() + 30)
+
+        with self.assertRaises(render_pool.RenderPoolBusy):
+            render_pool.render("<html></html>", {})
+
+        mock_pdfkit.assert_not_called()
+
+    def test_waiters_admitted_in_arrival_order(self):
+        self._take_slot("other", time.time())
+        order = []
+
+        def recording_pdfkit(html, path, **kwargs):
+            order.append(html)
+            return b"%PDF-fake"
+
+        def wait_for_waiters(count):
+            deadline = time.monotonic() + 5
+            while self.redis.zcard(render_pool.RENDER_WAITING_KEY) < count:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+
+        with patch("pdfkit.from_string", side_effect=recording_pdfkit):
+            threads = []
+            for name in ("first", "second"):
+                thread = threading.Thread(
+                    target=render_pool.render, args=(name, {}, 5)
+                )
+                thread.start()
+                threads.append(thread)
+                wait_for_waiters(len(threads))
+
+            # penunggu kedua terus mencoba, tetapi tidak mendahului yang pertama
+            time.sleep(render_pool.RENDER_POLL_INTERVAL * 3)
+            render_pool._release(self.redis, "other")
+
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(order, ["first", "second"])
+        self.assertEqual(self.redis.zcard(render_pool.RENDER_OWNERS_KEY), 0)
+
+    def test_long_render_keeps_slot(self):
+        scores = []
+
+        def slow_pdfkit(html, path, **kwargs):
+            slots = render_pool.RENDER_SLOTS_KEY
+            (token, started), = self.redis.zrange(slots, 0, -1, withscores=True)
+            time.sleep(0.3)
+            scores.append(self.redis.zscore(slots, token) - started)
+            return b"%PDF-fake"
+
+        with patch.object(render_pool, "RENDER_SLOT_REFRESH", 0.05), patch(
+            "pdfkit.from_string", side_effect=slow_pdfkit
+        ):
+            self.assertEqual(render_pool.render("<html></html>", {}), b"%PDF-fake")
+
+        # waktu slot diperbarui selama render, tidak dianggap basi
+        self.assertGreater(scores[0], 0)
+        self.assertEqual(self.redis.zcard(render_pool.RENDER_SLOTS_KEY), 0)
+
+    @patch("pdfkit.from_string", side_effect=RuntimeError("wkhtmltopdf"))
+    def test_error_releases_slot(self, mock_pdfkit):
+        with self.assertRaises(RuntimeError):
+            render_pool.render("<html></html>", {})
+
+        self.assertEqual(self.redis.zcard(render_pool.RENDER_SLOTS_KEY), 0)
+        self.assertEqual(render_pool.get_metrics()["errors"], 1)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_get_rekap_renders_in_memory(self, mock_pdfkit):
+        response = self._get_rekap()
+        self.assertEqual(response.status_code, 200)
+
+        file_id = response.json()["data"]["file_id"]
+        self.assertEqual(artifacts.get(file_id).path.read_bytes(), b"%PDF-fake")
+
+    def test_metrics_only_for_kesiswaan(self):
+        response = self.client.get(
+            "/api/rekap/metrics", headers={"Authorization": "Bearer walipooltoken"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            "/api/rekap/metrics",
+            headers={"Authorization": "Bearer kesiswaanpooltoken"},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["concurrency"], 1)
+        self.assertEqual(data["waiting"], 0)
+
+
+@override_settings(DEBUG=True, REKAP_RENDER_TIMEOUT=5)
+class RekapJobTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        _clear_render_pool()
+        _clear_rekap_jobs()
+        self.addCleanup(_clear_rekap_jobs)
+
+        self.client = Client()
+
+        self.wali = User.objects.create_user(
+            username="wali_job", password="pw",
+            full_name="Wali Job", type="wali_kelas", token="walijobtoken",
+        )
+        User.objects.create_user(
+            username="kesiswaan_job", password="pw",
+            full_name="Kesiswaan Job", type="kesiswaan", token="kesiswaanjobtoken",
+        )
+        self.kelas = Kelas.objects.create(
+            name="Job-K", active=True, wali_kelas=self.wali
+        )
+        siswa = Siswa.objects.create(fullname="Budi", kelas=self.kelas)
+        Absensi.objects.create(
+            siswa=siswa, date=date(2026, 3, 2), _status="alfa", by=self.wali
+        )
+
+    def _get_rekap(self, token="walijobtoken", **params):
+        return self.client.get(
+            "/api/get-rekap",
+            {"bulan": 3, "kelas": self.kelas.pk, "tahun": 2026, **params},
+            headers={"Authorization": "Bearer " + token},
+        )
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    @patch("main.helpers.rekap_job.submit")
+    def test_async_single_flight(self, mock_submit, mock_pdfkit):
+        response = self._get_rekap(**{"async": 1})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["data"]["status"], "pending")
+        file_id = response.json()["data"]["file_id"]
+
+        # request lain (user lain/worker lain) tidak membuat job baru
+        response = self._get_rekap("kesiswaanjobtoken", **{"async": 1})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["data"]["file_id"], file_id)
+        self.assertEqual(mock_submit.call_count, 1)
+
+        # job dijalankan worker
+        rekap_job.run(*mock_submit.call_args.args)
+        self.assertEqual(mock_pdfkit.call_count, 1)
+
+        response = self._get_rekap(**{"async": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["data"], {"file_id": file_id, "status": "done"}
+        )
+        self.assertEqual(mock_submit.call_count, 1)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    @patch("main.helpers.rekap_job.submit")
+    def test_sync_waits_for_running_job(self, mock_submit, mock_pdfkit):
+        file_id = self._get_rekap(**{"async": 1}).json()["data"]["file_id"]
+
+        # job selesai di worker lain selama request menunggu
+        def finish_job(seconds):
+            rekap_job.run(*mock_submit.call_args.args)
+
+        with patch("main.helpers.rekap_job.time.sleep", side_effect=finish_job):
+            response = self._get_rekap("kesiswaanjobtoken")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["file_id"], file_id)
+        self.assertEqual(mock_pdfkit.call_count, 1)
+
+    @patch("pdfkit.from_string", side_effect=RuntimeError("wkhtmltopdf"))
+    @patch("main.helpers.rekap_job.submit")
+    def test_failed_job_reported_once(self, mock_submit, mock_pdfkit):
+        self._get_rekap(**{"async": 1})
+
+        with self.assertRaises(RuntimeError):
+            rekap_job.run(*mock_submit.call_args.args)
+
+        response = self._get_rekap(**{"async": 1})
+        self.assertEqual(response.status_code, 500)
+
+        # lock sudah dilepas, request berikutnya membuat job baru
+        response = self._get_rekap(**{"async": 1})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(mock_submit.call_count, 2)
+
+
+@override_settings(DEBUG=True)
+class RekapVersionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        _clear_render_pool()
+        _clear_rekap_jobs()
+        self.addCleanup(_clear_rekap_jobs)
+
+        self.client = Client()
+
+        self.wali = User.objects.create_user(
+            username="wali_version", password="pw",
+            full_name="Wali Version", type="wali_kelas", token="waliversiontoken",
+        )
+        self.kelas = Kelas.objects.create(
+            name="Version-K", active=True, wali_kelas=self.wali
+        )
+        self.siswa = Siswa.objects.create(fullname="Budi", kelas=self.kelas)
+        self.absensi = Absensi.objects.create(
+            siswa=self.siswa, date=date(2026, 3, 2), _status="alfa", by=self.wali
+        )
+
+    def _get_rekap(self, bulan=3):
+        return self.client.get(
+            "/api/get-rekap",
+            {"bulan": bulan, "kelas": self.kelas.pk, "tahun": 2026},
+            headers={"Authorization": "Bearer waliversiontoken"},
+        )
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_cache_hit_does_not_scan_absensi(self, mock_pdfkit):
+        file_id = self._get_rekap().json()["data"]["file_id"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get_rekap()
+
+        self.assertEqual(response.json()["data"]["file_id"], file_id)
+        self.assertEqual(mock_pdfkit.call_count, 1)
+        self.assertFalse(
+            [q for q in queries.captured_queries if "main_absensi" in q["sql"]]
+        )
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_absensi_change_creates_new_rekap(self, mock_pdfkit):
+        march = self._get_rekap(3).json()["data"]["file_id"]
+        april = self._get_rekap(4).json()["data"]["file_id"]
+
+        self.absensi._status = "sakit"
+        self.absensi.save()
+
+        self.assertNotEqual(self._get_rekap(3).json()["data"]["file_id"], march)
+        # bulan lain tidak ikut berubah
+        self.assertEqual(self._get_rekap(4).json()["data"]["file_id"], april)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_moved_absensi_invalidates_both_months(self, mock_pdfkit):
+        march = self._get_rekap(3).json()["data"]["file_id"]
+        april = self._get_rekap(4).json()["data"]["file_id"]
+
+        self.absensi.date = date(2026, 4, 1)
+        self.absensi.save()
+
+        self.assertNotEqual(self._get_rekap(3).json()["data"]["file_id"], march)
+        self.assertNotEqual(self._get_rekap(4).json()["data"]["file_id"], april)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_siswa_rename_creates_new_rekap(self, mock_pdfkit):
+        march = self._get_rekap(3).json()["data"]["file_id"]
+
+        self.siswa.fullname = "Budi Santoso"
+        self.siswa.save()
+
+        self.assertNotEqual(self._get_rekap(3).json()["data"]["file_id"], march)
+
+    def test_upload_bumps_month_version(self):
+        redis_client = redis.get_singleton_client()
+        key = versions.REKAP_VERSION_KEY % (self.kelas.pk, 2026, 3)
+        before = int(redis_client.get(key) or 0)
+
+        response = self.client.post(
+            "/api/upload",
+            data={
+                "data": [
+                    {
+                        "action": "absen",
+                        "data": json.dumps(
+                            {
+                                "date": "2026-03-03",
+                                "siswa": self.siswa.pk,
+                                "status": "hadir",
+                                "updated_at": int(time.time()),
+                            }
+                        ),
+                    }
+                ]
+            },
+            content_type="application/json",
+            headers={"Authorization": "Bearer waliversiontoken"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(redis_client.get(key) or 0), before)
+
+
+@override_settings(DEBUG=True, REKAP_RENDER_CONCURRENCY=2)
+class RekapBulkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        _clear_render_pool()
+        _clear_rekap_jobs()
+        self.addCleanup(_clear_rekap_jobs)
+
+        redis_client = redis.get_singleton_client()
+        for key in redis_client.scan_iter("rekap_bulk_*"):
+            redis_client.delete(key)
+
+        self.client = Client()
+
+        self.kesiswaan = User.objects.create_user(
+            username="kesiswaan_bulk", password="pw",
+            full_name="Kesiswaan Bulk", type="kesiswaan", token="kesiswaanbulktoken",
+        )
+        User.objects.create_user(
+            username="wali_bulk", password="pw",
+            full_name="Wali Bulk", type="wali_kelas", token="walibulktoken",
+        )
+        Kelas.objects.update(active=False)
+        self.kelas_list = [
+            Kelas.objects.create(name="Bulk %s" % i, active=True) for i in range(3)
+        ]
+
+    def _add_siswas(self, kelas, count):
+        siswas = Siswa.objects.bulk_create(
+            Siswa(fullname="%s Siswa %02d" % (kelas.name, i), kelas=kelas)
+            for i in range(count)
+        )
+        Absensi.objects.bulk_create(
+            Absensi(
+                siswa=siswa, date=date(2026, 3, day), _status="alfa",
+                by=self.kesiswaan,
+            )
+            for siswa in siswas
+            for day in range(1, 6)
+        )
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_build_zip(self, mock_pdfkit):
+        self._add_siswas(self.kelas_list[0], 2)
+        progress = []
+
+        buffer = io.BytesIO()
+        rekap_bulk.build_zip(
+            self.kelas_list,
+            3,
+            2026,
+            buffer,
+            on_progress=lambda *args: progress.append(args),
+        )
+
+        with zipfile.ZipFile(buffer) as zip_file:
+            self.assertEqual(
+                sorted(zip_file.namelist()),
+                ["Rekap-Bulk-%s-Maret2026.pdf" % i for i in range(3)],
+            )
+            self.assertEqual(
+                zip_file.read("Rekap-Bulk-0-Maret2026.pdf"), b"%PDF-fake"
+            )
+
+        self.assertEqual(progress, [(1, 3), (2, 3), (3, 3)])
+
+        htmls = [call.args[0] for call in mock_pdfkit.call_args_list]
+        self.assertEqual(len([h for h in htmls if "BULK 0 SISWA 01" in h]), 1)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_build_zip_query_count_constant(self, mock_pdfkit):
+        with CaptureQueriesContext(connection) as small:
+            rekap_bulk.build_zip(self.kelas_list[:1], 3, 2026, io.BytesIO())
+
+        for kelas in self.kelas_list:
+            self._add_siswas(kelas, 5)
+
+        with CaptureQueriesContext(connection) as large:
+            rekap_bulk.build_zip(self.kelas_list, 3, 2026, io.BytesIO())
+
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), len(small))
+
+    def test_build_zip_leaves_slot_for_interactive(self):
+        redis_client = redis.get_singleton_client()
+        running = []
+
+        def counting_pdfkit(html, path, **kwargs):
+            running.append(redis_client.zcard(render_pool.RENDER_SLOTS_KEY))
+            time.sleep(0.05)
+            return b"%PDF-fake"
+
+        with patch("pdfkit.from_string", side_effect=counting_pdfkit):
+            rekap_bulk.build_zip(self.kelas_list, 3, 2026, io.BytesIO())
+
+        self.assertEqual(len(running), 3)
+        self.assertEqual(max(running), 1)
+
+    @override_settings(REKAP_RENDER_TIMEOUT=0)
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_get_rekap_while_bulk_holds_pool(self, mock_pdfkit):
+        redis_client = redis.get_singleton_client()
+        self.addCleanup(_clear_render_pool)
+
+        # job massal (di worker lain) mengambil semua slot yang boleh dipakai
+        held = 0
+        while True:
+            try:
+                render_pool._acquire(
+                    redis_client,
+                    "bulk-%s" % held,
+                    0,
+                    render_pool.get_limit(rekap_bulk.RESERVED_RENDER_SLOTS),
+                )
+            except render_pool.RenderPoolBusy:
+                break
+            held += 1
+
+        self.assertEqual(held, 1)
+
+        response = self.client.get(
+            "/api/get-rekap",
+            {"bulan": 3, "kelas": self.kelas_list[0].pk, "tahun": 2026},
+            headers={"Authorization": "Bearer kesiswaanbulktoken"},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    @patch("main.helpers.rekap_bulk.submit")
+    def test_bulk_api(self, mock_submit, mock_pdfkit):
+        headers = {"Authorization": "Bearer kesiswaanbulktoken"}
+
+        response = self.client.post(
+            "/api/rekap/bulk?bulan=3&tahun=26", headers=headers
+        )
+        self.assertEqual(response.status_code, 202)
+        data = response.json()["data"]
+        self.assertEqual(data["status"], "pending")
+        self.assertEqual(data["total"], 3)
+        job_id = data["job_id"]
+
+        # job yang sama untuk request berikutnya
+        response = self.client.post(
+            "/api/rekap/bulk?bulan=3&tahun=2026", headers=headers
+        )
+        self.assertEqual(response.json()["data"]["job_id"], job_id)
+        self.assertEqual(mock_submit.call_count, 1)
+
+        rekap_bulk.run(*mock_submit.call_args.args)
+
+        response = self.client.get("/api/rekap/bulk/%s" % job_id, headers=headers)
+        data = response.json()["data"]
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(data["done"], 3)
+
+        response = self.client.get("/files/%s" % data["file_id"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        # lock dilepas, bulan yang sama bisa dibuat ulang
+        response = self.client.post(
+            "/api/rekap/bulk?bulan=3&tahun=2026", headers=headers
+        )
+        self.assertNotEqual(response.json()["data"]["job_id"], job_id)
+
+    def test_bulk_api_only_for_kesiswaan(self):
+        response = self.client.post(
+            "/api/rekap/bulk?bulan=3&tahun=2026",
+            headers={"Authorization": "Bearer walibulktoken"},
+        )
+        self.assertEqual(response.status_code, 403)
@@ -104,3 +104,58 @@ class SecretaryUploadApiTest(TestCase):
                 siswa=self.siswa, date=self.date_obj.date(), by=other_secretary
             ).exists()
         )
+
+    def test_secretary_upload_multiple_dates_and_siswa(self):
+        # tanggal dengan himpunan siswa berbeda di-preload dalam group berbeda
+        siswa_2 = Siswa.objects.create(fullname="Siswa B2", kelas=self.kelas)
+        other_date_str = "20-03-26"
+        other_date = datetime(2026, 3, 20).date()
+
+        existing = Absensi.objects.create(
+            siswa=self.siswa, date=self.date_obj.date(), _status="alfa", by=None
+        )
+
+        timestamp = int(time.time())
+        actions = [
+            (self.siswa, self.date_str),
+            (siswa_2, self.date_str),
+            (self.siswa, other_date_str),
+        ]
+        data = {
+            "data": [
+                {
+                    "action": "absen",
+                    "data": json.dumps(
+                        {
+                            "date": date_str,
+                            "siswa": siswa.pk,
+                            "status": "hadir",
+                            "updated_at": timestamp,
+                        }
+                    ),
+                }
+                for siswa, date_str in actions
+            ]
+        }
+
+        response = self.client.post(
+            "/api/upload",
+            data=data,
+            content_type="application/json",
+            headers={"Authorization": "Bearer testtoken"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"data": {"conflicts": []}})
+
+        existing.refresh_from_db()
+        self.assertEqual(existing._status, "hadir")
+        self.assertEqual(existing.by, self.secretary)
+
+        self.assertEqual(Absensi.objects.count(), 3)
+        self.assertTrue(
+            Absensi.objects.filter(siswa=siswa_2, date=self.date_obj.date()).exists()
+        )
+        self.assertTrue(
+            Absensi.objects.filter(siswa=self.siswa, date=other_date).exists()
+        )
@@ -0,0 +1,140 @@
+"""
+Test body /api/upload yang dikompresi lewat header Content-Encoding
+(gzip, deflate, zstd) dan format aksi datar (tanpa JSON di dalam JSON).
+"""
+
+import gzip
+import json
+import time
+import unittest
+import zlib
+
+from django.test import Client, TestCase, override_settings
+from lzstring import LZString
+
+from main.api.api import api
+from main.api.core import parser
+from main.models import Absensi, Kelas, KunciAbsensi, Siswa, User
+
+
+@override_settings(DEBUG=True)
+class UploadEncodingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        # lock/unlock hanya boleh oleh wali kelas
+        self.wali = User.objects.create_user(
+            username="wali_enc", password="pw",
+            full_name="Wali Encoding", type="wali_kelas",
+        )
+        self.wali.token = "walienctoken"
+        self.wali.save()
+
+        self.kelas = Kelas.objects.create(name="Enc-K", active=True, wali_kelas=self.wali)
+        self.siswa = Siswa.objects.create(fullname="Enc-1", kelas=self.kelas)
+
+    def _actions(self, status="hadir"):
+        return [
+            {
+                "action": "absen",
+                "date": "21-03-26",
+                "siswa": self.siswa.pk,
+                "status": status,
+                "updated_at": int(time.time()),
+            },
+            {"action": "lock", "date": "21-03-26", "kelas": self.kelas.pk},
+        ]
+
+    def _post(self, body: bytes, encoding: str = None):
+        headers = {"Authorization": "Bearer walienctoken"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        return self.client.post(
+            "/api/upload",
+            data=body,
+            content_type="application/json",
+            headers=headers,
+        )
+
+    def _assert_saved(self, resp, status="hadir"):
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"data": {"conflicts": []}})
+        self.assertEqual(Absensi.objects.get(siswa=self.siswa)._status, status)
+        self.assertTrue(KunciAbsensi.objects.get(kelas=self.kelas).locked)
+
+    def _body(self, status="hadir") -> bytes:
+        return json.dumps({"data": self._actions(status)}).encode()
+
+    def test_flat_actions_without_encoding(self):
+        self._assert_saved(self._post(self._body()))
+
+    def test_gzip_body(self):
+        self._assert_saved(self._post(gzip.compress(self._body()), "gzip"))
+
+    def test_deflate_body(self):
+        self._assert_saved(self._post(zlib.compress(self._body()), "deflate"))
+
+    def test_raw_deflate_body(self):
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        body = compressor.compress(self._body()) + compressor.flush()
+        self._assert_saved(self._post(body, "deflate"))
+
+    @unittest.skipIf(
+        parser.zstd is None and parser.zstandard is None, "zstd tidak tersedia"
+    )
+    def test_zstd_body(self):
+        if parser.zstd is not None:
+            body = parser.zstd.compress(self._body())
+        else:
+            body = parser.zstandard.ZstdCompressor().compress(self._body())
+
+        self._assert_saved(self._post(body, "zstd"))
+
+    def test_mixed_legacy_and_flat_actions(self):
+        legacy = {
+            "action": "absen",
+            "data": json.dumps({
+                "date": "21-03-26",
+                "siswa": self.siswa.pk,
+                "status": "sakit",
+                "updated_at": int(time.time()),
+            }),
+        }
+        body = {"data": [legacy, self._actions()[1]]}
+
+        self._assert_saved(self._post(json.dumps(body).encode()), "sakit")
+
+    def test_legacy_lzstring_upload(self):
+        data = LZString().compressToBase64(json.dumps(self._actions("izin")))
+        resp = self.client.post(
+            "/api/compressed-upload",
+            data={"data": data},
+            content_type="application/json",
+            headers={"Authorization": "Bearer walienctoken"},
+        )
+        self._assert_saved(resp, "izin")
+
+    def test_unsupported_encoding(self):
+        resp = self._post(self._body(), "br")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Absensi.objects.exists())
+
+    def test_corrupt_body(self):
+        resp = self._post(b"bukan gzip", "gzip")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_decompressed_size_limit(self):
+        body = gzip.compress(b" " * (parser.MAX_DECOMPRESSED_SIZE + 1))
+        resp = self._post(body, "gzip")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_flat_absen_requires_siswa(self):
+        body = {"data": [{"action": "absen", "date": "21-03-26", "status": "hadir"}]}
+        resp = self._post(json.dumps(body).encode())
+        self.assertEqual(resp.status_code, 422)
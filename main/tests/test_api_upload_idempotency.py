@@ -0,0 +1,136 @@
+"""
+Test header Idempotency-Key pada /api/upload dan /api/compressed-upload.
+"""
+
+import json
+import time
+import uuid
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from lzstring import LZString
+
+from main.api.api import api
+from main.helpers import idempotency
+from main.models import Absensi, Kelas, KunciAbsensi, Siswa, User
+
+
+def _absen(siswa_pk: int, status: str, date_str: str = "21-03-26") -> dict:
+    payload = {
+        "date": date_str,
+        "siswa": siswa_pk,
+        "status": status,
+        "updated_at": int(time.time()),
+    }
+    return {"action": "absen", "data": json.dumps(payload)}
+
+
+@override_settings(DEBUG=True)
+class UploadIdempotencyTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        self.sekretaris = User.objects.create_user(
+            username="sek_idem", password="pw",
+            full_name="Sekretaris Idem", type="sekretaris",
+        )
+        self.sekretaris.token = "sekidemtoken"
+        self.sekretaris.save()
+
+        self.kelas = Kelas.objects.create(name="Idem-K", active=True)
+        self.kelas.sekretaris.add(self.sekretaris)
+        self.siswa = Siswa.objects.create(fullname="Idem-1", kelas=self.kelas)
+
+        # redis tidak di-reset antar test, key harus unik
+        self.key = uuid.uuid4().hex
+
+    def _upload(self, actions, key=None):
+        return self.client.post(
+            "/api/upload",
+            data={"data": actions},
+            content_type="application/json",
+            headers={
+                "Authorization": "Bearer sekidemtoken",
+                "Idempotency-Key": key or self.key,
+            },
+        )
+
+    def test_replay_returns_stored_result(self):
+        first = self._upload([_absen(self.siswa.pk, "hadir")])
+        self.assertEqual(first.status_code, 200)
+
+        # retry dengan key sama tidak diproses ulang walaupun isinya beda
+        with CaptureQueriesContext(connection) as ctx:
+            replay = self._upload([_absen(self.siswa.pk, "sakit")])
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json(), first.json())
+        self.assertFalse(
+            any("main_absensi" in q["sql"] for q in ctx.captured_queries)
+        )
+        self.assertEqual(Absensi.objects.get(siswa=self.siswa)._status, "hadir")
+
+    def test_different_key_is_processed(self):
+        self._upload([_absen(self.siswa.pk, "hadir")])
+        self._upload([_absen(self.siswa.pk, "sakit")], key=uuid.uuid4().hex)
+
+        self.assertEqual(Absensi.objects.get(siswa=self.siswa)._status, "sakit")
+
+    def test_rejected_batch_is_not_stored(self):
+        lock = KunciAbsensi.objects.create(
+            kelas=self.kelas, date="2026-03-21", locked=True
+        )
+
+        resp = self._upload([_absen(self.siswa.pk, "hadir")])
+        self.assertEqual(resp.status_code, 403)
+
+        lock.locked = False
+        lock.save()
+
+        resp = self._upload([_absen(self.siswa.pk, "hadir")])
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(Absensi.objects.filter(siswa=self.siswa).exists())
+
+    def test_compressed_upload_replay(self):
+        def compressed(status):
+            data = LZString().compressToBase64(
+                json.dumps([_absen(self.siswa.pk, status)])
+            )
+            return self.client.post(
+                "/api/compressed-upload",
+                data={"data": data},
+                content_type="application/json",
+                headers={
+                    "Authorization": "Bearer sekidemtoken",
+                    "Idempotency-Key": self.key,
+                },
+            )
+
+        self.assertEqual(compressed("izin").status_code, 200)
+        self.assertEqual(compressed("alfa").status_code, 200)
+        self.assertEqual(Absensi.objects.get(siswa=self.siswa)._status, "izin")
+
+    def test_claim_renewed_while_processing(self):
+        pk = self.sekretaris.pk
+
+        with patch.object(idempotency, "IN_PROGRESS_TTL", 1), patch.object(
+            idempotency, "IN_PROGRESS_REFRESH", 0.2
+        ):
+            self.assertIsNone(idempotency.begin(pk, self.key))
+            stop_keep_alive = idempotency.keep_alive(pk, self.key)
+
+            # batch berjalan lebih lama dari TTL, retry tetap ditolak
+            time.sleep(1.5)
+            self.assertEqual(idempotency.begin(pk, self.key)[0], 409)
+
+            stop_keep_alive()
+
+        idempotency.save(pk, self.key, 200, {"ok": True})
+        self.assertEqual(idempotency.begin(pk, self.key), (200, {"ok": True}))
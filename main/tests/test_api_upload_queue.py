@@ -0,0 +1,176 @@
+"""
+Test untuk upload async: POST /api/upload?async=1, worker `uploadworker`,
+dan polling GET /api/upload/{job_id}.
+"""
+
+import json
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from main.api.api import api
+from main.helpers import redis, upload_queue
+from main.models import Absensi, Kelas, Siswa, User
+
+WORKER_NAME = "test-worker"
+
+
+def _absen(siswa_pk: int, date_str: str, status: str, **extra) -> dict:
+    payload = {
+        "date": date_str,
+        "siswa": siswa_pk,
+        "status": status,
+        "updated_at": int(time.time()),
+        **extra,
+    }
+    return {"action": "absen", "data": json.dumps(payload)}
+
+
+@override_settings(DEBUG=True)
+class UploadQueueTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        self.client = Client()
+
+        redis_client = redis.get_singleton_client()
+        redis_client.delete(
+            upload_queue.QUEUE_KEY, upload_queue.PROCESSING_KEY % WORKER_NAME
+        )
+
+        self.sekretaris = User.objects.create_user(
+            username="sek_queue", password="pw",
+            full_name="Sekretaris Queue", type="sekretaris",
+        )
+        self.sekretaris.token = "sekqueuetoken"
+        self.sekretaris.save()
+
+        self.other = User.objects.create_user(
+            username="other_queue", password="pw",
+            full_name="Other Queue", type="sekretaris",
+        )
+        self.other.token = "otherqueuetoken"
+        self.other.save()
+
+        self.kelas = Kelas.objects.create(name="Queue-K", active=True)
+        self.kelas.sekretaris.add(self.sekretaris)
+        self.siswa = Siswa.objects.create(fullname="Queue-1", kelas=self.kelas)
+
+    def _upload(self, actions, token="sekqueuetoken"):
+        return self.client.post(
+            "/api/upload?async=1",
+            data={"data": actions},
+            content_type="application/json",
+            headers={"Authorization": "Bearer %s" % token},
+        )
+
+    def _poll(self, job_id, token="sekqueuetoken"):
+        return self.client.get(
+            "/api/upload/%s" % job_id,
+            headers={"Authorization": "Bearer %s" % token},
+        )
+
+    def _run_worker(self):
+        call_command("uploadworker", name=WORKER_NAME, once=True, stdout=StringIO())
+
+    def test_async_upload_is_queued_then_processed(self):
+        resp = self._upload([_absen(self.siswa.pk, "21-03-26", "hadir")])
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()["data"]["job_id"]
+
+        # belum diproses worker
+        self.assertFalse(Absensi.objects.exists())
+        self.assertEqual(self._poll(job_id).json()["data"]["status"], "pending")
+
+        self._run_worker()
+
+        data = self._poll(job_id).json()["data"]
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(data["status_code"], 200)
+        self.assertEqual(data["result"], {"data": {"conflicts": []}})
+        self.assertTrue(
+            Absensi.objects.filter(siswa=self.siswa, _status="hadir").exists()
+        )
+
+    def test_conflicts_returned_in_job_result(self):
+        Absensi.objects.create(
+            siswa=self.siswa, date="2026-03-21", _status="sakit", by=self.other,
+        )
+
+        resp = self._upload([_absen(self.siswa.pk, "21-03-26", "hadir")])
+        job_id = resp.json()["data"]["job_id"]
+        self._run_worker()
+
+        result = self._poll(job_id).json()["data"]["result"]
+        conflicts = result["data"]["conflicts"]
+        self.assertEqual(len(conflicts), 1)
+        self.assertEqual(conflicts[0]["absensi_siswa_id"], self.siswa.pk)
+
+    def test_job_only_visible_to_owner(self):
+        job_id = self._upload([_absen(self.siswa.pk, "21-03-26", "hadir")]).json()[
+            "data"
+        ]["job_id"]
+
+        self.assertEqual(self._poll(job_id, token="otherqueuetoken").status_code, 404)
+        self.assertEqual(self._poll("tidakada").status_code, 404)
+
+    def test_stale_processing_job_is_requeued(self):
+        job_id = self._upload([_absen(self.siswa.pk, "21-03-26", "hadir")]).json()[
+            "data"
+        ]["job_id"]
+
+        # worker mati setelah mengambil job
+        self.assertEqual(upload_queue.pop(WORKER_NAME), job_id)
+
+        self._run_worker()
+
+        self.assertEqual(self._poll(job_id).json()["data"]["status"], "done")
+        self.assertTrue(Absensi.objects.exists())
+
+    def test_bad_payload_finishes_job(self):
+        bad = {"action": "absen", "data": json.dumps({"siswa": self.siswa.pk})}
+        job_id = self._upload([bad]).json()["data"]["job_id"]
+
+        with self.assertLogs("main.helpers.upload_queue", "WARNING"):
+            self._run_worker()
+
+        data = self._poll(job_id).json()["data"]
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(data["status_code"], 400)
+        self.assertIn("detail", data["result"])
+
+        # tidak tertinggal di processing untuk diulang saat worker restart
+        self.assertEqual(upload_queue.requeue_stale(WORKER_NAME), 0)
+
+    @patch(
+        "main.api.router.upload.UploadView.handle",
+        side_effect=RuntimeError("crash"),
+    )
+    def test_failed_job_finishes_with_500(self, _):
+        job_id = self._upload([_absen(self.siswa.pk, "21-03-26", "hadir")]).json()[
+            "data"
+        ]["job_id"]
+
+        with self.assertLogs("main.helpers.upload_queue", "ERROR"):
+            self._run_worker()
+
+        data = self._poll(job_id).json()["data"]
+        self.assertEqual(data["status"], "done")
+        self.assertEqual(data["status_code"], 500)
+        self.assertEqual(upload_queue.requeue_stale(WORKER_NAME), 0)
+
+    def test_sync_upload_still_default(self):
+        resp = self.client.post(
+            "/api/upload",
+            data={"data": [_absen(self.siswa.pk, "21-03-26", "hadir")]},
+            content_type="application/json",
+            headers={"Authorization": "Bearer sekqueuetoken"},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"data": {"conflicts": []}})
@@ -0,0 +1,215 @@
+"""
+Test penyimpanan file hasil rekap/export di main/helpers/artifacts.py dan
+download lewat /files/<file_id> (ETag, Range, X-Sendfile/X-Accel-Redirect).
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import Client, TestCase, override_settings
+
+from main.helpers import artifacts, redis
+
+CONTENT = bytes(range(256)) * 4
+
+
+class ArtifactsTestBase(TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+        settings_override = override_settings(ARTIFACTS_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.redis = redis.get_singleton_client()
+        for key in self.redis.scan_iter("artifact*"):
+            self.redis.delete(key)
+
+        self.client = Client()
+
+
+class ArtifactStoreTest(ArtifactsTestBase):
+    def test_store_and_get(self):
+        artifacts.store("rekap-x", "Rekap-X.pdf", "application/pdf", CONTENT)
+
+        artifact = artifacts.get("rekap-x")
+        self.assertEqual(artifact.filename, "Rekap-X.pdf")
+        self.assertEqual(artifact.mimetype, "application/pdf")
+        self.assertEqual(artifact.size, len(CONTENT))
+        self.assertEqual(artifact.path.read_bytes(), CONTENT)
+
+        # tidak ada file sementara yang tertinggal
+        self.assertEqual(os.listdir(self.root), ["rekap-x"])
+
+    def test_store_file(self):
+        f, tmp_path = artifacts.create_temp_file("rekap-zip")
+        with f:
+            for i in range(0, len(CONTENT), 100):
+                f.write(CONTENT[i : i + 100])
+
+        stored = artifacts.store_file(
+            "rekap-zip", "Rekap.zip", "application/zip", tmp_path
+        )
+
+        artifact = artifacts.get("rekap-zip")
+        self.assertEqual(artifact.size, len(CONTENT))
+        self.assertEqual(artifact.etag, stored.etag)
+        self.assertEqual(
+            artifact.etag,
+            artifacts.store("rekap-y", "Y.pdf", "application/pdf", CONTENT).etag,
+        )
+        self.assertEqual(artifact.path.read_bytes(), CONTENT)
+        self.assertEqual(sorted(os.listdir(self.root)), ["rekap-y", "rekap-zip"])
+
+    def test_invalid_file_id(self):
+        self.assertIsNone(artifacts.get("../etc"))
+        with self.assertRaises(ValueError):
+            artifacts.store("../etc", "x", "text/plain", b"x")
+
+    def test_get_expired(self):
+        artifacts.store("rekap-x", "Rekap-X.pdf", "application/pdf", CONTENT, ttl=1)
+        self.redis.delete(artifacts.ARTIFACT_KEY % "rekap-x")
+
+        self.assertIsNone(artifacts.get("rekap-x"))
+
+    def test_cleanup(self):
+        artifacts.store("expired", "a.pdf", "application/pdf", CONTENT, ttl=1)
+        artifacts.store("fresh", "b.pdf", "application/pdf", CONTENT)
+        self.redis.delete(artifacts.ARTIFACT_KEY % "expired")
+
+        # file lama tanpa metadata (mis. redis di-restart)
+        orphan = self.root / "orphan"
+        orphan.write_bytes(b"x")
+        old = time.time() - artifacts.DEFAULT_TTL - 60
+        os.utime(orphan, (old, old))
+
+        self.assertEqual(artifacts.cleanup(now=time.time() + 2), 2)
+        self.assertEqual(os.listdir(self.root), ["fresh"])
+        self.assertIsNotNone(artifacts.get("fresh"))
+
+    def test_cleanup_skips_vanished_files(self):
+        artifacts.store("fresh", "b.pdf", "application/pdf", CONTENT)
+        (self.root / ".tmp-gone").write_bytes(b"x")
+
+        stat = Path.stat
+
+        def racing_stat(path, *args, **kwargs):
+            # worker lain me-rename file sementara di antara iterdir dan stat
+            if path.name == ".tmp-gone":
+                path.unlink()
+            return stat(path, *args, **kwargs)
+
+        with patch.object(Path, "stat", racing_stat):
+            self.assertEqual(artifacts.cleanup(), 0)
+
+        self.assertIsNotNone(artifacts.get("fresh"))
+
+    def test_parse_range(self):
+        self.assertEqual(artifacts.parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(artifacts.parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(artifacts.parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(artifacts.parse_range("bytes=95-200", 100), (95, 99))
+        self.assertIsNone(artifacts.parse_range("bytes=0-1,5-6", 100))
+        self.assertIsNone(artifacts.parse_range("items=0-1", 100))
+
+        with self.assertRaises(artifacts.RangeNotSatisfiable):
+            artifacts.parse_range("bytes=100-", 100)
+
+
+class FilesViewTest(ArtifactsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.artifact = artifacts.store(
+            "rekap-x", "Rekap-X.pdf", "application/pdf", CONTENT
+        )
+
+    def test_download(self):
+        response = self.client.get("/files/rekap-x/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Content-Disposition"], "filename=Rekap-X.pdf")
+        self.assertEqual(response["Content-Length"], str(len(CONTENT)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["ETag"], '"%s"' % self.artifact.etag)
+
+    def test_not_found(self):
+        response = self.client.get("/files/rekap-unknown/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_file_removed_after_lookup(self):
+        # cleanup menghapus file di antara pembacaan metadata dan open
+        self.artifact.path.unlink()
+
+        response = self.client.get("/files/rekap-x/")
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get("/files/rekap-x/", headers={"Range": "bytes=0-9"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_modified(self):
+        response = self.client.get(
+            "/files/rekap-x/", headers={"If-None-Match": '"%s"' % self.artifact.etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        for header in ('"a", W/"%s"' % self.artifact.etag, "*"):
+            response = self.client.get(
+                "/files/rekap-x/", headers={"If-None-Match": header}
+            )
+            self.assertEqual(response.status_code, 304)
+
+    def test_etag_is_not_substring_matched(self):
+        # header rusak yang kebetulan memuat etag file ini tidak dianggap cocok
+        response = self.client.get(
+            "/files/rekap-x/",
+            headers={"If-None-Match": '"%s"-gzip' % self.artifact.etag},
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_range(self):
+        response = self.client.get("/files/rekap-x/", headers={"Range": "bytes=10-19"})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(
+            response["Content-Range"], "bytes 10-19/%s" % len(CONTENT)
+        )
+        self.assertEqual(response["Content-Length"], "10")
+
+    def test_range_not_satisfiable(self):
+        response = self.client.get(
+            "/files/rekap-x/", headers={"Range": "bytes=5000-"}
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */%s" % len(CONTENT))
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        response = self.client.get(
+            "/files/rekap-x/",
+            headers={"Range": "bytes=10-19", "If-Range": '"other"'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+
+    @override_settings(ARTIFACTS_SENDFILE="x-accel-redirect")
+    def test_x_accel_redirect(self):
+        response = self.client.get("/files/rekap-x/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-artifacts/rekap-x")
+        self.assertEqual(response["Content-Disposition"], "filename=Rekap-X.pdf")
+
+    @override_settings(ARTIFACTS_SENDFILE="x-sendfile")
+    def test_x_sendfile(self):
+        response = self.client.get("/files/rekap-x/")
+
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["X-Sendfile"], str(self.root / "rekap-x"))
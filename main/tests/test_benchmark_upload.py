@@ -0,0 +1,335 @@
+"""
+Benchmark pipeline upload (tidak ikut `make test`).
+
+Jalankan dengan:
+    python manage.py test main.tests.test_benchmark_upload --tag=benchmark
+    make benchmark
+"""
+
+import json
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.test import Client, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from main.api.api import api
+from main.api.router.upload import UploadView
+from main.api.schemas import DataUploadSchema
+from main.models import Absensi, Kelas, KunciAbsensi, Siswa, User
+
+SIZES = [100, 1_000, 10_000]
+SISWA_PER_KELAS = 40
+DAYS = 50
+
+
+def _make_actions(siswas, days: int, count: int) -> DataUploadSchema:
+    """`count` action absen: setiap siswa per hari, mundur dari kemarin"""
+    today = timezone.localdate()
+    actions = []
+
+    for i in range(count):
+        siswa = siswas[i % len(siswas)]
+        date = today - timedelta(days=1 + (i // len(siswas)) % days)
+        payload = {
+            "date": date.strftime("%d-%m-%y"),
+            "siswa": siswa.pk,
+            "status": "hadir",
+            "updated_at": int(time.time()),
+        }
+        actions.append({"action": "absen", "data": json.dumps(payload)})
+
+    return DataUploadSchema(data=actions)
+
+
+class _QueryTimer:
+    """
+    execute_wrapper: total waktu cursor.execute dengan perf_counter (tanpa
+    fetch baris). Waktu di captured_queries dibulatkan 3 desimal sehingga
+    query cepat terbaca 0.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.total += time.perf_counter() - start
+
+
+def _legacy_or_lookup(view: UploadView):
+    """filter lama: 1 term OR per action, sebagai pembanding"""
+    absensi_q = None
+    lock_q = None
+
+    for item in view.parsed_actions:
+        q = Q(siswa_id=item.siswa.pk) & Q(date=item.date)
+        absensi_q = q if absensi_q is None else absensi_q | q
+        lq = Q(kelas_id=item.siswa.kelas_id) & Q(date=item.date)
+        lock_q = lq if lock_q is None else lock_q | lq
+
+    list(KunciAbsensi.objects.filter(lock_q))
+    list(Absensi.objects.filter(absensi_q).select_related("by", "siswa", "siswa__kelas"))
+
+
+@tag("benchmark")
+class UploadLookupBenchmark(TestCase):
+    """waktu preload UploadView._parse_data untuk 100, 1.000 dan 10.000 action"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="bench_sekretaris", password="pw",
+            full_name="Bench Sekretaris", type="sekretaris",
+        )
+
+        # 10.000 action = 5 kelas x 40 siswa x 50 hari
+        cls.siswas = []
+        for k in range(SIZES[-1] // SISWA_PER_KELAS // DAYS):
+            kelas = Kelas.objects.create(name="Bench-%d" % k)
+            kelas.sekretaris.add(cls.user)
+            cls.siswas.extend(
+                Siswa.objects.bulk_create(
+                    Siswa(fullname="Bench-%d-%d" % (k, i), kelas=kelas)
+                    for i in range(SISWA_PER_KELAS)
+                )
+            )
+
+        # separuh action memperbarui absensi yang sudah ada
+        today = timezone.localdate()
+        Absensi.objects.bulk_create(
+            Absensi(
+                date=today - timedelta(days=day),
+                siswa=siswa,
+                _status="alfa",
+                by=cls.user,
+            )
+            for day in range(1, DAYS + 1, 2)
+            for siswa in cls.siswas
+        )
+
+    def test_parse_data_lookup(self):
+        print("\n%8s %8s %12s %12s %14s" % (
+            "actions", "queries", "grouped ms", "exec ms", "legacy OR ms"
+        ))
+
+        for size in SIZES:
+            data = _make_actions(self.siswas, DAYS, size)
+
+            view = UploadView(None, data)
+            timer = _QueryTimer()
+            with CaptureQueriesContext(connection) as ctx:
+                with connection.execute_wrapper(timer):
+                    start = time.perf_counter()
+                    view._parse_data()
+                    elapsed = time.perf_counter() - start
+
+            sql_time = timer.total
+
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    _legacy_or_lookup(view)
+                legacy = "%.1f" % ((time.perf_counter() - start) * 1000)
+            except DatabaseError:
+                # mis. sqlite: "Expression tree is too large"
+                legacy = "error"
+
+            print("%8d %8d %12.1f %12.1f %14s" % (
+                size, len(ctx), elapsed * 1000, sql_time * 1000, legacy
+            ))
+
+            # siswa, kelas + sekretaris, kunci, absensi
+            self.assertLessEqual(len(ctx), 5)
+
+
+# jumlah pengulangan per ukuran batch untuk percentile latency
+REPEATS = {100: 20, 1_000: 10, 10_000: 3}
+SEED_DAYS = 180
+SEED_SISWA = 60
+
+# query tetap: savepoint, auth, siswa, kelas + sekretaris, kunci, absensi,
+# kepemilikan kelas, upsert kunci, bulk create/update absensi (12 saat ini)
+QUERY_BUDGET_BASE = 14
+# bulk_create/bulk_update boleh dipecah per batch, tapi tidak per baris
+ROWS_PER_QUERY = 50
+
+
+def _query_budget(size: int) -> int:
+    return QUERY_BUDGET_BASE + math.ceil(size / ROWS_PER_QUERY)
+
+
+def _percentile(samples: list, percent: int) -> float:
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[percent - 1]
+
+
+@tag("benchmark")
+@override_settings(DEBUG=True)
+class UploadPipelineBenchmark(TestCase):
+    """
+    POST /api/upload end-to-end dengan data `seeddummy`: batch campuran
+    unlock/absen/lock berisi baris baru, update dan konflik.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(0)
+        call_command(
+            "seeddummy", days=SEED_DAYS, siswa=SEED_SISWA, stdout=StringIO()
+        )
+
+        # upload sebagai wali kelas: boleh absen dan lock/unlock kelasnya
+        kelas = Kelas.objects.get(wali_kelas__username="wali_ipa1")
+
+        cls.kelas_ids = [kelas.pk]
+        cls.siswas = list(Siswa.objects.filter(kelas=kelas).order_by("pk"))
+        cls.existing = {
+            (siswa_id, date): status
+            for siswa_id, date, status in Absensi.objects.values_list(
+                "siswa_id", "date", "_status"
+            )
+        }
+
+    def setUp(self):
+        self.client = Client()
+
+    def _make_batch(self, size: int) -> tuple[dict, dict]:
+        """
+        Batch berisi `size` action: per tanggal unlock + lock semua kelas dan
+        absen semua siswa, mundur dari kemarin.
+        """
+        actions = []
+        mix = {"fresh": 0, "update": 0, "conflict": 0}
+        today = timezone.localdate()
+        updated_at = int(time.time())
+        day = 0
+
+        while len(actions) < size:
+            day += 1
+            date = today - timedelta(days=day)
+            date_str = date.strftime("%d-%m-%y")
+
+            for kelas_id in self.kelas_ids:
+                for action in ("unlock", "lock"):
+                    actions.append(
+                        {"action": action, "date": date_str, "kelas": kelas_id}
+                    )
+
+            for i, siswa in enumerate(self.siswas):
+                if len(actions) >= size:
+                    break
+
+                # seeddummy tidak mengisi sabtu/minggu -> baris baru
+                current = self.existing.get((siswa.pk, date))
+                payload = {
+                    "date": date_str,
+                    "siswa": siswa.pk,
+                    "status": "hadir",
+                    "updated_at": updated_at,
+                }
+
+                if current is None:
+                    mix["fresh"] += 1
+                else:
+                    # status berbeda, data lama milik sekretaris/piket
+                    payload["status"] = "sakit" if current == "hadir" else "hadir"
+                    if i % 2:
+                        payload["previous_status"] = current
+                        mix["update"] += 1
+                    else:
+                        mix["conflict"] += 1
+
+                actions.append(
+                    {"action": "absen", "data": json.dumps(payload)}
+                )
+
+        return {"data": actions}, mix
+
+    def _post(self, body: str):
+        resp = self.client.post(
+            "/api/upload",
+            data=body,
+            content_type="application/json",
+            headers={"Authorization": "Bearer token_wali_ipa1"},
+        )
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp
+
+    def _replay(self, body: str):
+        """jalankan 1 upload lalu rollback agar setiap ulangan sama"""
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                resp = self._post(body)
+                elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        return elapsed, len(ctx), resp
+
+    def _peak_memory(self, body: str) -> int:
+        with transaction.atomic():
+            tracemalloc.start()
+            try:
+                self._post(body)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+
+        return peak
+
+    def test_upload_pipeline(self):
+        print("\n%8s %20s %8s %8s %8s %8s %8s %10s" % (
+            "actions", "fresh/update/confl", "queries", "budget",
+            "p50 ms", "p95 ms", "p99 ms", "peak MiB",
+        ))
+
+        for size, repeats in REPEATS.items():
+            data, mix = self._make_batch(size)
+            body = json.dumps(data)
+
+            timings = []
+            queries = set()
+            for _ in range(repeats):
+                elapsed, query_count, resp = self._replay(body)
+                timings.append(elapsed * 1000)
+                queries.add(query_count)
+
+            conflicts = len(resp.json()["data"]["conflicts"])
+            self.assertEqual(conflicts, mix["conflict"])
+
+            peak = self._peak_memory(body)
+            budget = _query_budget(size)
+
+            print("%8d %20s %8s %8d %8.1f %8.1f %8.1f %10.1f" % (
+                size,
+                "%d/%d/%d" % (mix["fresh"], mix["update"], mix["conflict"]),
+                "/".join(map(str, sorted(queries))),
+                budget,
+                _percentile(timings, 50),
+                _percentile(timings, 95),
+                _percentile(timings, 99),
+                peak / 1024 / 1024,
+            ))
+
+            # gagal jika ada perubahan yang kembali query per baris
+            self.assertLessEqual(max(queries), budget)
@@ -0,0 +1,74 @@
+"""
+Test `manage.py loaddata`: absensi yang dimuat dengan bulk_create tetap
+menaikkan versi rekap/snapshot dan memaksa delta sync menjadi full dump.
+"""
+
+import os
+import pickle
+import tempfile
+import time
+from datetime import date
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from main.helpers import redis, sync, versions
+from main.models import Absensi, Kelas, Siswa, User
+
+
+class LoadDataTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="wali_load", password="pw",
+            full_name="Wali Load", type="wali_kelas",
+        )
+        self.kelas = Kelas.objects.create(name="Load-K", active=True)
+        self.siswa = Siswa.objects.create(fullname="Load-1", kelas=self.kelas)
+
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+        absensi_date = date(2026, 3, 2)
+        with open(self.path, "wb") as f:
+            pickle.dump(
+                {
+                    "users": [],
+                    "kelass": [],
+                    "siswas": [],
+                    "kuncis": [],
+                    "absensies": [
+                        {
+                            "fields": {
+                                "date": absensi_date,
+                                "siswa": self.siswa.pk,
+                                "by": self.user.pk,
+                                "_status": "hadir",
+                            }
+                        }
+                    ],
+                },
+                f,
+            )
+
+        self.keys = [
+            versions.KELAS_VERSION_KEY % self.kelas.pk,
+            versions.REKAP_VERSION_KEY % (self.kelas.pk, 2026, 3),
+            versions.MONTH_VERSION_KEY % (self.kelas.pk, 2026, 3),
+        ]
+
+    def test_loaddata_bumps_versions(self):
+        redis_client = redis.get_singleton_client()
+        before = [int(v or 0) for v in redis_client.mget(self.keys)]
+        started_at = time.time()
+
+        call_command("loaddata", self.path)
+
+        self.assertTrue(Absensi.objects.filter(siswa=self.siswa).exists())
+
+        after = [int(v or 0) for v in redis_client.mget(self.keys)]
+        for old, new in zip(before, after):
+            self.assertGreater(new, old)
+
+        # client dengan watermark sebelum loaddata mendapat full dump
+        self.assertGreaterEqual(sync.get_structure_changed_at(), started_at)
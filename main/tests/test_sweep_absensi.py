@@ -0,0 +1,101 @@
+"""
+Test `manage.py sweepabsensi`: absensi "tunggu" yang kedaluwarsa disimpan
+sebagai "bolos".
+"""
+
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from main.helpers import redis, sweeper, versions
+from main.models import Absensi, Kelas, Siswa, User
+
+
+class SweepAbsensiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="piket_sweep", password="pw",
+            full_name="Piket Sweep", type="guru_piket",
+        )
+        self.kelas = Kelas.objects.create(name="Sweep-K", active=True)
+        self.siswas = [
+            Siswa.objects.create(fullname="Sweep-%d" % i, kelas=self.kelas)
+            for i in range(3)
+        ]
+        self.now = timezone.now()
+
+    def _absensi(self, siswa, status, wait_expired_at=None):
+        return Absensi.objects.create(
+            date=self.now.date(),
+            siswa=siswa,
+            _status=status,
+            wait_expired_at=wait_expired_at,
+            by=self.user,
+        )
+
+    def test_only_expired_waits_are_swept(self):
+        expired = self._absensi(
+            self.siswas[0], "tunggu", self.now - timedelta(minutes=1)
+        )
+        waiting = self._absensi(
+            self.siswas[1], "tunggu", self.now + timedelta(hours=1)
+        )
+        hadir = self._absensi(self.siswas[2], "hadir")
+
+        out = StringIO()
+        call_command("sweepabsensi", once=True, stdout=out)
+        self.assertIn("1 absensi", out.getvalue())
+
+        expired.refresh_from_db()
+        waiting.refresh_from_db()
+        hadir.refresh_from_db()
+
+        self.assertEqual(expired._status, "bolos")
+        self.assertGreater(expired.changed_at, hadir.changed_at)
+        self.assertEqual(waiting._status, "tunggu")
+        self.assertEqual(hadir._status, "hadir")
+
+    def test_sweep_bumps_kelas_version(self):
+        self._absensi(self.siswas[0], "tunggu", self.now - timedelta(minutes=1))
+
+        redis_client = redis.get_singleton_client()
+        absensi_date = self.now.date()
+        keys = [
+            versions.KELAS_VERSION_KEY % self.kelas.pk,
+            versions.REKAP_VERSION_KEY
+            % (self.kelas.pk, absensi_date.year, absensi_date.month),
+        ]
+        before = [int(v or 0) for v in redis_client.mget(keys)]
+
+        self.assertEqual(sweeper.sweep_expired_waits(), 1)
+        after = [int(v or 0) for v in redis_client.mget(keys)]
+        self.assertGreater(after[0], before[0])
+        self.assertGreater(after[1], before[1])
+
+        # tidak ada yang tersisa
+        self.assertEqual(sweeper.sweep_expired_waits(), 0)
+
+    def test_sweep_in_chunks(self):
+        for siswa in self.siswas:
+            self._absensi(siswa, "tunggu", self.now - timedelta(minutes=1))
+
+        with patch.object(sweeper, "SWEEP_CHUNK_SIZE", 2):
+            self.assertEqual(sweeper.sweep_expired_waits(), 3)
+
+        self.assertFalse(Absensi.objects.filter(_status="tunggu").exists())
+
+    def test_fallback_status_uses_current_time(self):
+        absensi = self._absensi(
+            self.siswas[0], "tunggu", self.now + timedelta(minutes=30)
+        )
+        self.assertEqual(Absensi.objects.get(pk=absensi.pk).status, "tunggu")
+
+        # belum di-sweep, annotation memakai waktu saat query dibuat
+        with patch(
+            "django.utils.timezone.now", return_value=self.now + timedelta(hours=1)
+        ):
+            self.assertEqual(Absensi.objects.get(pk=absensi.pk).status, "bolos")
@@ -0,0 +1,205 @@
+"""
+Test warmup rekap pdf dan snapshot /data di luar jam sibuk
+(main/helpers/warmup.py dan manage.py warmup).
+"""
+
+import io
+from datetime import date, datetime, time
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+
+from main.api.api import api
+from main.helpers import redis, rekap_job
+from main.helpers import snapshot as helpers_snapshot
+from main.helpers import versions, warmup
+from main.models import Absensi, Kelas, Siswa, User
+from main.tests.test_api_rekap import (_clear_rekap_jobs, _clear_render_pool,
+                                       _fake_pdfkit)
+
+
+def _clear_snapshots():
+    redis_client = redis.get_singleton_client()
+    for key in redis_client.scan_iter("data_snapshot_*"):
+        redis_client.delete(key)
+
+
+class WarmupScheduleTest(TestCase):
+    def test_next_run(self):
+        tz = ZoneInfo("Asia/Jakarta")
+        times = [time(5, 0), time(15, 30)]
+
+        self.assertEqual(
+            warmup.get_next_run(datetime(2026, 3, 2, 4, 0, tzinfo=tz), times),
+            datetime(2026, 3, 2, 5, 0, tzinfo=tz),
+        )
+        self.assertEqual(
+            warmup.get_next_run(datetime(2026, 3, 2, 5, 0, tzinfo=tz), times),
+            datetime(2026, 3, 2, 15, 30, tzinfo=tz),
+        )
+        self.assertEqual(
+            warmup.get_next_run(datetime(2026, 3, 31, 16, 0, tzinfo=tz), times),
+            datetime(2026, 4, 1, 5, 0, tzinfo=tz),
+        )
+
+        with self.assertRaises(ValueError):
+            warmup.get_next_run(datetime(2026, 3, 2, 4, 0, tzinfo=tz), [])
+
+    @override_settings(WARMUP_PREVIOUS_MONTH_DAYS=5)
+    def test_months(self):
+        self.assertEqual(warmup.get_months(date(2026, 3, 20)), [(3, 2026)])
+        self.assertEqual(
+            warmup.get_months(date(2026, 3, 5)), [(3, 2026), (2, 2026)]
+        )
+        self.assertEqual(
+            warmup.get_months(date(2026, 1, 1)), [(1, 2026), (12, 2025)]
+        )
+
+
+@override_settings(DEBUG=True)
+class WarmupTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        api.throttle = []
+
+    def setUp(self):
+        _clear_render_pool()
+        _clear_rekap_jobs()
+        _clear_snapshots()
+        self.addCleanup(_clear_rekap_jobs)
+        self.addCleanup(_clear_snapshots)
+
+        self.client = Client()
+
+        self.wali = User.objects.create_user(
+            username="wali_warmup", password="pw",
+            full_name="Wali Warmup", type="wali_kelas", token="waliwarmuptoken",
+        )
+        self.sekretaris = User.objects.create_user(
+            username="sekretaris_warmup", password="pw",
+            full_name="Sekretaris Warmup", type="sekretaris",
+        )
+        self.kelas_a = Kelas.objects.create(
+            name="Warmup-A", active=True, wali_kelas=self.wali
+        )
+        self.kelas_a.sekretaris.add(self.sekretaris)
+        self.kelas_b = Kelas.objects.create(name="Warmup-B", active=True)
+        self.inactive = Kelas.objects.create(name="Warmup-Lama", active=False)
+
+        for kelas in (self.kelas_a, self.kelas_b, self.inactive):
+            siswa = Siswa.objects.create(fullname="Siswa %s" % kelas.name, kelas=kelas)
+            Absensi.objects.create(
+                siswa=siswa, date=date(2026, 3, 2), _status="alfa", by=self.wali
+            )
+
+    def _get_rekap(self, kelas):
+        return self.client.get(
+            "/api/get-rekap",
+            {"bulan": 3, "kelas": kelas.pk, "tahun": 2026},
+            headers={"Authorization": "Bearer waliwarmuptoken"},
+        )
+
+    def test_scopes(self):
+        scopes = {
+            scope
+            for scope in warmup.get_scopes()
+            if set(scope) & {self.kelas_a.pk, self.kelas_b.pk, self.inactive.pk}
+        }
+
+        self.assertIn((self.kelas_a.pk,), scopes)
+        self.assertFalse([scope for scope in scopes if self.inactive.pk in scope])
+        # scope kesiswaan berisi semua kelas aktif
+        kelas_ids = {self.kelas_a.pk, self.kelas_b.pk}
+        self.assertTrue([scope for scope in scopes if kelas_ids <= set(scope)])
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_get_rekap_served_from_warmup(self, mock_pdfkit):
+        built = warmup.warm_rekaps(3, 2026)
+
+        active = Kelas.objects.only_active().count()
+        self.assertEqual(built, active)
+        self.assertEqual(mock_pdfkit.call_count, active)
+
+        response = self._get_rekap(self.kelas_a)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["status"], rekap_job.STATUS_DONE)
+        self.assertEqual(mock_pdfkit.call_count, active)
+
+        # file yang dibuat warmup bisa diunduh
+        file_id = response.json()["data"]["file_id"]
+        response = self.client.get("/files/%s" % file_id)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-fake")
+
+        # warmup berikutnya tidak membuat ulang rekap yang masih berlaku
+        self.assertEqual(warmup.warm_rekaps(3, 2026), 0)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_changed_kelas_is_rebuilt(self, mock_pdfkit):
+        warmup.warm_rekaps(3, 2026)
+
+        Absensi.objects.filter(siswa__kelas=self.kelas_b).update(_status="sakit")
+        versions.bump_absensi([(self.kelas_b.pk, date(2026, 3, 2))])
+
+        self.assertEqual(warmup.warm_rekaps(3, 2026), 1)
+
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_running_job_is_skipped(self, mock_pdfkit):
+        file_id, _ = rekap_job.get_rekap_id(self.kelas_a.pk, 2026, 3)
+        token = rekap_job.acquire(file_id)
+
+        active = Kelas.objects.only_active().count()
+        self.assertEqual(warmup.warm_rekaps(3, 2026), active - 1)
+
+        # lock milik job lain tidak dilepas warmup
+        self.assertEqual(
+            rekap_job.get_status(file_id).status, rekap_job.STATUS_PENDING
+        )
+        rekap_job.release(file_id, token)
+
+    @patch("pdfkit.from_string", side_effect=[b"%PDF-fake", Exception("crash")])
+    def test_failed_render_does_not_stop_others(self, mock_pdfkit):
+        with override_settings(REKAP_RENDER_CONCURRENCY=1):
+            Kelas.objects.only_active().exclude(
+                pk__in=[self.kelas_a.pk, self.kelas_b.pk]
+            ).update(active=False)
+
+            with self.assertLogs("main.helpers.warmup", "ERROR"):
+                self.assertEqual(warmup.warm_rekaps(3, 2026), 1)
+
+        # kelas diurutkan nama: A berhasil, lock B yang gagal dilepas sehingga
+        # request berikutnya bisa membuat ulang
+        self.assertTrue(rekap_job.get_rekap_id(self.kelas_a.pk, 2026, 3)[1])
+        file_id, is_cached = rekap_job.get_rekap_id(self.kelas_b.pk, 2026, 3)
+        self.assertFalse(is_cached)
+        self.assertIsNotNone(rekap_job.acquire(file_id))
+
+    def test_snapshots(self):
+        built = warmup.warm_snapshots()
+
+        self.assertEqual(built, len(warmup.get_scopes()))
+        version = versions.get_scope_version([self.kelas_a.pk])
+        self.assertIsNotNone(
+            helpers_snapshot.get_cached_snapshot(helpers_snapshot.FORMAT_SQL, version)
+        )
+
+        self.assertEqual(warmup.warm_snapshots(), 0)
+
+    @override_settings(WARMUP_PREVIOUS_MONTH_DAYS=0)
+    @patch("pdfkit.from_string", side_effect=_fake_pdfkit)
+    def test_command_once(self, mock_pdfkit):
+        stdout = io.StringIO()
+        with patch("django.utils.timezone.localdate", return_value=date(2026, 3, 9)):
+            call_command("warmup", "--once", stdout=stdout)
+
+        active = Kelas.objects.only_active().count()
+        self.assertIn(
+            "%d rekap dan %d snapshot dibuat" % (active, len(warmup.get_scopes())),
+            stdout.getvalue(),
+        )
+        self.assertEqual(
+            self._get_rekap(self.kelas_a).json()["data"]["status"],
+            rekap_job.STATUS_DONE,
+        )
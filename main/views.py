@@ -6,12 +6,14 @@ from django.conf import settings
 from django.contrib.auth import authenticate
 from django.core.management import call_command
 from django.db import connection
-from django.http import Http404, HttpRequest, HttpResponse
+from django.http import (FileResponse, Http404, HttpRequest, HttpResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import redirect, render
+from django.utils.http import parse_etags, quote_etag
 
 # from django.contrib import messages
 from main.forms import SetupForm
-from main.helpers import redis
+from main.helpers import artifacts
 
 # from main.helpers.auth import require_superuser_basic_auth
 from main.models import Data, User
@@ -32,23 +34,88 @@ def index_view(request: HttpRequest):
 
 
 def files(request: HttpRequest, file_id: str):
-    with redis.get_client() as redis_client:
-        if not redis_client.exists(file_id):
-            response = HttpResponse(
-                content="File tidak ditemukan atau sudah kadaluarsa"
+    artifact = artifacts.get(file_id)
+
+    if artifact is None:
+        return _file_not_found()
+
+    etag = quote_etag(artifact.etag)
+
+    if _etag_matches(request.headers.get("If-None-Match", ""), etag):
+        response = HttpResponse(status=304)
+        response.headers["ETag"] = etag
+        return response
+
+    if settings.ARTIFACTS_SENDFILE:
+        # file dikirim web server, worker tidak membaca file sama sekali
+        response = HttpResponse(content_type=artifact.mimetype)
+        if settings.ARTIFACTS_SENDFILE == "x-accel-redirect":
+            response.headers["X-Accel-Redirect"] = (
+                settings.ARTIFACTS_ACCEL_PREFIX + artifact.file_id
             )
-            response.status_code = 404
-            return response
+        else:
+            response.headers["X-Sendfile"] = str(artifact.path)
+    else:
+        response = _file_response(request, artifact, etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Content-Disposition"] = "filename=%s" % artifact.filename
 
-        data = redis_client.get(file_id)
+    return response
 
-    filename = data[:100].rstrip().decode()
-    mimetype = data[100:200].rstrip().decode()
-    content = data[200:]
 
-    response = HttpResponse(content=content, content_type=mimetype)
-    response.headers["Content-Disposition"] = "filename=%s" % filename
+def _file_not_found():
+    response = HttpResponse(content="File tidak ditemukan atau sudah kadaluarsa")
+    response.status_code = 404
+    return response
+
 
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match memakai perbandingan weak (W/ diabaikan), `*` cocok semua"""
+    etags = [e.removeprefix("W/") for e in parse_etags(header)]
+    return "*" in etags or etag in etags
+
+
+def _file_response(request: HttpRequest, artifact: artifacts.Artifact, etag: str):
+    range_header = request.headers.get("Range")
+
+    # If-Range: range hanya berlaku jika file belum berubah
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and if_range != etag:
+        range_header = None
+
+    try:
+        byte_range = (
+            artifacts.parse_range(range_header, artifact.size) if range_header else None
+        )
+    except artifacts.RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = "bytes */%s" % artifact.size
+        return response
+
+    try:
+        file = open(artifact.path, "rb")
+    except FileNotFoundError:
+        # dihapus cleanup setelah metadata dibaca
+        return _file_not_found()
+
+    if byte_range is None:
+        response = FileResponse(file, content_type=artifact.mimetype)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            artifacts.iter_file(file, start, end),
+            status=206,
+            content_type=artifact.mimetype,
+        )
+        response.headers["Content-Range"] = "bytes %s-%s/%s" % (
+            start,
+            end,
+            artifact.size,
+        )
+        response.headers["Content-Length"] = end - start + 1
+
+    response.headers["Accept-Ranges"] = "bytes"
     return response
 
 